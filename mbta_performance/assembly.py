@@ -0,0 +1,510 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import numpy as np
+
+from bisect import bisect_left, bisect_right, insort
+
+from events import EventTable
+
+missing = -1  # value of the times of stops and tracks a train has no data for
+
+
+def link_events (times, targets, tolerance=10):
+    """ Function to link each event to the first target event later than its
+    time less the tolerance, if that target is also earlier than its time plus
+    the tolerance. Each target is linked to at most one event: earlier events
+    (by index) claim first, and the others move on to the next target.
+
+    Args:
+        times (numpy.ndarray): times (epoch) of the events
+        targets (numpy.ndarray): ordered times (epoch) of the target events
+        tolerance (int, optional): largest time difference (seconds,
+            excluded) of a link
+
+    Returns:
+        numpy.ndarray: index of the target of each event, or -1
+    """
+
+    n = len (targets)
+    links = np.full (len (times), -1, dtype=np.int64)
+    taken = np.zeros (n + 1, dtype=bool)
+    taken[n] = True
+
+    pending = np.arange (len (times))
+    candidates = np.searchsorted (targets, times - tolerance, side='right')
+    while len (pending):
+        c = candidates[pending]
+        in_range = c < n
+        in_range[in_range] = targets[c[in_range]] < times[pending[in_range]] + tolerance
+        pending = pending[in_range]
+        c = c[in_range]
+
+        # First claim on each free target wins
+        free = ~taken[c]
+        claimants = pending[free]
+        c_free = c[free]
+        targets_claimed, first = np.unique (c_free, return_index=True)
+        links[claimants[first]] = targets_claimed
+        taken[targets_claimed] = True
+
+        won = np.zeros (len (pending), dtype=bool)
+        won[np.flatnonzero (free)[first]] = True
+        pending = pending[~won]
+        candidates[pending] += 1
+
+    return links
+
+
+class TrainMatrix (object):
+    """ This is a class to hold the times of the trains of a line as matrices,
+    one row per train and one column per stop (or track). Times are epochs,
+    and `missing` where a train has no data.
+
+    Trains run along pieces numbered 2 * i for the i-th stop, and 2 * i + 1
+    for the track after it: a train holds data from its start piece to its
+    end piece.
+    """
+
+    def __init__ (self, num_trains, num_stops):
+        """
+        Args:
+            num_trains (int): number of trains (rows)
+            num_stops (int): number of stops of the line
+        """
+
+        num_tracks = max (num_stops - 1, 0)
+        self.arrival = np.full ((num_trains, num_stops), missing, dtype=np.int64)
+        self.departure = np.full ((num_trains, num_stops), missing, dtype=np.int64)
+        self.dwell_time = np.full ((num_trains, num_stops), missing, dtype=np.int32)
+        self.track_departure = np.full ((num_trains, num_tracks), missing, dtype=np.int64)
+        self.track_arrival = np.full ((num_trains, num_tracks), missing, dtype=np.int64)
+        self.travel_time = np.full ((num_trains, num_tracks), missing, dtype=np.int32)
+        self.benchmark_travel_time = np.full ((num_trains, num_tracks), missing,
+                                              dtype=np.int32)
+        self.start_piece = np.zeros (num_trains, dtype=np.int32)
+        self.end_piece = np.zeros (num_trains, dtype=np.int32)
+
+    def __len__ (self):
+        return len (self.start_piece)
+
+    def take (self, rows):
+        """ Function to select trains.
+
+        Args:
+            rows (numpy.ndarray): indices or boolean mask of the trains
+
+        Returns:
+            `TrainMatrix`: matrix of the selected trains
+        """
+
+        out = TrainMatrix (0, 0)
+        for (name, value) in self.__dict__.iteritems ():
+            setattr (out, name, value[rows])
+        return out
+
+    def masked (self, name):
+        """ Function to get a matrix of times, masked where trains have no
+        data.
+
+        Args:
+            name (str): name of the matrix, e.g. "arrival" or "travel_time"
+
+        Returns:
+            `numpy.ma.MaskedArray`: times, sharing the data of the matrix
+        """
+
+        return np.ma.masked_equal (getattr (self, name), missing, copy=False)
+
+    def piece_departure (self, row, piece):
+        """ Departure time (epoch) of a train at a piece. """
+
+        if piece % 2 == 0:
+            return self.departure[row, piece // 2]
+        return self.track_departure[row, piece // 2]
+
+    def merge (self, rows, others):
+        """ Function to copy the times of later segments of the same trains
+        into the trains.
+
+        Args:
+            rows (numpy.ndarray): indices of the trains
+            others (numpy.ndarray): indices of the later segments, in the
+                order they were found. A train may take several segments.
+        """
+
+        rows = np.asarray (rows, dtype=np.int64)
+        others = np.asarray (others, dtype=np.int64)
+        if len (rows) == 0:
+            return
+
+        # A segment only has times from its start piece to its end piece,
+        # after the end of the train it goes into
+        for name in ('arrival', 'departure', 'dwell_time', 'track_departure',
+                     'track_arrival', 'travel_time', 'benchmark_travel_time'):
+            matrix = getattr (self, name)
+            values = matrix[others]
+            i, j = np.nonzero (values != missing)
+            matrix[rows[i], j] = values[i, j]
+        # Later segments of the same train end later
+        np.maximum.at (self.end_piece, rows, self.end_piece[others])
+
+    @property
+    def total_travel_time (self):
+        """ Time from the start to the end of each train.
+
+        Returns:
+            numpy.ndarray: travel time (seconds), or `missing`
+        """
+
+        rows = np.arange (len (self))
+        start = self.start_piece // 2
+        end = self.end_piece
+        start_t = self.departure[rows, start]
+        end_t = np.where (end % 2 == 0, self.arrival[rows, end // 2],
+                          self.track_arrival[rows, np.minimum (
+                              end // 2, max (self.track_arrival.shape[1] - 1, 0))])
+        return np.where ((start_t == missing) | (end_t == missing), missing,
+                         end_t - start_t)
+
+
+def chain_trains (stop_ids, travel_times, dwell_times, tolerance=10):
+    """ Function to chain all travel times and dwell times of a line into
+    trains at once. Each dwell time is linked to the travel time departing its
+    stop at the same time, and each travel time to the dwell time arriving at
+    the next stop at the same time (within the tolerance). Trains start at the
+    dwell times no travel time leads to.
+
+    Args:
+        stop_ids (list): stop IDs of the line, in order
+        travel_times (dict): `EventTable`s of the tracks, keyed by (first stop
+            ID, second stop ID)
+        dwell_times (dict): `EventTable`s of the stops, keyed by stop ID
+        tolerance (int, optional): largest time difference (seconds, excluded)
+            of a link
+
+    Returns:
+        `TrainMatrix`: trains, ordered by their start
+    """
+
+    num_stops = len (stop_ids)
+    stop_tables = [dwell_times.get (stop_id, EventTable ('dwelltimes'))
+                   for stop_id in stop_ids]
+    track_tables = [travel_times.get ((stop_ids[i], stop_ids[i+1]),
+                                      EventTable ('traveltimes'))
+                    for i in range (num_stops - 1)]
+
+    # Links from the dwell times of each stop to the travel times of the next
+    # track, and from those to the dwell times of the next stop
+    dwell_links = []
+    track_links = []
+    reached = [np.zeros (len (stop_tables[0]), dtype=bool)]
+    for i in range (num_stops - 1):
+        dwell_links.append (link_events (stop_tables[i]['dep_dt'],
+                                         track_tables[i]['dep_dt'], tolerance))
+
+        # Only the travel times some dwell time leads to continue a train
+        track_reached = np.zeros (len (track_tables[i]), dtype=bool)
+        track_reached[dwell_links[i][dwell_links[i] >= 0]] = True
+
+        arr = stop_tables[i+1]['arr_dt']
+        order = np.argsort (arr, kind='mergesort')
+        links = np.full (len (track_tables[i]), -1, dtype=np.int64)
+        sources = np.flatnonzero (track_reached)
+        sorted_links = link_events (track_tables[i]['arr_dt'][sources],
+                                    arr[order], tolerance)
+        links[sources[sorted_links >= 0]] = order[sorted_links[sorted_links >= 0]]
+        track_links.append (links)
+
+        stop_reached = np.zeros (len (stop_tables[i+1]), dtype=bool)
+        stop_reached[links[links >= 0]] = True
+        reached.append (stop_reached)
+
+    # Trains start at the dwell times not reached by any, in order of
+    # departure (and of the dictionary of stops, for equal departures, as
+    # `get_first_train_stop` finds them)
+    stop_order = dict ((stop_id, i) for (i, stop_id) in enumerate (dwell_times))
+    start_stop = np.concatenate ([np.full ((~reached[i]).sum (), i, dtype=np.int32)
+                                  for i in range (num_stops)])
+    start_event = np.concatenate ([np.flatnonzero (~reached[i])
+                                   for i in range (num_stops)])
+    start_dep = np.concatenate ([stop_tables[i]['dep_dt'][~reached[i]]
+                                 for i in range (num_stops)])
+    start_order = np.array ([stop_order.get (stop_id, num_stops)
+                             for stop_id in stop_ids])[start_stop]
+    order = np.lexsort ((start_order, start_dep))
+    start_stop = start_stop[order]
+    start_event = start_event[order]
+
+    matrix = TrainMatrix (len (order), num_stops)
+    matrix.start_piece[:] = 2 * start_stop
+
+    current = np.full (len (order), -1, dtype=np.int64)
+    for i in range (num_stops):
+        starting = start_stop == i
+        current[starting] = start_event[starting]
+
+        rows = np.flatnonzero (current >= 0)
+        events = current[rows]
+        table = stop_tables[i]
+        matrix.arrival[rows, i] = table['arr_dt'][events]
+        matrix.departure[rows, i] = table['dep_dt'][events]
+        matrix.dwell_time[rows, i] = table['dwell_time_sec'][events]
+        matrix.end_piece[rows] = 2 * i
+        if i == num_stops - 1:
+            break
+
+        tracks = dwell_links[i][events]
+        rows = rows[tracks >= 0]
+        tracks = tracks[tracks >= 0]
+        table = track_tables[i]
+        matrix.track_departure[rows, i] = table['dep_dt'][tracks]
+        matrix.track_arrival[rows, i] = table['arr_dt'][tracks]
+        matrix.travel_time[rows, i] = table['travel_time_sec'][tracks]
+        matrix.benchmark_travel_time[rows, i] = \
+            table['benchmark_travel_time_sec'][tracks]
+        matrix.end_piece[rows] = 2 * i + 1
+
+        current[:] = -1
+        current[rows] = track_links[i][tracks]
+
+    return matrix
+
+
+def merge_window (station_num_diff, is_green=False):
+    """ Function to get the times between the end of a train and the start of
+    a segment for which the segment continues the train. Average time per
+    train leg must be > 30 sec (Green line) or > 1 minute, and < 3 minutes,
+    for the same train. A train over 1000 seconds per leg in the past is too
+    far to be continued, and so are all earlier trains.
+
+    Args:
+        station_num_diff (int): number of stops from the end of the train to
+            the start of the segment, from 1 to `merge_horizon`
+        is_green (bool, optional): if True, the trains are Green line trains
+
+    Returns:
+        tuple: shortest time (seconds, included) and longest time (seconds,
+            excluded) for the same train, and longest time (seconds,
+            included) to search earlier trains
+    """
+
+    if station_num_diff == 1:
+        shortest = 0
+    elif is_green:
+        shortest = 30 * station_num_diff
+    else:
+        shortest = 60 * station_num_diff
+    return (shortest, 180 * station_num_diff, 1000 * station_num_diff)
+
+def merge_decision (station_num_diff, time_diff, is_green=False):
+    """ Function to decide whether a train segment continues an earlier train
+    (see `merge_window`).
+
+    Args:
+        station_num_diff (int): number of stops from the end of the train to
+            the start of the segment, from 1 to `merge_horizon`
+        time_diff (float): time (seconds) from the departure at the end of the
+            train to the arrival at the start of the segment
+        is_green (bool, optional): if True, the trains are Green line trains
+
+    Returns:
+        bool: True if the segment continues the train, False if the train is
+            so far in the past that no earlier train can be continued either,
+            and None otherwise
+    """
+
+    shortest, longest, horizon = merge_window (station_num_diff, is_green)
+    if time_diff >= shortest and time_diff < longest:
+        return True
+    elif time_diff > horizon:
+        return False
+    return None
+
+merge_horizon = 4  # most stops a train may be missing between two segments
+
+def earliest_arrivals (dwell_times):
+    """ Function to bound the arrivals of the train segments still to be
+    chained. Segments start in order of their departure, so one starting at or
+    after a time arrives no earlier than every dwell time departing from then
+    on.
+
+    Args:
+        dwell_times (dict): `EventTable`s of the stops
+
+    Returns:
+        tuple: ordered departure times (epoch) of all dwell times, and the
+            earliest arrival time (epoch) of the dwell times departing at or
+            after each, as lists
+    """
+
+    tables = [table for table in dwell_times.itervalues () if len (table)]
+    if not tables:
+        return ([], [])
+    dep = np.concatenate ([table['dep_dt'] for table in tables])
+    arr = np.concatenate ([table['arr_dt'] for table in tables])
+    order = np.argsort (dep, kind='mergesort')
+    earliest = np.minimum.accumulate (arr[order][::-1])[::-1]
+    return (dep[order].tolist (), earliest.tolist ())
+
+
+class OpenTrains (object):
+    """ This is a class to find the train a segment continues, as the latest
+    added train for which `merge_decision` decides (True or False) is, without
+    going through all trains. Trains are kept by the stop they end at, ordered
+    by their departure from it.
+
+    A train departing more than `merge_horizon` * 1000 seconds before a segment
+    arrives ends the search of every later segment that reaches it, so it is
+    evicted: only the latest added of the evicted trains of each stop is kept.
+    Should a segment arrive over an hour earlier than one which evicted
+    trains, all trains are searched instead.
+    """
+
+    def __init__ (self, is_green=False):
+        """
+        Args:
+            is_green (bool, optional): if True, the trains are Green line
+                trains (see `merge_decision`)
+        """
+
+        self._is_green = is_green
+        self._windows = [None] + [merge_window (diff, is_green)
+                                  for diff in xrange (1, merge_horizon + 1)]
+        self._ends = []     # (stop number, departure) of each train, or None
+        self._open = {}     # ordered (departure, train number) of each stop
+        self._closed = {}   # evicted train numbers of each stop
+        self._closed_max = {}
+        # Segments arriving earlier may continue evicted trains
+        self._evicted_until = -float ('inf')
+
+    def __len__ (self):
+        return len (self._ends)
+
+    def end (self, n):
+        """ Function to get where a train ends.
+
+        Args:
+            n (int): train number
+
+        Returns:
+            tuple: number of the stop the train ends at and its departure time
+                (epoch) from it, or None if it is never continued
+        """
+
+        return self._ends[n]
+
+    def add (self, station_num=None, departure=None):
+        """ Function to add a train.
+
+        Args:
+            station_num (int, optional): number of the stop the train ends
+                at. Trains without one are never continued.
+            departure (int, optional): departure time (epoch) of the train from
+                the stop it ends at
+
+        Returns:
+            int: train number, in order of addition
+        """
+
+        self._ends.append (None)
+        n = len (self._ends) - 1
+        if station_num is not None:
+            self.move (n, station_num, departure)
+        return n
+
+    def move (self, n, station_num, departure):
+        """ Function to change where a train ends, e.g. when a segment
+        continues it.
+
+        Args:
+            n (int): train number
+            station_num (int): number of the stop the train ends at
+            departure (int): departure time (epoch) of the train from the
+                stop it ends at
+        """
+
+        end = self._ends[n]
+        if end is not None:
+            if n in self._closed.get (end[0], ()):
+                closed = self._closed[end[0]]
+                closed.remove (n)
+                self._closed_max[end[0]] = max (closed) if closed else -1
+            else:
+                self._open[end[0]].remove ((end[1], n))
+
+        self._ends[n] = (station_num, departure)
+        insort (self._open.setdefault (station_num, []), (departure, n))
+
+    def _evict (self, arrival):
+        # Keep an hour of slack, as segments are not quite ordered by arrival
+        until = arrival - 3600
+        self._evicted_until = until
+        horizon = until - merge_horizon * 1000
+        for (station_num, trains) in self._open.iteritems ():
+            i = bisect_left (trains, (horizon,))
+            if i == 0:
+                continue
+            evicted = [n for (departure, n) in trains[:i]]
+            self._closed.setdefault (station_num, set ()).update (evicted)
+            self._closed_max[station_num] = max (
+                self._closed_max.get (station_num, -1), max (evicted))
+            del trains[:i]
+
+    def find (self, station_num, arrival):
+        """ Function to find the train a segment continues.
+
+        Args:
+            station_num (int): number of the stop the segment starts at
+            arrival (int): arrival time (epoch) of the segment at the stop
+
+        Returns:
+            int: number of the train, or None if the segment starts a new train
+        """
+
+        if station_num == 0:
+            return None
+
+        if arrival < self._evicted_until:
+            return self._find_all (station_num, arrival)
+        elif arrival >= self._evicted_until + 4200:
+            # Evict every ten minutes at most
+            self._evict (arrival)
+
+        inf = float ('inf')
+        found = None
+        found_n = -1
+        for diff in xrange (1, merge_horizon + 1):
+            end_num = station_num - diff
+            closed_n = self._closed_max.get (end_num, -1)
+            if closed_n > found_n:
+                found, found_n = False, closed_n
+            trains = self._open.get (end_num)
+            if not trains:
+                continue
+
+            shortest, longest, horizon = self._windows[diff]
+            # Trains departing before the horizon end the search
+            for m in xrange (bisect_left (trains, (arrival - horizon,))):
+                if trains[m][1] > found_n:
+                    found, found_n = False, trains[m][1]
+            # and those departing within the window are the same train
+            for m in xrange (bisect_right (trains, (arrival - longest, inf)),
+                             bisect_right (trains, (arrival - shortest, inf))):
+                if trains[m][1] > found_n:
+                    found, found_n = True, trains[m][1]
+        return found_n if found else None
+
+    def _find_all (self, station_num, arrival):
+        for n in xrange (len (self._ends) - 1, -1, -1):
+            end = self._ends[n]
+            if end is None:
+                continue
+            diff = station_num - end[0]
+            if diff <= 0 or diff > merge_horizon:
+                continue
+            decision = merge_decision (diff, arrival - end[1], self._is_green)
+            if decision is not None:
+                return n if decision else None
+        return None
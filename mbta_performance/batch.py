@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import time
+import traceback
+import multiprocessing
+
+from collections import namedtuple
+
+import cache
+
+from train import TrainCollection
+from utils import ensure_dir, lines
+
+directions = ("0", "1")
+
+
+class BuildResult (namedtuple ('BuildResult', ['line', 'direction_id', 'out_file',
+                                               'num_trains', 'elapsed', 'error'])):
+    """ The outcome of building the `TrainCollection` of one line and
+    direction: the file it was written to, its number of trains and the time
+    (seconds) it took, or the traceback of the error that stopped it.
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok (self):
+        return self.error is None
+
+    def __str__ (self):
+        if self.error is not None:
+            return '{0} {1}: FAILED after {2:.1f} s\n{3}'.format (
+                self.line, self.direction_id, self.elapsed, self.error)
+        return '{0} {1}: {2} trains in {3:.1f} s, written to {4}'.format (
+            self.line, self.direction_id, self.num_trains, self.elapsed,
+            self.out_file)
+
+
+def build_jobs (line_names=None, direction_ids=directions):
+    """ Function to list the (line, direction) grid to build.
+
+    Args:
+        line_names (list, optional): names of the lines (see `lines`), e.g.
+            ["Blue", "Orange"]. By default, all lines.
+        direction_ids (tuple, optional): directions of each line
+
+    Returns:
+        list: (line name, direction ID) tuples
+    """
+
+    if line_names is None:
+        line_names = [l.value for l in lines]
+    for name in line_names:
+        lines (name)  # raises ValueError on unknown lines
+    return [(name, d) for name in line_names for d in direction_ids]
+
+def build_collection (line_name, direction_id, data_path, out_dir,
+                      num_trains=None, merge=True):
+    """ Function to build the `TrainCollection` of a line and direction from
+    its downloaded times, and write it to `out_dir`, as
+    "<line>_<direction name>.pickle" (see `cache.save`).
+
+    Args:
+        line_name (str): name of the line (see `lines`)
+        direction_id (str): "0" or "1"
+        data_path (str): directory of the downloaded times (see
+            `TrainCollection.set_data_path`)
+        out_dir (str): directory to write the collection to
+        num_trains (int, optional): number of trains to load
+        merge (bool, optional): if True, merge train segments that are likely
+            the same train
+
+    Returns:
+        `BuildResult`: outcome of the build. Errors are raised.
+    """
+
+    t0 = time.time ()
+    tc = TrainCollection ()
+    tc.load_base_train (lines (line_name), direction_id=direction_id)
+    tc.set_data_path (data_path)
+    tc.load_times ()
+    tc.load_trains (num_trains=num_trains, merge=merge)
+
+    out_file = '{0}/{1}_{2}.pickle'.format (
+        ensure_dir (out_dir), tc.name, tc.base_train.direction_name)
+    cache.save (tc, out_file)
+    return BuildResult (line_name, direction_id, out_file, len (tc.trains),
+                        time.time () - t0, None)
+
+def _build_job (args):
+    """ Function to build a collection (run in a worker process of
+    `build_all`). Errors are returned rather than raised, so that one failed
+    job does not stop the others.
+
+    Args:
+        args (tuple): arguments of `build_collection`
+
+    Returns:
+        `BuildResult`: outcome of the build
+    """
+
+    t0 = time.time ()
+    try:
+        return build_collection (*args)
+    except Exception:
+        return BuildResult (args[0], args[1], None, None, time.time () - t0,
+                            traceback.format_exc ())
+
+def _run_job (args, conn):
+    """ Function to build a collection in a process of its own (see
+    `build_all`), and send the `BuildResult` back through `conn`.
+
+    Args:
+        args (tuple): arguments of `build_collection`
+        conn (`multiprocessing.Connection`): end of the pipe to send the
+            result through
+    """
+
+    conn.send (_build_job (args))
+    conn.close ()
+
+def _start_job (args):
+    """ Function to start a process building a collection (see `_run_job`).
+
+    Args:
+        args (tuple): arguments of `build_collection`
+
+    Returns:
+        tuple: (args, `multiprocessing.Process`, receiving `Connection`, start
+            time)
+    """
+
+    recv_conn, send_conn = multiprocessing.Pipe (duplex=False)
+    process = multiprocessing.Process (target=_run_job, args=(args, send_conn))
+    process.daemon = True
+    process.start ()
+    send_conn.close ()
+    return (args, process, recv_conn, time.time ())
+
+def _finish_job (job):
+    """ Function to get the outcome of a job if its process is done (see
+    `_start_job`). A process that exits without sending its result (e.g.
+    killed by the OS) makes a failed `BuildResult`.
+
+    Args:
+        job (tuple): started job
+
+    Returns:
+        `BuildResult`: outcome of the build, or None if it is still running
+    """
+
+    (args, process, conn, t0) = job
+    if not conn.poll () and process.is_alive ():
+        return None
+
+    # The result may be sent just before the process exits
+    result = None
+    if conn.poll ():
+        try:
+            result = conn.recv ()
+        except EOFError:
+            pass
+    process.join ()
+    conn.close ()
+    if result is None:
+        result = BuildResult (
+            args[0], args[1], None, None, time.time () - t0,
+            'Worker process exited with code {0} before returning a result'.format (
+                process.exitcode))
+    return result
+
+def build_all (data_path, out_dir, line_names=None, direction_ids=directions,
+               num_workers=1, num_trains=None, merge=True, callback=None,
+               poll_interval=0.1):
+    """ Function to build the `TrainCollection`s of a grid of lines and
+    directions (see `build_collection`), on several processes. Each
+    collection is written as soon as it is built, and a job that fails does
+    not stop the others.
+
+    Args:
+        data_path (str): directory of the downloaded times
+        out_dir (str): directory to write the collections to
+        line_names (list, optional): names of the lines. By default, all
+            lines.
+        direction_ids (tuple, optional): directions of each line
+        num_workers (int, optional): number of collections built at once.
+            Each is built by a fresh process, which returns its memory once
+            done. A process that dies (e.g. killed by the OS) fails its job
+            only.
+        num_trains (int, optional): number of trains to load per collection
+        merge (bool, optional): if True, merge train segments that are likely
+            the same train
+        callback (function, optional): called with each `BuildResult`, in the
+            order the jobs finish, e.g. to report progress
+        poll_interval (float, optional): time (seconds) between checks of the
+            running processes
+
+    Returns:
+        list: `BuildResult`s, in the order the jobs finish
+    """
+
+    if not isinstance (num_workers, int) or num_workers < 1:
+        raise ValueError ("num_workers must be a positive int. Please check inputs ...")
+
+    args = [(name, d, data_path, out_dir, num_trains, merge)
+            for (name, d) in build_jobs (line_names, direction_ids)]
+
+    done = []
+    if num_workers == 1 or len (args) < 2:
+        for a in args:
+            result = _build_job (a)
+            done.append (result)
+            if callback is not None:
+                callback (result)
+        return done
+
+    # One job at a time per process: lines differ a lot in size
+    pending = list (reversed (args))
+    running = []
+    try:
+        while pending or running:
+            while pending and len (running) < num_workers:
+                running.append (_start_job (pending.pop ()))
+
+            finished = False
+            for job in list (running):
+                result = _finish_job (job)
+                if result is None:
+                    continue
+                running.remove (job)
+                finished = True
+                done.append (result)
+                if callback is not None:
+                    callback (result)
+            if not finished:
+                time.sleep (poll_interval)
+    finally:
+        for (_, process, conn, _) in running:
+            process.terminate ()
+            process.join ()
+            conn.close ()
+    return done
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import json
+import time
+
+from storage import parse_raw_filename
+
+# Coarsest modification time resolution (seconds) of the file systems: a file
+# added this long after a listing may not change the directory time
+mtime_resolution = 2
+
+
+class RawCatalog (object):
+    """ This is a class to index the raw MBTA travel time and dwell time files
+    of a line directory by (kind, direction ID, track or stop key), so that the
+    files of a key are found without scanning the directory. The catalog is
+    kept in a JSON file in the directory, and updated incrementally when files
+    are added or removed.
+    """
+
+    def __init__ (self, line_dir, name):
+        """
+        Args:
+            line_dir (str): directory of the raw files of the line
+            name (str): line name
+        """
+
+        self._line_dir = line_dir
+        self._name = name
+        self._filename = '{0}/catalog_{1}.json'.format (line_dir, name)
+        self._mtime = None
+        self._scanned = None
+        self._entries = {}
+        self._ignored = set ([os.path.basename (self._filename)])
+        self._index = {}
+        self._num_parsed = 0
+
+        if os.path.exists (self._filename):
+            try:
+                with open (self._filename) as f:
+                    catalog = json.load (f)
+                self._mtime = catalog['mtime']
+                self._scanned = catalog.get ('scanned')
+                self._entries = dict (
+                    (filename, tuple (entry))
+                    for (filename, entry) in catalog['files'].iteritems ())
+                self._ignored.update (catalog['ignored'])
+            except (ValueError, KeyError):
+                # Unreadable catalog: rebuild it
+                self._mtime = None
+                self._scanned = None
+                self._entries = {}
+            self._build_index ()
+
+    def _build_index (self):
+        self._index = {}
+        for (filename, entry) in self._entries.iteritems ():
+            self._index.setdefault (entry[0:3], []).append (
+                (entry[3], entry[4], filename))
+        for files in self._index.itervalues ():
+            files.sort ()
+
+    def update (self):
+        """ Function to bring the catalog up to date with the directory. Only
+        the names of new files are parsed, and the directory is not listed at
+        all if it has not changed since the last update. A directory changed
+        within `mtime_resolution` of the last listing is listed again, as files
+        added then may not have changed its time.
+
+        Returns:
+            bool: True if the catalog changed
+        """
+
+        self._num_parsed = 0
+        if not os.path.isdir (self._line_dir):
+            changed = bool (self._entries)
+            self._entries = {}
+            self._index = {}
+            return changed
+
+        mtime = os.stat (self._line_dir).st_mtime
+        if mtime == self._mtime and self._scanned is not None and \
+                mtime < self._scanned - mtime_resolution:
+            return False
+
+        scanned = time.time ()
+        filenames = set (os.listdir (self._line_dir))
+        known = set (self._entries) | self._ignored
+
+        changed = False
+        for filename in known - filenames:
+            if self._entries.pop (filename, None) is not None:
+                changed = True
+            elif filename != os.path.basename (self._filename):
+                self._ignored.discard (filename)
+        for filename in filenames - known:
+            self._num_parsed += 1
+            parsed = parse_raw_filename (filename)
+            if parsed is None or parsed[1] != self._name:
+                # e.g. the catalog and coverage manifest themselves
+                self._ignored.add (filename)
+                continue
+            kind, name, direction_id, key, start, end = parsed
+            self._entries[filename] = (kind, direction_id, key, start, end)
+            changed = True
+
+        self._scanned = scanned
+        self._mtime = mtime
+        if changed or not os.path.exists (self._filename):
+            self._build_index ()
+            self.save ()
+        else:
+            # Only the times changed: rewriting the file in place leaves the
+            # directory time as it is
+            try:
+                self._write (self._filename)
+            except (IOError, OSError):
+                pass
+        return changed
+
+    def save (self):
+        """ Function to write the catalog to its file. Read-only data
+        directories are skipped silently. """
+
+        temp_filename = '{0}.part_{1}'.format (self._filename, os.getpid ())
+        try:
+            self._write (temp_filename)
+            os.rename (temp_filename, self._filename)
+
+            # Renaming the catalog into place changes the directory itself:
+            # record the new time by rewriting the file in place, which
+            # does not. The next update lists the directory again, should a
+            # file have been added since the listing.
+            mtime = os.stat (self._line_dir).st_mtime
+            if mtime != self._mtime:
+                self._mtime = mtime
+                self._write (self._filename)
+        except (IOError, OSError):
+            return
+
+    def _write (self, filename):
+        catalog = {'mtime': self._mtime, 'scanned': self._scanned,
+                   'files': self._entries, 'ignored': sorted (self._ignored)}
+        with open (filename, 'w') as f:
+            json.dump (catalog, f)
+
+    def files (self, kind, direction_id, key, start=None, end=None):
+        """ Function to get the raw files of a track or stop.
+
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            direction_id (str): line direction ID
+            key (str): "<First Stop ID>_<Second Stop ID>" of a track, or
+                "<Stop ID>" of a stop
+            start (int, optional): only get files whose window ends at or
+                after this epoch
+            end (int, optional): only get files whose window starts before
+                this epoch
+
+        Returns:
+            list: (window start, window end, path) tuples, ordered by window
+        """
+
+        return [(w_start, w_end, os.path.join (self._line_dir, filename))
+                for (w_start, w_end, filename) in
+                self._index.get ((kind, direction_id, key), [])
+                if (start is None or w_end >= start) and
+                (end is None or w_start < end)]
+
+    def keys (self, kind, direction_id):
+        """ Function to get the track or stop keys with raw files.
+
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            direction_id (str): line direction ID
+
+        Returns:
+            list: sorted keys
+        """
+
+        return sorted (key for (k, d, key) in self._index
+                       if k == kind and d == direction_id)
+
+    @property
+    def num_parsed (self):
+        """ Number of file names parsed by the last `update`.
+
+        Returns:
+            int: number of file names parsed
+        """
+
+        return self._num_parsed
@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import socket
+import zlib
+import httplib
+import threading
+import urllib2
+
+from urlparse import urlsplit, urljoin
+
+
+class Response (object):
+    """ This is a class to contain a fully read HTTP response. """
+
+    def __init__ (self, url, status, reason, headers, body):
+        """
+        Args:
+            url (str): requested URL
+            status (int): HTTP status code
+            reason (str): HTTP reason phrase
+            headers (dict or list): headers, or list of (header, value) tuples
+            body (str): decoded response body
+        """
+
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = dict (headers)
+        self._body = body
+
+    def read (self):
+        """ Function to get the response body.
+
+        Returns:
+            str: decoded response body
+        """
+
+        return self._body
+
+    @property
+    def text (self):
+        """ Response body decoded to unicode.
+
+        Returns:
+            unicode: response body
+        """
+
+        return self._body.decode ('utf-8', 'replace')
+
+
+class StreamingResponse (object):
+    """ This is a class to read an HTTP response body chunk by chunk, as it
+    arrives. The connection goes back to its pool once the body is read.
+    """
+
+    def __init__ (self, session, url, conn, resp, release):
+        """
+        Args:
+            session (`Session`): session that issued the request
+            url (str): requested URL
+            conn (httplib.HTTPConnection): connection of the request
+            resp (httplib.HTTPResponse): response, with the body unread
+            release (function): called with no arguments to hand the
+                connection back once the body is read
+        """
+
+        self.url = url
+        self.status = resp.status
+        self.reason = resp.reason
+        self.headers = dict (resp.getheaders ())
+        self._session = session
+        self._conn = conn
+        self._resp = resp
+        self._release = release
+        self._done = False
+        self._decoder = None
+        if resp.getheader ('content-encoding', '').lower () == 'gzip':
+            self._decoder = zlib.decompressobj (16 + zlib.MAX_WBITS)
+
+    def iter_content (self, chunk_size=64 * 1024):
+        """ Function to iterate over the decoded response body.
+
+        Args:
+            chunk_size (int, optional): bytes read from the socket at a time
+
+        Yields:
+            str: decoded chunks of the response body
+        """
+
+        if self._done:
+            return
+
+        try:
+            while True:
+                raw = self._resp.read (chunk_size)
+                if not raw:
+                    break
+                data = raw
+                if self._decoder is not None:
+                    data = self._decoder.decompress (raw)
+                self._session._count_bytes (len (raw), len (data))
+                if data:
+                    yield data
+
+            if self._decoder is not None:
+                data = self._decoder.flush ()
+                self._session._count_bytes (0, len (data))
+                if data:
+                    yield data
+        except:
+            self.close ()
+            raise
+
+        self._done = True
+        self._release ()
+
+    def read (self):
+        """ Function to get the whole (remaining) response body.
+
+        Returns:
+            str: decoded response body
+        """
+
+        return ''.join (self.iter_content ())
+
+    def close (self):
+        """ Function to drop the connection if the body was not fully read. """
+
+        if not self._done:
+            self._done = True
+            self._resp.close ()
+            self._conn.close ()
+
+
+class Session (object):
+    """ This is a class to issue HTTP GET requests over a pool of keep-alive
+    connections, shared by all threads of the process.
+    """
+
+    redirect_status = (301, 302, 303, 307, 308)
+
+    def __init__ (self, timeout=60., max_idle=16, gzip=True, max_redirects=5):
+        """
+        Args:
+            timeout (float, optional): socket timeout (seconds) of each
+                connection
+            max_idle (int, optional): maximum number of idle connections kept
+                open per host
+            gzip (bool, optional): if True, ask for gzip encoded responses
+                and decode them transparently
+            max_redirects (int, optional): maximum number of redirects
+                followed by a request
+        """
+
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.gzip = gzip
+        self.max_redirects = max_redirects
+        self._idle = {}
+        self._lock = threading.Lock ()
+        self.reset_counters ()
+
+    def reset_counters (self):
+        """ Function to zero the request, connection and byte counters. """
+
+        with self._lock:
+            self._request_count = 0
+            self._connection_count = 0
+            self._bytes_on_wire = 0
+            self._bytes_decoded = 0
+
+    def _get_connection (self, scheme, netloc):
+        with self._lock:
+            idle = self._idle.get ((scheme, netloc))
+            if idle:
+                return idle.pop (), True
+            self._connection_count += 1
+
+        if scheme == 'https':
+            conn = httplib.HTTPSConnection (netloc, timeout=self.timeout)
+        else:
+            conn = httplib.HTTPConnection (netloc, timeout=self.timeout)
+        return conn, False
+
+    def _release_connection (self, scheme, netloc, conn):
+        with self._lock:
+            idle = self._idle.setdefault ((scheme, netloc), [])
+            if len (idle) < self.max_idle:
+                idle.append (conn)
+                return
+        conn.close ()
+
+    def _count_bytes (self, on_wire, decoded):
+        with self._lock:
+            self._bytes_on_wire += on_wire
+            self._bytes_decoded += decoded
+
+    def _open (self, url, headers):
+        """ Function to send a GET request, and read the response up to its
+        body.
+
+        Args:
+            url (str): URL to request
+            headers (dict): request headers
+
+        Returns:
+            `StreamingResponse`: the response, with the body unread
+        """
+
+        parts = urlsplit (url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        while True:
+            conn, reused = self._get_connection (parts.scheme, parts.netloc)
+            try:
+                conn.request ('GET', path, headers=headers)
+                resp = conn.getresponse ()
+                break
+            except socket.timeout:
+                conn.close ()
+                raise
+            except (httplib.HTTPException, socket.error):
+                conn.close ()
+                # The server may have dropped an idle keep-alive connection:
+                # only retry on a fresh one
+                if not reused:
+                    raise
+
+        def release ():
+            if resp.will_close:
+                conn.close ()
+            else:
+                self._release_connection (parts.scheme, parts.netloc, conn)
+
+        with self._lock:
+            self._request_count += 1
+
+        return StreamingResponse (self, url, conn, resp, release)
+
+    def get (self, url, headers=None, stream=False):
+        """ Function to GET a URL. Redirects are followed, up to
+        `max_redirects` of them.
+
+        Args:
+            url (str): URL to request
+            headers (dict, optional): extra request headers
+            stream (bool, optional): if True, return before the response body
+                is read, so it can be read chunk by chunk
+
+        Returns:
+            `Response` or `StreamingResponse`: the response
+
+        Raises:
+            urllib2.HTTPError: if the server does not answer with status 200
+        """
+
+        request_headers = {'Connection': 'keep-alive'}
+        if self.gzip:
+            request_headers['Accept-Encoding'] = 'gzip'
+        if headers is not None:
+            request_headers.update (headers)
+
+        response = self._open (url, request_headers)
+        for _ in xrange (self.max_redirects):
+            location = response.headers.get ('location')
+            if response.status not in Session.redirect_status or location is None:
+                break
+            # hand the connection back before following
+            response.read ()
+            url = urljoin (url, location)
+            response = self._open (url, request_headers)
+
+        if response.status != 200:
+            response.read ()
+            raise urllib2.HTTPError (url, response.status, response.reason,
+                                     response._resp.msg, None)
+
+        if stream:
+            return response
+
+        return Response (url, response.status, response.reason,
+                         response.headers, response.read ())
+
+    def close (self):
+        """ Function to close all idle connections. """
+
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.itervalues ():
+            for conn in conns:
+                conn.close ()
+
+    @property
+    def request_count (self):
+        """ Number of requests completed.
+
+        Returns:
+            int: request count
+        """
+
+        return self._request_count
+
+    @property
+    def connection_count (self):
+        """ Number of connections opened.
+
+        Returns:
+            int: connection count
+        """
+
+        return self._connection_count
+
+    @property
+    def reuse_rate (self):
+        """ Fraction of requests served over an already open connection.
+
+        Returns:
+            float: connection reuse rate
+        """
+
+        if self._request_count == 0:
+            return 0.
+        return 1. - float (self._connection_count) / self._request_count
+
+    @property
+    def bytes_on_wire (self):
+        """ Number of response body bytes received, before decoding.
+
+        Returns:
+            int: bytes received
+        """
+
+        return self._bytes_on_wire
+
+    @property
+    def bytes_decoded (self):
+        """ Number of response body bytes after decoding.
+
+        Returns:
+            int: decoded bytes
+        """
+
+        return self._bytes_decoded
+
+
+_session = None
+_session_lock = threading.Lock ()
+
+def get_session ():
+    """ Function to get the `Session` shared by all MBTA API calls. It is
+    created on first use, once, whichever threads ask for it.
+
+    Returns:
+        `Session`: shared session
+    """
+
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = Session ()
+    return _session
+
+def set_session (session):
+    """ Function to replace the `Session` shared by all MBTA API calls (e.g. to
+    change its timeout).
+
+    Args:
+        session (`Session`): new shared session
+    """
+
+    global _session
+    with _session_lock:
+        if _session is not None and _session is not session:
+            _session.close ()
+        _session = session
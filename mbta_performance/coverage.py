@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import json
+import threading
+
+from glob import glob
+
+from storage import parse_raw_filename
+
+max_window = 7 * 24 * 3600  # MBTA API limit on the span of a single query
+publication_lag = 6 * 3600  # time (seconds) the MBTA API may take to publish events
+
+
+def merge_intervals (intervals):
+    """ Function to merge overlapping and touching intervals.
+
+    Args:
+        intervals (iterable): (start, end) epoch tuples, with end excluded
+
+    Returns:
+        list: sorted, disjoint (start, end) tuples covering the same times
+    """
+
+    merged = []
+    for (start, end) in sorted (intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append ((start, end))
+    return merged
+
+def subtract_intervals (intervals, covered):
+    """ Function to remove covered times from a set of intervals.
+
+    Args:
+        intervals (iterable): (start, end) epoch tuples, with end excluded
+        covered (iterable): (start, end) epoch tuples to remove
+
+    Returns:
+        list: sorted, disjoint (start, end) tuples of the uncovered times
+    """
+
+    covered = merge_intervals (covered)
+    gaps = []
+    for (start, end) in merge_intervals (intervals):
+        for (c_start, c_end) in covered:
+            if c_end <= start:
+                continue
+            if c_start >= end:
+                break
+            if c_start > start:
+                gaps.append ((start, c_start))
+            start = max (start, c_end)
+            if start >= end:
+                break
+        if start < end:
+            gaps.append ((start, end))
+    return gaps
+
+def plan_windows (start, end, covered=None, window=max_window, min_gap=60):
+    """ Function to plan the query windows needed to cover a time period.
+
+    Args:
+        start (int): period start (epoch)
+        end (int): period end (epoch, excluded)
+        covered (iterable, optional): (start, end) epoch tuples that are
+            already stored, and need not be queried again
+        window (int, optional): maximum span of a single window (seconds)
+        min_gap (int, optional): uncovered gaps shorter than this (seconds)
+            are not worth a query, e.g. the last second of files whose end
+            time was given as "3:59:59"
+
+    Returns:
+        list: (start, end) epoch tuples of the windows to query
+    """
+
+    if covered is None:
+        covered = []
+
+    windows = []
+    for (gap_start, gap_end) in subtract_intervals ([(start, end)], covered):
+        if gap_end - gap_start < min_gap and covered:
+            continue
+        while gap_start < gap_end:
+            windows.append ((gap_start, min (gap_end, gap_start + window)))
+            gap_start += window
+    return windows
+
+
+class CoverageManifest (object):
+    """ This is a class to record which time intervals of MBTA travel times
+    and dwell times are already stored on disk, for a line and direction.
+    Intervals are kept per track (keyed "<First Stop ID>_<Second Stop ID>") and
+    per stop (keyed "<Stop ID>").
+    """
+
+    def __init__ (self, filename):
+        """
+        Args:
+            filename (str): manifest JSON file. It is read if it exists.
+        """
+
+        self._filename = filename
+        self._coverage = {'traveltimes': {}, 'dwelltimes': {}}
+        self._lock = threading.Lock ()
+        if os.path.exists (filename):
+            with open (filename) as f:
+                coverage = json.load (f)
+            for (kind, keys) in coverage.iteritems ():
+                self._coverage[kind] = dict (
+                    (key, [tuple (i) for i in intervals])
+                    for (key, intervals) in keys.iteritems ())
+
+    @classmethod
+    def for_line (cls, path, line):
+        """ Function to open the manifest of a `Line` in a data directory. If no
+        manifest exists yet, it is seeded from the single-window files already
+        in the directory.
+
+        Args:
+            path (str): data directory used in `Line.get_traveltimes` and
+                `Line.get_dwelltimes`
+            line (`Line`): line (and direction) of the manifest
+
+        Returns:
+            `CoverageManifest`: manifest of the line
+        """
+
+        filename = '{0}/{1}/coverage_{1}_{2}.json'.format (
+            path, line.name, line.direction_id)
+        manifest = cls (filename)
+        if not os.path.exists (filename):
+            manifest.scan ('{0}/{1}'.format (path, line.name), line.name,
+                           line.direction_id)
+        return manifest
+
+    def scan (self, line_dir, name, direction_id):
+        """ Function to add the intervals of existing time files to the
+        manifest. Files spanning more than a single query window are skipped,
+        as earlier versions overwrote them window by window.
+
+        Args:
+            line_dir (str): directory of the time files
+            name (str): line name
+            direction_id (str): line direction ID
+        """
+
+        for f in glob ('{0}/*times_{1}_{2}_*'.format (line_dir, name, direction_id)):
+            parsed = parse_raw_filename (f)
+            if parsed is None or parsed[1:3] != (name, direction_id):
+                continue
+            kind, key, start, end = parsed[0], parsed[3], parsed[4], parsed[5]
+            if end - start <= max_window:
+                self.add (kind, key, start, end)
+
+    def covered (self, kind, key):
+        """ Function to get the stored intervals of a track or stop.
+
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            key (str): track or stop key
+
+        Returns:
+            list: sorted, disjoint (start, end) epoch tuples
+        """
+
+        with self._lock:
+            return list (self._coverage[kind].get (key, []))
+
+    def add (self, kind, key, start, end):
+        """ Function to record a stored interval of a track or stop.
+
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            key (str): track or stop key
+            start (int): interval start (epoch)
+            end (int): interval end (epoch, excluded)
+        """
+
+        with self._lock:
+            intervals = self._coverage[kind].get (key, [])
+            self._coverage[kind][key] = merge_intervals (
+                intervals + [(start, end)])
+
+    def save (self):
+        """ Function to write the manifest to its file. """
+
+        with self._lock:
+            coverage = json.dumps (self._coverage, sort_keys=True)
+
+        temp_filename = '{0}.part_{1}'.format (self._filename, os.getpid ())
+        with open (temp_filename, 'w') as f:
+            f.write (coverage)
+        os.rename (temp_filename, self._filename)
+
+    @property
+    def filename (self):
+        """ Manifest file name.
+
+        Returns:
+            str: manifest file name
+        """
+
+        return self._filename
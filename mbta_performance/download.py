@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import re
+
+from collections import namedtuple
+
+from client import get_session
+from storage import write_raw
+
+
+class Query (namedtuple ('Query', ['url', 'out_file', 'kind', 'key', 'start', 'end'])):
+    """ A single MBTA API query: the travel times ("traveltimes") or dwell
+    times ("dwelltimes") of one track or stop (`key`) over one window (`start`
+    to `end`, as epochs), downloaded from `url` to `out_file`.
+    """
+
+    __slots__ = ()
+
+    def window (self, start, end):
+        """ Function to get the same query over another window.
+
+        Args:
+            start (int): window start (epoch)
+            end (int): window end (epoch)
+
+        Returns:
+            `Query`: query of the new window
+        """
+
+        url = re.sub (r'from_datetime=\d+', 'from_datetime={0}'.format (start),
+                      self.url)
+        url = re.sub (r'to_datetime=\d+', 'to_datetime={0}'.format (end), url)
+        out_file = self.out_file
+        suffix = '_{0}_{1}.json'.format (self.start, self.end)
+        if out_file is not None and out_file.endswith (suffix):
+            out_file = '{0}_{1}_{2}.json'.format (
+                out_file[:-len (suffix)], start, end)
+        return Query (url, out_file, self.kind, self.key, start, end)
+
+
+def fetch (url, out_file=None, compress=None):
+    """ Function to download a single MBTA API query.
+
+    Args:
+        url (str): query URL
+        out_file (str, optional): file to write the response to. If None, the
+            response is printed instead.
+        compress (str, optional): storage format of the file (see
+            `storage.raw_filename`)
+    """
+
+    save_response (get_session ().get (url, stream=True), out_file,
+                   compress=compress)
+
+
+def save_response (response, out_file=None, compress=None, max_bytes=None):
+    """ Function to stream a query response to disk, chunk by chunk.
+
+    Args:
+        response (`StreamingResponse`): response of the query
+        out_file (str, optional): file to write the response to. If None, the
+            response is printed instead.
+        compress (str, optional): storage format of the file (see
+            `storage.raw_filename`)
+        max_bytes (int, optional): if the response is larger than this, stop
+            reading it and discard what was written
+
+    Returns:
+        int: bytes of the response, or None if `max_bytes` was exceeded
+    """
+
+    if out_file is None:
+        body = response.read ()
+        print (body)
+        return len (body)
+
+    try:
+        return write_raw (response.iter_content (), out_file,
+                          compress=compress, max_bytes=max_bytes)
+    finally:
+        response.close ()
+
+
+def fetch_all (requests, num_workers=1, dry=False, callback=None,
+               scheduler=None, compress=None):
+    """ Function to download a grid of MBTA API queries, optionally with a
+    bounded pool of concurrent workers. Failed queries are retried, and
+    windows that time out are split (see `RequestScheduler`).
+
+    Args:
+        requests (list): list of `Query`s to download
+        num_workers (int, optional): maximum number of queries in flight at
+            once. With 1, queries are issued one after another.
+        dry (bool, optional): if True, print the responses instead of writing
+            them out
+        callback (function, optional): called with each `Query` once it has
+            been written out. It may be called from several threads at once.
+        scheduler (`RequestScheduler`, optional): scheduler of the queries. By
+            default, a `RequestScheduler` with default settings is used.
+        compress (str, optional): storage format of the files (see
+            `storage.raw_filename`)
+    """
+
+    from scheduler import RequestScheduler
+
+    if scheduler is None:
+        scheduler = RequestScheduler ()
+
+    scheduler.run (requests, num_workers=num_workers, dry=dry,
+                   callback=callback, compress=compress)
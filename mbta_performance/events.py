@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import heapq
+import numpy as np
+
+from bisect import bisect_right
+
+# Columns kept of the MBTA JSON events, and their types. Times are epochs.
+event_fields = {
+    'traveltimes': (('arr_dt', np.int64), ('dep_dt', np.int64),
+                    ('travel_time_sec', np.int32),
+                    ('benchmark_travel_time_sec', np.int32)),
+    'dwelltimes': (('arr_dt', np.int64), ('dep_dt', np.int64),
+                   ('dwell_time_sec', np.int32)),
+}
+
+
+class EventTable (object):
+    """ This is a class to hold the travel time or dwell time events of a
+    track or stop as typed columns, ordered by departure time.
+    """
+
+    def __init__ (self, kind, columns=None):
+        """
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            columns (dict, optional): arrays of each column of the kind (see
+                `event_fields`), of equal length and ordered by departure time
+                (see `sorted`). By default, the table is empty.
+        """
+
+        if kind not in event_fields:
+            raise ValueError ("Unknown event kind {0}. Please use one of {1} ...".format (
+                kind, sorted (event_fields)))
+
+        self._kind = kind
+        self._time_lists = None
+        self._columns = {}
+        for (name, dtype) in event_fields[kind]:
+            if columns is None:
+                self._columns[name] = np.zeros (0, dtype=dtype)
+            else:
+                self._columns[name] = np.asarray (columns[name], dtype=dtype)
+
+    @classmethod
+    def from_events (cls, kind, events):
+        """ Function to build a table from MBTA JSON events.
+
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            events (list): MBTA JSON event dicts, e.g. the "travel_times" list
+                of a travel time response
+
+        Returns:
+            `EventTable`: table of the events, ordered by departure time
+        """
+
+        columns = {}
+        for (name, dtype) in event_fields[kind]:
+            columns[name] = np.fromiter (
+                (int (e[name]) for e in events), dtype=dtype, count=len (events))
+        return cls (kind, columns).sorted ()
+
+    @classmethod
+    def concatenate (cls, kind, tables):
+        """ Function to join tables end to end, and order the events by
+        departure time. Events departing at the same time keep their order.
+
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            tables (list): `EventTable`s to join
+
+        Returns:
+            `EventTable`: joined table
+        """
+
+        if len (tables) == 1:
+            return tables[0].sorted ()
+        if len (tables) == 0:
+            return cls (kind)
+
+        columns = {}
+        for (name, dtype) in event_fields[kind]:
+            columns[name] = np.concatenate ([t[name] for t in tables])
+        return cls (kind, columns).sorted ()
+
+    def sorted (self):
+        """ Function to order the events by departure time.
+
+        Returns:
+            `EventTable`: this table if already ordered, or an ordered copy
+        """
+
+        dep = self._columns['dep_dt']
+        if len (dep) < 2 or np.all (dep[1:] >= dep[:-1]):
+            return self
+        order = np.argsort (dep, kind='mergesort')
+        return EventTable (self._kind, dict (
+            (name, column[order]) for (name, column) in self._columns.iteritems ()))
+
+    def select (self, start=None, end=None):
+        """ Function to select the events departing within a time period.
+
+        Args:
+            start (int, optional): period start (epoch)
+            end (int, optional): period end (epoch, excluded)
+
+        Returns:
+            `EventTable`: table of the selected events
+        """
+
+        dep = self._columns['dep_dt']
+        i = 0
+        j = len (dep)
+        if start is not None:
+            i = np.searchsorted (dep, start, side='left')
+        if end is not None:
+            j = np.searchsorted (dep, end, side='left')
+        if i == 0 and j == len (dep):
+            return self
+        # Slices are views: memory-mapped columns stay on disk
+        return EventTable (self._kind, dict (
+            (name, column[i:j]) for (name, column) in self._columns.iteritems ()))
+
+    def time_lists (self):
+        """ Function to get the time columns as lists, and their running
+        maxima, for matching events (see `EventQueue`). Tables are not
+        modified once built, so the lists are computed once and shared by all
+        queues of the table.
+
+        Returns:
+            tuple: arrival times, departure times, running maximum of the
+                arrival times, and running maximum of the departure times
+                (epoch)
+        """
+
+        if self._time_lists is None:
+            arr = self._columns['arr_dt']
+            dep = self._columns['dep_dt']
+            # Running maxima: the first event whose time is later than t is
+            # the first whose running maximum is, even where arrivals are not
+            # ordered
+            self._time_lists = (arr.tolist (), dep.tolist (),
+                                np.maximum.accumulate (arr).tolist (),
+                                np.maximum.accumulate (dep).tolist ())
+        return self._time_lists
+
+    def __len__ (self):
+        return len (self._columns['dep_dt'])
+
+    def __getitem__ (self, key):
+        """ Get a column or an event.
+
+        Args:
+            key (str or int): column name, or index of an event
+
+        Returns:
+            numpy.ndarray or dict: the column, or the event as a dict of ints
+                with the keys of an MBTA JSON event
+        """
+
+        if isinstance (key, basestring):
+            return self._columns[key]
+        return dict ((name, int (column[key]))
+                     for (name, column) in self._columns.iteritems ())
+
+    def __iter__ (self):
+        for i in xrange (len (self)):
+            yield self[i]
+
+    def __eq__ (self, other):
+        if not isinstance (other, EventTable) or other.kind != self.kind:
+            return False
+        return all (np.array_equal (column, other[name])
+                    for (name, column) in self._columns.iteritems ())
+
+    def __ne__ (self, other):
+        return not self == other
+
+    def __repr__ (self):
+        return '<EventTable: {0}, {1} events>'.format (self._kind, len (self))
+
+    @property
+    def kind (self):
+        """ Kind of events in the table.
+
+        Returns:
+            str: "traveltimes" or "dwelltimes"
+        """
+
+        return self._kind
+
+    @property
+    def nbytes (self):
+        """ Memory used by the columns of the table.
+
+        Returns:
+            int: bytes used
+        """
+
+        return sum (column.nbytes for column in self._columns.itervalues ())
+
+
+class EventQueue (object):
+    """ This is a class to consume the events of an `EventTable` while trains
+    are assembled, in the manner of a deque from which events are taken either
+    from the front or from the middle. The table itself is not modified, so
+    any number of queues may consume it in turn.
+
+    Events are matched by binary search over the running maxima of the time
+    columns, and consumed events are skipped through a free list (each entry
+    points at the next event that may remain), so that taking events from
+    anywhere in the queue and matching times stay close to O(log n).
+    """
+
+    def __init__ (self, table):
+        """
+        Args:
+            table (`EventTable`): events to consume
+        """
+
+        self.table = table
+        # Shared, read-only: only the free list belongs to the queue
+        self._arr, self._dep, self._arr_max, self._dep_max = table.time_lists ()
+        self._next = range (len (self._dep) + 1)
+        self._remaining = len (self._dep)
+
+    def __len__ (self):
+        return self._remaining
+
+    def __nonzero__ (self):
+        return self._remaining > 0
+
+    def _next_remaining (self, i):
+        """ Function to get the first remaining event at or after an index.
+
+        Args:
+            i (int): index of the event in the table
+
+        Returns:
+            int: index of the event, or the table length if none remains
+        """
+
+        nxt = self._next
+        j = i
+        while nxt[j] != j:
+            j = nxt[j]
+        # Path compression
+        while nxt[i] != j:
+            nxt[i], i = j, nxt[i]
+        return j
+
+    def first_departure (self):
+        """ Function to get the departure time of the first remaining event.
+
+        Returns:
+            int: departure time (epoch), or None if no events remain
+        """
+
+        if self._remaining == 0:
+            return None
+        return self._dep[self._next_remaining (0)]
+
+    def take (self, i):
+        """ Function to consume an event.
+
+        Args:
+            i (int): index of the event in the table
+
+        Returns:
+            int: index of the event
+        """
+
+        self._next[i] = i + 1
+        self._remaining -= 1
+        return i
+
+    def popleft (self):
+        """ Function to consume the first remaining event.
+
+        Returns:
+            int: index of the event in the table
+        """
+
+        if self._remaining == 0:
+            raise IndexError ("pop from an empty EventQueue")
+        return self.take (self._next_remaining (0))
+
+    def consumed (self):
+        """ Function to get the events consumed so far.
+
+        Returns:
+            list: indices of the events in the table, in order
+        """
+
+        nxt = self._next
+        return [i for i in xrange (len (self._dep)) if nxt[i] != i]
+
+    def find (self, column, t, tolerance=10):
+        """ Function to find the first remaining event whose time is within a
+        tolerance of a given time. Events are checked in order, until one past
+        the given time is reached.
+
+        Args:
+            column (str): "arr_dt" or "dep_dt"
+            t (int): time (epoch) to match
+            tolerance (int, optional): largest time difference (seconds,
+                excluded) of a match
+
+        Returns:
+            int: index of the event in the table, or None if none matches
+        """
+
+        if column == 'arr_dt':
+            values, maxima = self._arr, self._arr_max
+        else:
+            values, maxima = self._dep, self._dep_max
+
+        # Checking events in order stops at the first remaining one later
+        # than t - tolerance: it either matches, or is past t
+        earliest = t - tolerance
+        n = len (values)
+        i = self._next_remaining (bisect_right (maxima, earliest))
+        while i < n and values[i] <= earliest:
+            i = self._next_remaining (i + 1)
+
+        if i < n and values[i] < t + tolerance:
+            return i
+        return None
+
+    def arrival (self, i):
+        """ Arrival time (epoch) of an event of the table. """
+
+        return self._arr[i]
+
+    def departure (self, i):
+        """ Departure time (epoch) of an event of the table. """
+
+        return self._dep[i]
+
+
+class DepartureHeap (object):
+    """ This is a class to keep the `EventQueue`s of the stops of a line in a
+    heap, ordered by their first remaining departure, so that the earliest
+    departure of all stops is found in O(log stops). It is used as the
+    dictionary of queues it is built from.
+
+    Heap entries are refreshed lazily: as queues are consumed, their first
+    departure only grows, so an outdated entry is updated when it reaches the
+    top of the heap.
+    """
+
+    def __init__ (self, queues):
+        """
+        Args:
+            queues (dict): `EventQueue`s keyed by stop ID. Stops departing at
+                the same time are ordered as the dictionary iterates.
+        """
+
+        self._queues = queues
+        self._heap = [(queue.first_departure (), i, key)
+                      for (i, (key, queue)) in enumerate (queues.iteritems ())
+                      if queue]
+        heapq.heapify (self._heap)
+
+    def first (self):
+        """ Function to get the stop with the earliest remaining departure.
+
+        Returns:
+            str: stop ID, or None if no events remain
+        """
+
+        heap = self._heap
+        while heap:
+            dep_t, i, key = heap[0]
+            current = self._queues[key].first_departure ()
+            if current == dep_t:
+                return key
+            if current is None:
+                heapq.heappop (heap)
+            else:
+                heapq.heapreplace (heap, (current, i, key))
+        return None
+
+    def __getitem__ (self, key):
+        return self._queues[key]
+
+    def __contains__ (self, key):
+        return key in self._queues
+
+    def __len__ (self):
+        return len (self._queues)
+
+    def iteritems (self):
+        return self._queues.iteritems ()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import json
+import shutil
+import numpy as np
+
+from events import EventTable, event_fields
+
+
+class EventStore (object):
+    """ This is a class to keep the travel time and dwell time events of a line
+    and direction as binary columns on disk, one ".npy" file per track or stop
+    and column, with a small JSON index. Columns are opened memory-mapped, so
+    loading is near-instant, pages are read on demand, and processes reading
+    the same store share the page cache.
+    """
+
+    def __init__ (self, directory):
+        """
+        Args:
+            directory (str): store directory
+        """
+
+        self._directory = directory
+        self._index = None
+
+    @classmethod
+    def for_line (cls, path, line):
+        """ Function to get the store of a `Line` in a data directory.
+
+        Args:
+            path (str): data directory used in `Line.get_traveltimes` and
+                `Line.get_dwelltimes`
+            line (`Line`): line (and direction) of the store
+
+        Returns:
+            `EventStore`: store of the line
+        """
+
+        return cls ('{0}/{1}/events_{1}_{2}'.format (
+            path, line.name, line.direction_id))
+
+    def _column_filename (self, directory, kind, key, name):
+        return '{0}/{1}_{2}_{3}.npy'.format (directory, kind, key, name)
+
+    def _load_index (self):
+        if self._index is None:
+            with open ('{0}/index.json'.format (self._directory)) as f:
+                self._index = json.load (f)
+        return self._index
+
+    def exists (self):
+        """ Function to check whether the store has been written.
+
+        Returns:
+            bool: True if the store exists
+        """
+
+        return os.path.exists ('{0}/index.json'.format (self._directory))
+
+    def write (self, tables, sources):
+        """ Function to write the store, replacing any previous one.
+
+        Args:
+            tables (dict): lists of (key, `EventTable`) tuples, keyed by kind
+                ("traveltimes" or "dwelltimes")
+            sources (list): names of the raw files the events were read from
+        """
+
+        parent, name = os.path.split (self._directory)
+        temp_directory = os.path.join (parent, '.part_{0}_{1}'.format (
+            name, os.getpid ()))
+        os.makedirs (temp_directory)
+
+        try:
+            index = {'sources': sorted (sources), 'keys': {}}
+            for (kind, kind_tables) in tables.iteritems ():
+                index['keys'][kind] = {}
+                for (key, table) in kind_tables:
+                    for (name, dtype) in event_fields[kind]:
+                        np.save (self._column_filename (temp_directory, kind, key, name),
+                                 table[name])
+                    index['keys'][kind][key] = len (table)
+            with open ('{0}/index.json'.format (temp_directory), 'w') as f:
+                json.dump (index, f, sort_keys=True)
+
+            if os.path.exists (self._directory):
+                shutil.rmtree (self._directory)
+            os.rename (temp_directory, self._directory)
+        except:
+            shutil.rmtree (temp_directory, ignore_errors=True)
+            raise
+
+        self._index = index
+
+    def keys (self, kind):
+        """ Function to get the track or stop keys in the store.
+
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+
+        Returns:
+            list: sorted keys
+        """
+
+        return sorted (self._load_index ()['keys'].get (kind, {}))
+
+    def read (self, kind, key, mmap=True):
+        """ Function to open the events of a track or stop.
+
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            key (str): track or stop key
+            mmap (bool, optional): if True, memory-map the columns rather
+                than reading them
+
+        Returns:
+            `EventTable`: events of the track or stop
+        """
+
+        if key not in self._load_index ()['keys'].get (kind, {}):
+            raise LookupError ("No {0} stored for {1} ...".format (kind, key))
+
+        columns = {}
+        for (name, dtype) in event_fields[kind]:
+            columns[name] = np.load (
+                self._column_filename (self._directory, kind, key, name),
+                mmap_mode='r' if mmap else None)
+        return EventTable (kind, columns)
+
+    @property
+    def sources (self):
+        """ Names of the raw files the stored events were read from.
+
+        Returns:
+            list: sorted file names
+        """
+
+        return self._load_index ()['sources']
+
+    @property
+    def directory (self):
+        """ Store directory.
+
+        Returns:
+            str: store directory
+        """
+
+        return self._directory
@@ -4,22 +4,67 @@ from __future__ import print_function
 
 import os
 import json
-import urllib2
 import copy
 
 import cache
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from utils import lines, ensure_dir, mbta_traveltime_url, mbta_dwelltime_url, \
-    get_epoch_time, localize_eastern_dt
+from utils import lines, ensure_dir, mbta_traveltime_url, mbta_dwelltime_url
+from localtime import eastern_epoch
+from download import Query, fetch_all
+from coverage import plan_windows, max_window
 
 
-class Stop (object):
+_slot_names = {}  # attribute names held in slots, by class
+
+class Piece (object):
+    """
+    This is a base class of the stops and tracks of a line. A line holds many
+    of them, so their attributes are held in slots, without a dictionary per
+    instance. They are pickled (and copied) as a dictionary of their
+    attributes, as they were before they had slots.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def slot_names (cls):
+        """ Function to get the names of the attributes of the class.
+
+        Returns:
+            tuple: attribute names, held in slots
+        """
+
+        names = _slot_names.get (cls)
+        if names is None:
+            names = tuple (name for c in reversed (cls.__mro__)
+                           for name in c.__dict__.get ('__slots__', ()))
+            _slot_names[cls] = names
+        return names
+
+    def __getstate__ (self):
+        state = {}
+        for name in self.slot_names ():
+            try:
+                state[name] = getattr (self, name)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__ (self, state):
+        for (name, value) in state.iteritems ():
+            setattr (self, name, value)
+
+
+class Stop (Piece):
     """
     This is a class to contain T-stop information taken from MBTA API.
     """
 
+    __slots__ = ('_next_track', '_prev_track', '_stop_name', '_station_name',
+                 '_stop_id', '_stop_order', '_lon', '_lat')
+
     def __init__ (self, stop_dict=None, existing_stop=None):
         """
         Args:
@@ -163,12 +208,14 @@ class Stop (object):
         return self._stop_order
 
 
-class Track (object):
+class Track (Piece):
     """
     This is a class to contain tracks that connect a pair of T-stops, taken
     from MBTA API.
     """
 
+    __slots__ = ('_prev_stop', '_next_stop')
+
     def __init__ (self, stop_pair=None, existing_track=None):
         """
         Args:
@@ -357,154 +404,227 @@ class Line (object):
             stop._prev_track = track
             self._tracks.append (track)
 
-    def get_traveltimes (self, path, start_time, end_time, dry=False):
-        """ Function to download MBTA travel time JSONs for a specified time
-        period.
+    def _get_epoch_range (self, start_time, end_time):
+        """ Function to check and convert the time period of a query.
 
         Args:
-            path (str): directory to save travel times to
-            start_time (datetime): start time of travel times (given in US Eastern Time)
-            end_time (datetime): end time of travel times (given in US Eastern Time)
-            dry (bool, optional): if True, do not write out data to path
+            start_time (datetime): start time of the period (given in US Eastern Time)
+            end_time (datetime): end time of the period (given in US Eastern Time)
 
         Returns:
-            Files of MBTA JSON travel times for each `Track` in the `Line`. Files
-            will be output to a subdirectory with name "<`Line.name`>/", and
-            files will have names of the form:
-                traveltimes_<`Line.name`>_<`Line.direction_id`>_<First Stop ID>_<Second Stop ID>_<Start Time>_<End Time>.json
-            The MBTA API limits queries to 7 day windows, so multiple files may
-            be output per-track.
+            tuple: (start epoch, end epoch) of the period
         """
 
         if not isinstance (start_time, datetime):
             raise TypeError ("Input time must be a `datetime` ...")
         else:
-            start_time = localize_eastern_dt (start_time)
+            start = eastern_epoch (start_time)
 
         if not isinstance (end_time, datetime):
             raise TypeError ("Input time must be a `datetime` ...")
         else:
-            end_time = localize_eastern_dt (end_time)
+            end = eastern_epoch (end_time)
 
-        if start_time > end_time:
+        if start > end:
             raise ValueError ("Start time must be before end time ...")
 
-        seven_days = timedelta (days=7)
-        start_time_temp = start_time
-        end_time_temp = min (end_time, start_time_temp + seven_days)
+        return start, end
 
+    def _get_out_dir (self, path, dry=False):
         out_dir = '{0}/{1}'.format (path, self.name)
         if not dry:
             out_dir = ensure_dir (out_dir)
+        return out_dir
+
+    def traveltime_requests (self, path, start_time, end_time, dry=False,
+                             manifest=None, window=max_window):
+        """ Function to list the MBTA travel time queries for a specified time
+        period (see `Line.get_traveltimes`).
 
-        while start_time_temp < end_time:
-            for track in self.tracks:
+        Args:
+            path (str): directory to save travel times to
+            start_time (datetime): start time of travel times (given in US Eastern Time)
+            end_time (datetime): end time of travel times (given in US Eastern Time)
+            dry (bool, optional): if True, do not create the output directory
+            manifest (`CoverageManifest`, optional): if given, only query the
+                windows that it does not cover yet
+            window (int, optional): longest query window (seconds). The MBTA
+                API allows at most 7 days.
+
+        Returns:
+            list: `Query`s, one per `Track` and query window
+        """
+
+        start, end = self._get_epoch_range (start_time, end_time)
+        out_dir = self._get_out_dir (path, dry=dry)
+
+        requests = []
+        for track in self.tracks:
+            key = '{0}_{1}'.format (track.prev_stop.stop_id, track.next_stop.stop_id)
+            covered = None
+            if manifest is not None:
+                covered = manifest.covered ('traveltimes', key)
+
+            for (window_start, window_end) in plan_windows (start, end, covered, window):
                 appender = 'from_stop={0}&to_stop={1}&from_datetime={2}&to_datetime={3}'.format (
                     track.prev_stop.stop_id, track.next_stop.stop_id,
-                    get_epoch_time (start_time_temp), get_epoch_time (end_time_temp))
+                    window_start, window_end)
                 url = mbta_traveltime_url + appender
-                # print (url)
 
-                tt_json = urllib2.urlopen (url)
+                out_file = '{0}/traveltimes_{1}_{2}_{3}_{4}_{5}.json'.format (
+                    out_dir, self.name, self.direction_id, key,
+                    window_start, window_end)
 
-                out_file = '{0}/traveltimes_{1}_{2}_{3}_{4}_{5}_{6}.json'.format (
-                    out_dir, self.name, self.direction_id,
-                    track.prev_stop.stop_id, track.next_stop.stop_id,
-                    get_epoch_time (start_time),
-                    get_epoch_time (end_time))
+                requests.append (Query (url, out_file, 'traveltimes', key,
+                                        window_start, window_end))
 
-                if not dry:
-                    with open (out_file, 'w') as f:
-                        f.write (tt_json.read ())
-                else:
-                    print (tt_json.read ())
+        return requests
 
-            start_time_temp += seven_days
-            end_time_temp = min (end_time, end_time_temp + seven_days)
+    def dwelltime_requests (self, path, start_time, end_time, dry=False,
+                            manifest=None, window=max_window):
+        """ Function to list the MBTA dwell time queries for a specified time
+        period (see `Line.get_dwelltimes`).
 
+        Args:
+            path (str): directory to save dwell times to
+            start_time (datetime): start time of dwell times (given in US Eastern Time)
+            end_time (datetime): end time of dwell times (given in US Eastern Time)
+            dry (bool, optional): if True, do not create the output directory
+            manifest (`CoverageManifest`, optional): if given, only query the
+                windows that it does not cover yet
+            window (int, optional): longest query window (seconds). The MBTA
+                API allows at most 7 days.
 
-    def get_dwelltimes (self, path, start_time, end_time, dry=False):
-        """ Function to download MBTA train dwell time JSONs for a specified time
+        Returns:
+            list: `Query`s, one per `Stop` and query window
+        """
+
+        start, end = self._get_epoch_range (start_time, end_time)
+        out_dir = self._get_out_dir (path, dry=dry)
+
+        requests = []
+        for stop in self.stops:
+            key = stop.stop_id
+            covered = None
+            if manifest is not None:
+                covered = manifest.covered ('dwelltimes', key)
+
+            for (window_start, window_end) in plan_windows (start, end, covered, window):
+                appender = 'stop={0}&from_datetime={1}&to_datetime={2}'.format (
+                    stop.stop_id, window_start, window_end)
+                url = mbta_dwelltime_url + appender
+
+                out_file = '{0}/dwelltimes_{1}_{2}_{3}_{4}_{5}.json'.format (
+                    out_dir, self.name, self.direction_id, key,
+                    window_start, window_end)
+
+                requests.append (Query (url, out_file, 'dwelltimes', key,
+                                        window_start, window_end))
+
+        return requests
+
+    def get_traveltimes (self, path, start_time, end_time, dry=False,
+                         num_workers=1, scheduler=None, compress=None):
+        """ Function to download MBTA travel time JSONs for a specified time
         period.
 
         Args:
-            path (str): directory to save dwell times to
+            path (str): directory to save travel times to
             start_time (datetime): start time of travel times (given in US Eastern Time)
             end_time (datetime): end time of travel times (given in US Eastern Time)
             dry (bool, optional): if True, do not write out data to path
+            num_workers (int, optional): maximum number of concurrent queries
+            scheduler (`RequestScheduler`, optional): scheduler of the queries,
+                setting their rate limit, retries and window splitting
+            compress (str, optional): storage format of the files, "gzip" or
+                "bz2" to compress them (adding ".gz" or ".bz2" to their names)
 
         Returns:
-            Files of MBTA JSON dwell times for each `Track` in the `Line`. Files
+            Files of MBTA JSON travel times for each `Track` in the `Line`. Files
             will be output to a subdirectory with name "<`Line.name`>/", and
             files will have names of the form:
-                dwelltimes_<`Line.name`>_<`Line.direction_id`>_<Stop ID>_<Start Time>_<End Time>.json
+                traveltimes_<`Line.name`>_<`Line.direction_id`>_<First Stop ID>_<Second Stop ID>_<Start Time>_<End Time>.json
             The MBTA API limits queries to 7 day windows, so multiple files may
-            be output per-stop.
+            be output per-track, each named after its own window.
         """
 
-        if not isinstance (start_time, datetime):
-            raise TypeError ("Input time must be a `datetime` ...")
-        else:
-            start_time = localize_eastern_dt (start_time)
+        requests = self.traveltime_requests (path, start_time, end_time, dry=dry)
+        fetch_all (requests, num_workers=num_workers, dry=dry,
+                   scheduler=scheduler, compress=compress)
 
-        if not isinstance (end_time, datetime):
-            raise TypeError ("Input time must be a `datetime` ...")
-        else:
-            end_time = localize_eastern_dt (end_time)
+    def get_dwelltimes (self, path, start_time, end_time, dry=False,
+                        num_workers=1, scheduler=None, compress=None):
+        """ Function to download MBTA train dwell time JSONs for a specified time
+        period.
 
-        if start_time > end_time:
-            raise ValueError ("Start time must be before end time ...")
+        Args:
+            path (str): directory to save dwell times to
+            start_time (datetime): start time of travel times (given in US Eastern Time)
+            end_time (datetime): end time of travel times (given in US Eastern Time)
+            dry (bool, optional): if True, do not write out data to path
+            num_workers (int, optional): maximum number of concurrent queries
+            scheduler (`RequestScheduler`, optional): scheduler of the queries,
+                setting their rate limit, retries and window splitting
+            compress (str, optional): storage format of the files, "gzip" or
+                "bz2" to compress them (adding ".gz" or ".bz2" to their names)
 
-        seven_days = timedelta (days=7)
-        start_time_temp = start_time
-        end_time_temp = min (end_time, start_time_temp + seven_days)
+        Returns:
+            Files of MBTA JSON dwell times for each `Track` in the `Line`. Files
+            will be output to a subdirectory with name "<`Line.name`>/", and
+            files will have names of the form:
+                dwelltimes_<`Line.name`>_<`Line.direction_id`>_<Stop ID>_<Start Time>_<End Time>.json
+            The MBTA API limits queries to 7 day windows, so multiple files may
+            be output per-stop, each named after its own window.
+        """
 
-        out_dir = '{0}/{1}'.format (path, self.name)
-        if not dry:
-            out_dir = ensure_dir (out_dir)
+        requests = self.dwelltime_requests (path, start_time, end_time, dry=dry)
+        fetch_all (requests, num_workers=num_workers, dry=dry,
+                   scheduler=scheduler, compress=compress)
 
-        while start_time_temp < end_time:
-            for stop in self.stops:
-                appender = 'stop={0}&from_datetime={1}&to_datetime={2}'.format (
-                    stop.stop_id, get_epoch_time (start_time_temp),
-                    get_epoch_time (end_time_temp))
-                url = mbta_dwelltime_url + appender
-                # print (url)
+    def __getitem__ (self, key):
+        """ Get selection of `Stop`s and `Track`s, as a view sharing them with
+        the line: changes to the stops and tracks of the selection change the
+        line (see `copy`).
 
-                dt_json = urllib2.urlopen (url)
+        Args:
+            key (int or slice): indices of stops to select.
 
-                out_file = '{0}/dwelltimes_{1}_{2}_{3}_{4}_{5}.json'.format (
-                    out_dir, self.name, self.direction_id,
-                    stop.stop_id, get_epoch_time (start_time),
-                    get_epoch_time (end_time))
+        Returns:
+            `Line`: line with selection of stops and tracks
+        """
 
-                if not dry:
-                    with open (out_file, 'w') as f:
-                        f.write (dt_json.read ())
-                else:
-                    print (dt_json.read ())
+        stops, tracks = self._select_pieces (key)
 
-            start_time_temp += seven_days
-            end_time_temp = min (end_time, end_time_temp + seven_days)
+        out_l = Line ()
+        out_l._name = self._name
+        out_l._direction_id = self._direction_id
+        out_l._direction_name = self._direction_name
+        out_l._stops = stops
+        out_l._tracks = tracks
+        out_l._start = out_l._stops[0]
+        out_l._end = out_l._stops[-1]
+        out_l._current = out_l._start
+        return out_l
 
-    def __getitem__ (self, key):
-        """ Get selection of `Stop`s and `Track`s
+    def _select_pieces (self, key):
+        """ Function to select stops, and the tracks between them.
 
         Args:
             key (int or slice): indices of stops to select.
 
         Returns:
-            `Line`: train with selection of stops and tracks
+            tuple: lists of the selected stops and tracks (None if a single
+                stop is selected by its index)
         """
 
         if self.stops is None:
             raise ValueError ("The line's stops have not been set. Please use `Line.load` ...")
 
-        stops = copy.deepcopy (self.stops[key])
+        stops = self.stops[key]
         if isinstance (stops, Stop):
             stops = [stops]
-        stops[0]._prev_track = None
-        stops[-1]._next_track = None
+        if not stops:
+            raise IndexError ("No stops selected. Please check the key ...")
 
         if isinstance (key, slice):
             try:
@@ -512,18 +632,70 @@ class Line (object):
             except:
                 # For the case where the second index is None
                 t_key = slice (key.start, key.stop)
-            tracks = copy.deepcopy (self.tracks[t_key])
+            tracks = self.tracks[t_key]
         else:
             tracks = None
+        return (stops, tracks)
 
-        out_l = Line (self)
-        out_l._stops = stops
-        out_l._tracks = tracks
-        out_l._start = out_l._stops[0]
-        out_l._end = out_l._stops[-1]
-        out_l._current = out_l._start
+    def copy (self):
+        """ Function to copy the line, with stops and tracks of its own (e.g.
+        to change a selection of the line without changing the line).
+
+        Returns:
+            `Line`: copy of the line
+        """
+
+        out_l = Line ()
+        out_l._name = self._name
+        out_l._direction_id = self._direction_id
+        out_l._direction_name = self._direction_name
+        if self._stops is None:
+            return out_l
+
+        out_l._stops, out_l._tracks, copies = self._copy_pieces ()
+        out_l._start = copies.get (id (self._start))
+        out_l._end = copies.get (id (self._end))
+        out_l._current = copies.get (id (self._current))
         return out_l
 
+    def _copy_pieces (self):
+        """ Function to copy the stops and tracks of the line, linked as in
+        the line, but for the first and last stops, which are linked to no
+        track before and after them.
+
+        Returns:
+            tuple: lists of the copied stops and tracks (or None if the line
+                has no tracks), and the copy of each piece, keyed by the `id`
+                of the piece
+        """
+
+        copies = {}
+        stops = []
+        for stop in self._stops:
+            new_stop = stop.__class__.__new__ (stop.__class__)
+            new_stop.__setstate__ (stop.__getstate__ ())
+            new_stop._prev_track = None
+            new_stop._next_track = None
+            copies[id (stop)] = new_stop
+            stops.append (new_stop)
+
+        if self._tracks is None:
+            return (stops, None, copies)
+
+        tracks = []
+        for track in self._tracks:
+            new_track = track.__class__.__new__ (track.__class__)
+            new_track.__setstate__ (track.__getstate__ ())
+            new_track._prev_stop = copies.get (id (track._prev_stop))
+            new_track._next_stop = copies.get (id (track._next_stop))
+            if new_track._prev_stop is not None:
+                new_track._prev_stop._next_track = new_track
+            if new_track._next_stop is not None:
+                new_track._next_stop._prev_track = new_track
+            copies[id (track)] = new_track
+            tracks.append (new_track)
+        return (stops, tracks, copies)
+
     def __iter__ (self):
         self._current = self.start
         return self
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import calendar
+import numpy as np
+
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from pytz import timezone
+
+utc = timezone ('UTC')
+eastern = timezone ('US/Eastern')
+
+day_seconds = 24 * 3600
+_epoch_ordinal = date (1970, 1, 1).toordinal ()
+_epoch_weekday = date (1970, 1, 1).weekday ()
+
+
+def _zone_tzinfo (zone, epoch):
+    """ Function to get the `tzinfo` of a `pytz` time zone at an event time,
+    as `pytz` converts times with.
+
+    Args:
+        zone (`pytz.tzinfo.BaseTzInfo`): time zone
+        epoch (int): event time (epoch)
+
+    Returns:
+        `tzinfo`: time zone information at the time
+    """
+
+    dt = datetime (1970, 1, 1) + timedelta (seconds=epoch)
+    return utc.localize (dt).astimezone (zone).tzinfo
+
+def _transition_table (zone, start=datetime (1900, 1, 1),
+                       end=datetime (2038, 1, 1), step=7 * day_seconds):
+    """ Function to gather the UTC offset transitions of a `pytz` time zone,
+    probing its offsets every `step` seconds, and finding each change to the
+    second by bisection. Changes closer to each other than `step` are missed.
+
+    Args:
+        zone (`pytz.tzinfo.BaseTzInfo`): time zone
+        start (`datetime`, optional): start (UTC) of the probed times. The
+            offset at the start applies to all earlier times.
+        end (`datetime`, optional): end (UTC) of the probed times. The offset
+            at the end applies to all later times (`pytz` tables end in 2037).
+        step (int, optional): time (seconds) between probes
+
+    Returns:
+        tuple: epochs the offsets start at, offsets (seconds) and `tzinfo`s
+            (as `pytz` localizes with) of each transition, in order
+    """
+
+    first = (start.toordinal () - _epoch_ordinal) * day_seconds
+    last = (end.toordinal () - _epoch_ordinal) * day_seconds
+    tzinfo = _zone_tzinfo (zone, first)
+    transitions = [(datetime.min.toordinal () - _epoch_ordinal) * day_seconds]
+    tzinfos = [tzinfo]
+    for probe in xrange (first + step, last + 1, step):
+        probe_tzinfo = _zone_tzinfo (zone, probe)
+        if probe_tzinfo is tzinfo:
+            continue
+        # The change is after `lo` and at or before `hi`
+        lo, hi = probe - step, probe
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if _zone_tzinfo (zone, mid) is tzinfo:
+                lo = mid
+            else:
+                hi = mid
+        tzinfo = _zone_tzinfo (zone, hi)
+        transitions.append (hi)
+        tzinfos.append (tzinfo)
+        if tzinfo is not probe_tzinfo:
+            raise ValueError ("Offsets of {0} change twice within {1} seconds".format (
+                zone, step))
+    offsets = [int (start.replace (tzinfo=tzinfo).utcoffset ().total_seconds ())
+               for tzinfo in tzinfos]
+    return (transitions, offsets, tzinfos)
+
+# The US/Eastern table is gathered once: lists for scalar lookups, arrays for
+# vectorized ones
+_transitions, _offsets, _tzinfos = _transition_table (eastern)
+_transition_array = np.array (_transitions, dtype=np.int64)
+_offset_array = np.array (_offsets, dtype=np.int64)
+
+
+class LocalFields (namedtuple ('LocalFields', ['day', 'hour', 'minute', 'weekday'])):
+    """ US Eastern wall-clock fields of event times (see `local_fields`):
+    service day (days since 1970-01-01), hour, minute and weekday of the
+    service day (0 is Monday). All are arrays of the same length.
+    """
+
+    __slots__ = ()
+
+
+def utc_offsets (epochs):
+    """ Function to get the US Eastern UTC offsets at event times.
+
+    Args:
+        epochs (array-like): event times (epoch)
+
+    Returns:
+        `numpy.ndarray`: UTC offsets (seconds) of each time
+    """
+
+    epochs = np.asarray (epochs, dtype=np.int64)
+    i = np.searchsorted (_transition_array, epochs, side='right') - 1
+    return _offset_array[i]
+
+def local_fields (epochs, day_start_hour=0):
+    """ Function to get the US Eastern wall-clock fields of event times, in
+    a single pass over arrays.
+
+    Args:
+        epochs (array-like): event times (epoch)
+        day_start_hour (int, optional): hour (US Eastern Time) days start at,
+            e.g. `train.service_day_hour`. Times before it belong to the
+            day before.
+
+    Returns:
+        `LocalFields`: service day, hour, minute and weekday of each time
+    """
+
+    local = np.asarray (epochs, dtype=np.int64) + utc_offsets (epochs)
+    seconds = local % day_seconds
+    day = (local - day_start_hour * 3600) // day_seconds
+    return LocalFields (day, seconds // 3600, seconds % 3600 // 60,
+                        (day + _epoch_weekday) % 7)
+
+def day_starts (days, day_start_hour=0):
+    """ Function to get the event time at which days start.
+
+    Args:
+        days (array-like): days (days since 1970-01-01, see `local_fields`)
+        day_start_hour (int, optional): hour (US Eastern Time) days start at.
+            It must not fall in a daylight saving time change (1 am to 3 am).
+
+    Returns:
+        `numpy.ndarray`: start (epoch) of each day
+    """
+
+    local = np.asarray (days, dtype=np.int64) * day_seconds + day_start_hour * 3600
+    # The offset at the start is the offset a few hours either side of it,
+    # away from changes
+    return local - utc_offsets (local - utc_offsets (local))
+
+def day_date (day):
+    """ Function to get the date of a day.
+
+    Args:
+        day (int): days since 1970-01-01 (see `local_fields`)
+
+    Returns:
+        `date`: date of the day
+    """
+
+    return date.fromordinal (_epoch_ordinal + int (day))
+
+def eastern_time (epoch):
+    """ Function to get the Eastern Time `datetime` of an event time, without
+    building time zones (see `utils.get_eastern_time_utc`).
+
+    Args:
+        epoch (int or str): event time (epoch)
+
+    Returns:
+        `datetime`: Eastern Time localized `datetime`
+    """
+
+    epoch = int (epoch)
+    i = bisect_right (_transitions, epoch) - 1
+    return (datetime (1970, 1, 1) + timedelta (seconds=epoch + _offsets[i])).replace (
+        tzinfo=_tzinfos[i])
+
+def eastern_epoch (dt):
+    """ Function to get the event time of a `datetime`.
+
+    Args:
+        dt (`datetime`): time, in US Eastern Time if the time zone is not set
+
+    Returns:
+        int: event time (epoch)
+    """
+
+    if dt.tzinfo is None or dt.tzinfo.utcoffset (dt) is None:
+        dt = eastern.localize (dt)
+    return calendar.timegm (dt.utctimetuple ())
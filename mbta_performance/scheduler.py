@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import time
+import random
+import socket
+import httplib
+import urllib2
+import threading
+
+from collections import deque
+
+from client import get_session
+from download import save_response
+
+
+class TokenBucket (object):
+    """ This is a class to limit the rate of requests with a token bucket. """
+
+    def __init__ (self, rate, capacity=1.):
+        """
+        Args:
+            rate (float): tokens added per second, i.e. the sustained request
+                rate
+            capacity (float, optional): maximum number of tokens stored, i.e.
+                the largest burst of requests
+        """
+
+        if rate <= 0:
+            raise ValueError ("rate must be positive. Please check inputs ...")
+
+        self.rate = float (rate)
+        self.capacity = float (capacity)
+        self._tokens = self.capacity
+        self._last = time.time ()
+        self._lock = threading.Lock ()
+
+    def acquire (self):
+        """ Function to take a token, waiting until one is available. """
+
+        while True:
+            with self._lock:
+                now = time.time ()
+                self._tokens = min (self.capacity,
+                                    self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.:
+                    self._tokens -= 1.
+                    return
+                wait = (1. - self._tokens) / self.rate
+            time.sleep (wait)
+
+
+class RequestScheduler (object):
+    """ This is a class to run a grid of MBTA API queries (see `Query`) with a
+    rate limit, retries with exponential backoff and jitter, and a failure
+    budget per endpoint. Query windows that time out, or whose responses are
+    too large, are split in half, and later windows of the same endpoint are
+    shrunk to the split size before they are sent.
+    """
+
+    retry_status = (429, 500, 502, 503, 504)
+    split_status = (413,)
+
+    def __init__ (self, rate=None, burst=1, max_retries=5, backoff=1.,
+                  max_backoff=60., failure_budget=50, min_window=3600,
+                  max_bytes=None, session=None):
+        """
+        Args:
+            rate (float, optional): maximum requests per second. By default,
+                requests are not rate limited.
+            burst (int, optional): maximum burst of requests above the rate
+            max_retries (int, optional): retries of a query before it is given
+                up on
+            backoff (float, optional): base delay (seconds) before a retry.
+                The n-th retry waits a random time up to backoff * 2**n.
+            max_backoff (float, optional): maximum delay (seconds) before a
+                retry
+            failure_budget (int, optional): failed attempts allowed per
+                endpoint (travel times or dwell times). Once spent, the
+                remaining queries of the endpoint are given up on.
+            min_window (int, optional): shortest window (seconds) that is
+                split further
+            max_bytes (int, optional): responses larger than this are
+                abandoned while streaming, and their windows split
+            session (`Session`, optional): HTTP session of the queries. By
+                default, the shared session is used.
+        """
+
+        self.bucket = None
+        if rate is not None:
+            self.bucket = TokenBucket (rate, capacity=burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_budget = failure_budget
+        self.min_window = min_window
+        self.max_bytes = max_bytes
+        self._session = session
+        self._lock = threading.Lock ()
+        self._failures = {}
+        self._windows = {}
+        self._failed = []
+
+    def _backoff_delay (self, attempt):
+        return random.uniform (0., min (self.max_backoff,
+                                        self.backoff * 2 ** attempt))
+
+    def _add_failure (self, endpoint):
+        with self._lock:
+            self._failures[endpoint] = self._failures.get (endpoint, 0) + 1
+
+    def _budget_spent (self, endpoint):
+        return self._failures.get (endpoint, 0) >= self.failure_budget
+
+    def _give_up (self, request):
+        with self._lock:
+            self._failed.append (request)
+
+    def _split (self, request, size):
+        windows = []
+        start = request.start
+        while start < request.end:
+            windows.append (request.window (start, min (request.end, start + size)))
+            start += size
+        return windows
+
+    def _shrink (self, endpoint, size):
+        with self._lock:
+            if size < self._windows.get (endpoint, size + 1):
+                self._windows[endpoint] = size
+
+    def _process (self, request, dry, callback, compress):
+        """ Function to run a single query.
+
+        Returns:
+            list: queries of sub-windows to run instead, if any
+        """
+
+        endpoint = request.kind
+        size = self._windows.get (endpoint)
+        if size is not None and request.end - request.start > size:
+            return self._split (request, size)
+
+        session = self._session or get_session ()
+        attempt = 0
+        while True:
+            if self._budget_spent (endpoint):
+                self._give_up (request)
+                return []
+
+            if self.bucket is not None:
+                self.bucket.acquire ()
+
+            span = request.end - request.start
+            max_bytes = self.max_bytes
+            if span <= self.min_window:
+                max_bytes = None
+
+            split = False
+            try:
+                response = session.get (request.url, stream=True)
+                size = save_response (response, None if dry else request.out_file,
+                                      compress=compress, max_bytes=max_bytes)
+            except socket.timeout:
+                split = True
+            except urllib2.HTTPError as e:
+                if e.code in self.split_status:
+                    split = True
+                elif e.code not in self.retry_status:
+                    self._add_failure (endpoint)
+                    self._give_up (request)
+                    return []
+            except (httplib.HTTPException, socket.error):
+                pass
+            else:
+                if size is not None:
+                    if callback is not None and not dry:
+                        callback (request)
+                    return []
+                split = True
+
+            self._add_failure (endpoint)
+
+            if split and span > self.min_window:
+                size = max (self.min_window, (span + 1) // 2)
+                self._shrink (endpoint, size)
+                return self._split (request, size)
+
+            attempt += 1
+            if attempt > self.max_retries:
+                self._give_up (request)
+                return []
+            time.sleep (self._backoff_delay (attempt - 1))
+
+    def run (self, requests, num_workers=1, dry=False, callback=None,
+             compress=None):
+        """ Function to run a grid of queries.
+
+        Args:
+            requests (list): list of `Query`s to run
+            num_workers (int, optional): maximum number of queries in flight at
+                once
+            dry (bool, optional): if True, print the responses instead of
+                writing them out
+            callback (function, optional): called with each `Query` (or
+                sub-window `Query`) once it has been written out. It may be
+                called from several threads at once.
+            compress (str, optional): storage format of the files (see
+                `storage.raw_filename`)
+
+        Raises:
+            IOError: if some queries could not be completed
+        """
+
+        if not isinstance (num_workers, int) or num_workers < 1:
+            raise ValueError ("num_workers must be a positive int. Please check inputs ...")
+
+        self._failures = {}
+        self._failed = []
+        pending = deque (requests)
+
+        if num_workers == 1 or len (pending) <= 1:
+            while pending:
+                pending.extendleft (reversed (
+                    self._process (pending.popleft (), dry, callback, compress)))
+        else:
+            self._run_workers (pending, num_workers, dry, callback, compress)
+
+        if self._failed:
+            raise IOError ("{0} queries failed ({1}). Please try again later ...".format (
+                len (self._failed), ', '.join (
+                    '{0}: {1} failed attempts'.format (endpoint, count)
+                    for (endpoint, count) in sorted (self._failures.iteritems ()))))
+
+    def _run_workers (self, pending, num_workers, dry, callback, compress):
+        cond = threading.Condition ()
+        state = {'in_flight': 0, 'error': None}
+
+        def worker ():
+            while True:
+                with cond:
+                    while not pending and state['in_flight'] > 0:
+                        cond.wait ()
+                    if not pending or state['error'] is not None:
+                        cond.notify_all ()
+                        return
+                    request = pending.popleft ()
+                    state['in_flight'] += 1
+
+                try:
+                    sub_requests = self._process (request, dry, callback,
+                                                  compress)
+                except Exception as e:
+                    sub_requests = []
+                    with cond:
+                        state['error'] = e
+
+                with cond:
+                    pending.extendleft (reversed (sub_requests))
+                    state['in_flight'] -= 1
+                    cond.notify_all ()
+
+        threads = [threading.Thread (target=worker)
+                   for i in range (min (num_workers, len (pending)))]
+        for t in threads:
+            t.daemon = True
+            t.start ()
+        for t in threads:
+            # join with a timeout keeps the main thread interruptible
+            while t.is_alive ():
+                t.join (1.)
+
+        if state['error'] is not None:
+            raise state['error']
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import gzip
+import json
+import time
+import random
+import socket
+import threading
+import BaseHTTPServer
+import SocketServer
+
+from urlparse import urlparse, parse_qsl
+from cStringIO import StringIO
+
+
+class _StandInHandler (BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Request handler answering MBTA travel time and dwell time queries with
+    synthetic JSON payloads. """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup (self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup (self)
+        self.server.stand_in._add_connection (self.connection)
+
+    def finish (self):
+        self.server.stand_in._remove_connection (self.connection)
+        BaseHTTPServer.BaseHTTPRequestHandler.finish (self)
+
+    def do_GET (self):
+        server = self.server.stand_in
+        count = server._count_request ()
+
+        url = urlparse (self.path)
+        query = dict (parse_qsl (url.query))
+        span = int (query.get ('to_datetime', 0)) - int (query.get ('from_datetime', 0))
+
+        delay = server.delay
+        if server.slow_span is not None and span > server.slow_span:
+            delay += server.slow_delay
+        if delay > 0:
+            time.sleep (delay)
+
+        if count <= server.fail_first or server._random_error ():
+            self.send_error (503)
+            return
+        if server.max_events is not None and server.interval > 0 and \
+                span // server.interval > server.max_events:
+            self.send_error (413)
+            return
+
+        if url.path.endswith ('/redirect'):
+            # Redirect to the "to" URL, or else to this one again
+            self.send_response (302)
+            self.send_header ('Location', query.get ('to', self.path))
+            self.send_header ('Content-Length', '0')
+            self.end_headers ()
+            return
+        elif url.path.endswith ('/traveltimes'):
+            body = json.dumps ({'travel_times': server.travel_times (query)})
+        elif url.path.endswith ('/dwells'):
+            body = json.dumps ({'dwell_times': server.dwell_times (query)})
+        else:
+            self.send_error (404)
+            return
+
+        self.send_response (200)
+        self.send_header ('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get ('Accept-Encoding', ''):
+            buf = StringIO ()
+            with gzip.GzipFile (fileobj=buf, mode='wb') as f:
+                f.write (body)
+            body = buf.getvalue ()
+            self.send_header ('Content-Encoding', 'gzip')
+        self.send_header ('Content-Length', str (len (body)))
+        self.end_headers ()
+        self.wfile.write (body)
+
+    def log_message (self, format, *args):
+        pass
+
+
+class _ThreadedHTTPServer (SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class StandInServer (object):
+    """ This is a class to run a local stand-in for the MBTA performance API,
+    used to benchmark and test the downloaders without network access.
+    """
+
+    def __init__ (self, delay=0., interval=0, port=0, error_rate=0.,
+                  fail_first=0, slow_span=None, slow_delay=0., max_events=None,
+                  seed=None):
+        """
+        Args:
+            delay (float, optional): seconds to wait before answering each
+                request, emulating network and server latency
+            interval (int, optional): seconds between synthetic train events
+                in each response. With 0, responses contain no events.
+            port (int, optional): port to listen on. By default, a free port
+                is chosen.
+            error_rate (float, optional): fraction of requests answered with a
+                503 error, at random
+            fail_first (int, optional): number of first requests answered with
+                a 503 error
+            slow_span (int, optional): queries spanning more than this many
+                seconds are answered `slow_delay` seconds later
+            slow_delay (float, optional): extra delay of slow queries
+            max_events (int, optional): queries with more events than this are
+                answered with a 413 error
+            seed (int, optional): seed of the random errors
+        """
+
+        self.delay = delay
+        self.interval = interval
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.slow_span = slow_span
+        self.slow_delay = slow_delay
+        self.max_events = max_events
+        self._random = random.Random (seed)
+        self._request_count = 0
+        self._connections = set ()
+        self._lock = threading.Lock ()
+        self._httpd = _ThreadedHTTPServer (('127.0.0.1', port), _StandInHandler)
+        self._httpd.stand_in = self
+        self._thread = None
+
+    def _count_request (self):
+        with self._lock:
+            self._request_count += 1
+            return self._request_count
+
+    def _random_error (self):
+        with self._lock:
+            return self._random.random () < self.error_rate
+
+    def _add_connection (self, connection):
+        with self._lock:
+            self._connections.add (connection)
+
+    def _remove_connection (self, connection):
+        with self._lock:
+            self._connections.discard (connection)
+
+    def _event_times (self, query):
+        if self.interval <= 0:
+            return []
+        start = int (query.get ('from_datetime', 0))
+        end = int (query.get ('to_datetime', 0))
+        return range (start - start % self.interval + self.interval, end,
+                      self.interval)
+
+    def travel_times (self, query):
+        """ Function to make the synthetic travel time events of a query.
+
+        Args:
+            query (dict): query parameters
+
+        Returns:
+            list: travel time event dicts
+        """
+
+        return [{'route_id': 'Stand-in', 'direction': '0',
+                 'dep_dt': str (t), 'arr_dt': str (t + 90),
+                 'travel_time_sec': '90', 'benchmark_travel_time_sec': '100'}
+                for t in self._event_times (query)]
+
+    def dwell_times (self, query):
+        """ Function to make the synthetic dwell time events of a query.
+
+        Args:
+            query (dict): query parameters
+
+        Returns:
+            list: dwell time event dicts
+        """
+
+        return [{'route_id': 'Stand-in', 'direction': '0',
+                 'arr_dt': str (t - 30), 'dep_dt': str (t),
+                 'dwell_time_sec': '30'}
+                for t in self._event_times (query)]
+
+    def start (self):
+        """ Function to start serving requests in a background thread. """
+
+        self._thread = threading.Thread (target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start ()
+        return self
+
+    def stop (self):
+        """ Function to stop serving requests. """
+
+        self._httpd.shutdown ()
+        self._httpd.server_close ()
+
+        # Hang up on idle keep-alive clients
+        with self._lock:
+            connections = list (self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown (socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        if self._thread is not None:
+            self._thread.join ()
+            self._thread = None
+
+    def __enter__ (self):
+        return self.start ()
+
+    def __exit__ (self, *args):
+        self.stop ()
+
+    @property
+    def root_url (self):
+        """ Root URL of the stand-in API.
+
+        Returns:
+            str: URL of the form http://127.0.0.1:<port>/developer/api/v2.1/
+        """
+
+        host, port = self._httpd.server_address
+        return 'http://{0}:{1}/developer/api/v2.1/'.format (host, port)
+
+    @property
+    def traveltime_url (self):
+        """ Stand-in equivalent of `utils.mbta_traveltime_url`.
+
+        Returns:
+            str: travel time query URL prefix
+        """
+
+        return self.root_url + 'traveltimes?api_key=stand-in&format=json&'
+
+    @property
+    def dwelltime_url (self):
+        """ Stand-in equivalent of `utils.mbta_dwelltime_url`.
+
+        Returns:
+            str: dwell time query URL prefix
+        """
+
+        return self.root_url + 'dwells?api_key=stand-in&format=json&'
+
+    @property
+    def request_count (self):
+        """ Number of requests answered so far.
+
+        Returns:
+            int: request count
+        """
+
+        return self._request_count
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import re
+import bz2
+import gzip
+import threading
+
+# Storage formats of the raw MBTA JSON files: file name suffix and opener
+codecs = {
+    None: ('', open),
+    'gzip': ('.gz', gzip.open),
+    'bz2': ('.bz2', bz2.BZ2File),
+}
+
+_raw_name_re = re.compile (
+    r'^(?:(traveltimes)_([^_]+)_(\d)_(\d+_\d+)|(dwelltimes)_([^_]+)_(\d)_(\d+))'
+    r'_(\d+)_(\d+)\.json(?:\.gz|\.bz2)?$')
+
+
+def parse_raw_filename (filename):
+    """ Function to get the contents of a raw file from its name (see
+    `Line.get_traveltimes` and `Line.get_dwelltimes`).
+
+    Args:
+        filename (str): file name or path
+
+    Returns:
+        tuple: (kind, line name, direction ID, key, window start, window end),
+            where kind is "traveltimes" or "dwelltimes" and key is
+            "<First Stop ID>_<Second Stop ID>" or "<Stop ID>". None is returned
+            if the name is not that of a raw file.
+    """
+
+    match = _raw_name_re.match (os.path.basename (filename))
+    if match is None:
+        return None
+    groups = match.groups ()
+    if groups[0] is not None:
+        kind, name, direction_id, key = groups[0:4]
+    else:
+        kind, name, direction_id, key = groups[4:8]
+    return (kind, name, direction_id, key, int (groups[8]), int (groups[9]))
+
+
+def raw_filename (filename, compress=None):
+    """ Function to get the name of a raw file in a given storage format.
+
+    Args:
+        filename (str): uncompressed file name, ending in ".json"
+        compress (str, optional): storage format, one of `codecs` ("gzip" or
+            "bz2"), or None for plain JSON
+
+    Returns:
+        str: file name with the suffix of the storage format
+    """
+
+    if compress not in codecs:
+        raise ValueError ("Unknown compression {0}. Please use one of {1} ...".format (
+            compress, sorted (codecs)))
+    return filename + codecs[compress][0]
+
+def open_raw (filename, mode='rb'):
+    """ Function to open a raw file in whichever storage format it was written
+    in, going by its suffix.
+
+    Args:
+        filename (str): file name
+        mode (str, optional): file mode
+
+    Returns:
+        file: file object
+    """
+
+    for (compress, (suffix, opener)) in codecs.iteritems ():
+        if compress is not None and filename.endswith (suffix):
+            return opener (filename, mode)
+    return open (filename, mode)
+
+def write_raw (chunks, filename, compress=None, max_bytes=None):
+    """ Function to stream chunks of data to a raw file. The data is written
+    to a temporary file, which only replaces `filename` once complete, and
+    copies of the file in other storage formats are removed.
+
+    Args:
+        chunks (iterable): str chunks of data
+        filename (str): uncompressed file name, ending in ".json"
+        compress (str, optional): storage format (see `raw_filename`)
+        max_bytes (int, optional): if the data grows larger than this, stop
+            and discard it
+
+    Returns:
+        int: bytes of (uncompressed) data written, or None if `max_bytes` was
+            exceeded
+    """
+
+    out_file = raw_filename (filename, compress)
+    outdir, outname = os.path.split (out_file)
+    temp_filename = os.path.join (outdir, '.part_{0}_id_{1}_{2}'.format (
+        outname, os.getpid (), threading.current_thread ().ident))
+
+    size = 0
+    try:
+        with codecs[compress][1] (temp_filename, 'wb') as f:
+            for chunk in chunks:
+                size += len (chunk)
+                if max_bytes is not None and size > max_bytes:
+                    size = None
+                    break
+                f.write (chunk)
+    except:
+        os.remove (temp_filename)
+        raise
+
+    if size is None:
+        os.remove (temp_filename)
+        return None
+
+    os.rename (temp_filename, out_file)
+    for other in codecs:
+        other_file = raw_filename (filename, other)
+        if other_file != out_file and os.path.exists (other_file):
+            os.remove (other_file)
+    return size
@@ -3,44 +3,84 @@
 from __future__ import print_function
 
 import os
-import re
 import copy
+import time
 import json
 import urllib2
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
 
-from datetime import datetime, timedelta
-from pytz import timezone
+from datetime import datetime
+from itertools import izip, islice, cycle
+from bisect import bisect_left
 from collections import deque
-from itertools import izip, cycle
-from glob import glob
 
 from line import Stop, Track, Line
-from utils import get_epoch_time, get_eastern_time_utc, lines
+from download import fetch_all
+from coverage import CoverageManifest, publication_lag
+from storage import open_raw
+from catalog import RawCatalog
+from events import EventTable, EventQueue, DepartureHeap
+from eventstore import EventStore
+from assembly import chain_trains, missing, merge_window, merge_horizon, \
+    earliest_arrivals, OpenTrains, TrainMatrix
+from localtime import local_fields, day_starts, eastern_time, eastern_epoch
+from utils import lines
+
+service_day_hour = 4  # hour (US Eastern Time) the MBTA service day starts at
+service_day_lead = 600  # time (seconds) before it of the first travel times
+service_day_overlap = 4 * 3600  # longest time (seconds) a train runs past it
+# stops of the branches other than the loaded one, by line: trains starting or
+# ending there are skipped
+branch_stops = {'Red': ('Andrew',), 'Green': ('Kenmore', 'Copley')}
+# find train starts through a `DepartureHeap` rather than a scan of the stops.
+# Slower on every line: each train moves the first event of most stops (see
+# `scripts/benchmark_assembly.py`).
+use_departure_heap = False
+
+
+def _read_events (args):
+    """ Function to read the events of a raw file (run in a worker process of
+    `TrainCollection.load_times`).
 
+    Args:
+        args (tuple): (file name, "traveltimes" or "dwelltimes", period start,
+            period end), see `EventTable.select`
+
+    Returns:
+        `EventTable`: events departing within the period
+    """
+
+    filename, kind, start, end = args
+    field = 'travel_times' if kind == 'traveltimes' else 'dwell_times'
+    with open_raw (filename) as f_json:
+        events = json.load (f_json)[field]
+    return EventTable.from_events (kind, events).select (start, end)
 
 def get_first_train_stop (dwell_times):
     """ Function to find the earliest train start in a set of ordered dwell
     times (a train starts at a stop).
 
     Args:
-        dwell_times (dict): dictionary of dwell times. Keys of the dictionary
-            are stop IDs. The value of each key is a list of stop dwell
-            times ordered with earliest first.
+        dwell_times (dict or `DepartureHeap`): dictionary of dwell times. Keys
+            of the dictionary are stop IDs. The value of each key is an
+            `EventQueue` of stop dwell times ordered with earliest first.
 
     Returns:
         str: Key of the earliest train. None returned if no data remains.
     """
 
+    if isinstance (dwell_times, DepartureHeap):
+        return dwell_times.first ()
+
     start_stop_num = None
-    start_stop_time = int (get_epoch_time (timezone ('UTC').localize (datetime (
-        year=9999, month=1, day=1))))
-    for (key, dt_deque) in dwell_times.iteritems ():
-        if dt_deque and int (dt_deque[0]['dep_dt']) < start_stop_time:
-            start_stop_time = int (dt_deque[0]['dep_dt'])
+    start_stop_time = None
+    for (key, dt_queue) in dwell_times.iteritems ():
+        dep_t = dt_queue.first_departure ()
+        if dep_t is not None and (start_stop_time is None or dep_t < start_stop_time):
+            start_stop_time = dep_t
             start_stop_num = key
-    # print (start_stop_num, start_stop_time)
 
     return start_stop_num
 
@@ -51,11 +91,12 @@ def get_next_train (train, travel_times, dwell_times):
     Args:
         train (`Train`): Base train for the searched route
         travel_times (dict): dictionary of travel times. Keys of the dictionary
-            are track identifiers. The value of each key is a list of track
-            travel times ordered with earliest first.
-        dwell_times (dict): dictionary of dwell times. Keys of the dictionary
-            are stop identifiers. The value of each key is a list of stop dwell
-            times ordered with earliest first.
+            are track identifiers. The value of each key is an `EventQueue` of
+            track travel times ordered with earliest first.
+        dwell_times (dict or `DepartureHeap`): dictionary of dwell times.
+            Keys of the dictionary are stop identifiers. The value of each key
+            is an `EventQueue` of stop dwell times ordered with earliest
+            first.
 
     Returns:
         `Train`: a train with filled dwell and travel times
@@ -67,9 +108,8 @@ def get_next_train (train, travel_times, dwell_times):
     if start_stop_num is None:
         return None
 
-    start_dwell = dwell_times[start_stop_num].popleft ()
-
-    # print (train.stops, train.tracks)
+    dt_queue = dwell_times[start_stop_num]
+    start_dwell = dt_queue.popleft ()
 
     # Get the first stop
     starting_stop = None
@@ -80,59 +120,259 @@ def get_next_train (train, travel_times, dwell_times):
             starting_stop = piece
             break
 
-    starting_stop.load_event (start_dwell)
+    starting_stop.load_event (dt_queue.table[start_dwell])
     train._start = starting_stop
-    prev_piece = starting_stop
-    next_piece = next (starting_stop)
+    last_piece = _chain_pieces (starting_stop, dt_queue.arrival (start_dwell),
+                                dt_queue.departure (start_dwell),
+                                travel_times, dwell_times)
+    if next (last_piece) is not None:
+        train._end = last_piece
+
+    return train
+
+def _chain_pieces (piece, prev_arr_t, prev_dep_t, travel_times, dwell_times):
+    """ Function to load the events of the pieces following a loaded piece of a
+    train, one after the other, as long as the next event is found.
+
+    Args:
+        piece (`TrainStop` or `TrainTrack`): last loaded piece
+        prev_arr_t (int): arrival time (epoch) of the piece
+        prev_dep_t (int): departure time (epoch) of the piece
+        travel_times (dict): `EventQueue`s of the tracks (see
+            `get_next_train`)
+        dwell_times (dict or `DepartureHeap`): `EventQueue`s of the stops
+
+    Returns:
+        `TrainStop` or `TrainTrack`: last loaded piece
+    """
+
+    prev_piece = piece
+    next_piece = next (piece)
     while next_piece is not None:
-        found_it = False
         if isinstance (next_piece, TrainTrack):
-            dep_t = prev_piece.departure_time
-
-            tt_deque = travel_times[
+            queue = travel_times[
                 (next_piece.prev_stop.stop_id, next_piece.next_stop.stop_id)]
-
-            for tt in tt_deque:
-                if abs ((get_eastern_time_utc (tt['dep_dt']) - dep_t).total_seconds ()) < 10:
-                    # print ("Found it!")
-                    # print (tt)
-                    found_it = True
-                    next_piece.load_event (tt)
-                    tt_deque.remove (tt)
-                    break
-                elif get_eastern_time_utc (tt['dep_dt']) > dep_t:
-                    # print ("Didn't find it ...")
-                    break
+            i = queue.find ('dep_dt', prev_dep_t)
         else:
-            prev_arr_t = prev_piece.arrival_time
-
-            dt_deque = dwell_times[next_piece.stop_id]
-
-            for dt in dt_deque:
-                if abs ((get_eastern_time_utc (dt['arr_dt']) - prev_arr_t).total_seconds ()) < 10:
-                    # print ("Found it!")
-                    # print (dt)
-                    found_it = True
-                    next_piece.load_event (dt)
-                    dt_deque.remove (dt)
-                    break
-                elif get_eastern_time_utc (dt['arr_dt']) > prev_arr_t:
-                    # print ("Didn't find it ...")
-                    break
-
-        if not found_it:
-            train._end = prev_piece
+            queue = dwell_times[next_piece.stop_id]
+            i = queue.find ('arr_dt', prev_arr_t)
+
+        if i is None:
             break
-        else:
-            prev_piece = next_piece
-            next_piece = next (next_piece)
 
-    return train
+        queue.take (i)
+        next_piece.load_event (queue.table[i])
+        prev_arr_t = queue.arrival (i)
+        prev_dep_t = queue.departure (i)
+        prev_piece = next_piece
+        next_piece = next (next_piece)
+
+    return prev_piece
+
+def _piece_key (piece):
+    """ Function to identify a stop or track of a train among those of its line.
+
+    Args:
+        piece (`TrainStop` or `TrainTrack`): stop or track
+
+    Returns:
+        str or tuple: stop ID, or pair of stop IDs of the track
+    """
+
+    if isinstance (piece, TrainTrack):
+        return (piece.prev_stop.stop_id, piece.next_stop.stop_id)
+    return piece.stop_id
+
+def _branch_stops (name):
+    """ Function to get the stops of the branches other than the loaded one
+    of a line (see `branch_stops`).
+
+    Args:
+        name (str): name of the line
+
+    Returns:
+        tuple: names (or parts of names) of the stops
+    """
+
+    for (line, stops) in branch_stops.iteritems ():
+        if line in name:
+            return stops
+    return ()
+
+def _is_other_branch (train):
+    """ Function to check whether a train runs on a branch of its line other
+    than the loaded one (Red line trains from Andrew, Green line trains from
+    Kenmore or Copley), going by its start and end stops. An end on a track
+    is not on a branch stop.
+
+    Args:
+        train (`Train`): train to check
+
+    Returns:
+        bool: True if the train should be skipped
+    """
+
+    excluded = _branch_stops (train.name)
+    for piece in (train.start, train.end):
+        if isinstance (piece, TrainStop) and \
+                any (e in piece.stop_name for e in excluded):
+            return True
+    return False
+
+def _iter_segments (new_train, travel_times, dwell_times, end=None):
+    """ Function to chain trains one at a time (see `get_next_train`), in order
+    of their start, skipping the trains of other branches.
+
+    Args:
+        new_train (function): function returning a new base train
+        travel_times (dict): `EventQueue`s of the tracks (see
+            `get_next_train`)
+        dwell_times (dict): `EventQueue`s of the stops
+        end (int, optional): only chain trains starting before this epoch
+
+    Yields:
+        `Train`: train segments with filled dwell and travel times
+    """
+
+    if use_departure_heap:
+        dwell_times = DepartureHeap (dwell_times)
+
+    while True:
+        if end is not None:
+            key = get_first_train_stop (dwell_times)
+            if key is None or dwell_times[key].first_departure () >= end:
+                return
+
+        train = get_next_train (new_train (), travel_times, dwell_times)
+        # If no data left, stop
+        if train is None:
+            return
+        if not _is_other_branch (train):
+            yield train
+
+def _chain_service_day (base_train, travel_times, dwell_times, start, end,
+                        travel_taken=None, dwell_taken=None):
+    """ Function to chain the trains starting during a service day. They may
+    use the travel times from up to `service_day_lead` seconds before the day
+    starts, and run past its end for up to `service_day_overlap` seconds.
+
+    Args:
+        base_train (`Train`): base train of the line
+        travel_times (dict): `EventTable`s of the tracks
+        dwell_times (dict): `EventTable`s of the stops
+        start (int): start of the day (epoch)
+        end (int): end of the day (epoch)
+        travel_taken (dict, optional): indices of the travel times consumed by
+            the trains of earlier days, keyed by track
+        dwell_taken (dict, optional): indices of the dwell times consumed by
+            the trains of earlier days, keyed by stop
+
+    Returns:
+        tuple: train segments, in order of their start, and the indices of
+            the events they consumed, keyed by track and keyed by stop
+    """
+
+    offsets = {}
+    queues = []
+    for (tables, first, taken) in (
+            (travel_times, start - service_day_lead, travel_taken),
+            (dwell_times, start, dwell_taken)):
+        kind_queues = []
+        for (key, table) in tables.iteritems ():
+            lo, hi = np.searchsorted (table['dep_dt'],
+                                      [first, end + service_day_overlap]).tolist ()
+            queue = EventQueue (table.select (first, end + service_day_overlap))
+            for i in (taken or {}).get (key, ()):
+                if lo <= i < hi:
+                    queue.take (i - lo)
+            offsets[key] = lo
+            kind_queues.append ((key, queue))
+        queues.append (dict (kind_queues))
+    travel_queues, dwell_queues = queues
+
+    trains = list (_iter_segments (TrainTemplate (base_train).new, travel_queues,
+                                   dwell_queues, end))
+    used = [dict ((key, [offsets[key] + i for i in queue.consumed ()])
+                  for (key, queue) in kind_queues.iteritems ())
+            for kind_queues in (travel_queues, dwell_queues)]
+    return (trains, used[0], used[1])
+
+# Loaded times of the line, in the worker processes of
+# `TrainCollection.load_trains`
+_service_day_times = {}
+
+def _init_service_day_worker (base_train, travel_times, dwell_times):
+    """ Function to set up a worker process of `TrainCollection.load_trains`.
+    The times are inherited from the parent process, not sent to the worker.
+    """
+
+    _service_day_times['base_train'] = base_train
+    _service_day_times['travel_times'] = travel_times
+    _service_day_times['dwell_times'] = dwell_times
+    _service_day_times['template'] = TrainTemplate (base_train)
+
+def _assemble_service_day (args):
+    """ Function to chain the trains of a service day (run in a worker process
+    of `TrainCollection.load_trains`, see `_chain_service_day`).
+
+    Args:
+        args (tuple): (start epoch, end epoch) of the day
+
+    Returns:
+        tuple: states of the train segments (see `TrainTemplate.dump`), in
+            order of their start, and the indices of the events they
+            consumed, keyed by track and keyed by stop
+    """
+
+    start, end = args
+    trains, travel_used, dwell_used = _chain_service_day (
+        _service_day_times['base_train'], _service_day_times['travel_times'],
+        _service_day_times['dwell_times'], start, end)
+    template = _service_day_times['template']
+    return ([template.dump (train) for train in trains], travel_used, dwell_used)
+
+
+def _eastern_time (epoch):
+    """ Function to get the Eastern Time `datetime` of an event time.
+
+    Args:
+        epoch (int): event time (epoch), or None
+
+    Returns:
+        `datetime`: Eastern Time localized `datetime`, or None
+    """
+
+    if epoch is None:
+        return None
+    return eastern_time (epoch)
+
+def _epoch_state (state):
+    """ Function to convert the state of a stop or track pickled when it held
+    its times as `datetime`s ('_arrival_time' and '_departure_time') to event
+    times (epoch).
+
+    Args:
+        state (dict): pickled attributes of the stop or track
+
+    Returns:
+        dict: attributes of the stop or track
+    """
+
+    for name in ('arrival', 'departure'):
+        old_name = '_{0}_time'.format (name)
+        if old_name in state:
+            state = dict (state)
+            dt = state.pop (old_name)
+            state['_{0}_epoch'.format (name)] = (
+                None if dt is None else eastern_epoch (dt))
+    return state
 
 
 class TrainStop (Stop):
     """ This is a class to contain T-stop for a train. """
 
+    __slots__ = ('_dwell_time', '_arrival_epoch', '_departure_epoch')
+
     def __init__ (self, stop_dict=None, existing_stop=None, event_dict=None):
         """
         Args:
@@ -152,8 +392,8 @@ class TrainStop (Stop):
                                                existing_stop=existing_stop)
 
         self._dwell_time = None
-        self._arrival_time = None
-        self._departure_time = None
+        self._arrival_epoch = None
+        self._departure_epoch = None
 
         if event_dict is not None:
             self.load_event (event_dict)
@@ -167,10 +407,8 @@ class TrainStop (Stop):
                 'dwell_time_sec'
         """
 
-        arr_time = get_eastern_time_utc (event_dict['arr_dt'])
-        dep_time = get_eastern_time_utc (event_dict['dep_dt'])
-        self._arrival_time = arr_time
-        self._departure_time = dep_time
+        self._arrival_epoch = int (event_dict['arr_dt'])
+        self._departure_epoch = int (event_dict['dep_dt'])
         self._dwell_time = int (event_dict['dwell_time_sec'])
 
     def __str__ (self):
@@ -191,30 +429,56 @@ class TrainStop (Stop):
 
         return self._dwell_time
 
+    def __setstate__ (self, state):
+        super (TrainStop, self).__setstate__ (_epoch_state (state))
+
+    @property
+    def arrival_epoch (self):
+        """ Train arrival time at stop
+
+        Returns:
+            int: train arrival time (epoch)
+        """
+
+        return self._arrival_epoch
+
+    @property
+    def departure_epoch (self):
+        """ Train departure time from stop
+
+        Returns:
+            int: train departure time (epoch)
+        """
+
+        return self._departure_epoch
+
     @property
     def arrival_time (self):
         """ Train arrival time at stop
 
         Returns:
-            datetime: train arrival time
+            datetime: train arrival time (Eastern Time)
         """
 
-        return self._arrival_time
+        return _eastern_time (self._arrival_epoch)
 
     @property
     def departure_time (self):
         """ Train departure time from stop
 
         Returns:
-            datetime: train departure time
+            datetime: train departure time (Eastern Time)
         """
 
-        return self._departure_time
+        return _eastern_time (self._departure_epoch)
 
 
 class TrainTrack (Track):
     """ This is a class to contain track between a pair of T-stops for a train. """
 
+    __slots__ = ('_travel_time', '_benchmark_travel_time', '_departure_epoch',
+                 '_arrival_epoch')
+
     def __init__ (self, stop_pair=None, existing_track=None, event_dict=None):
         """
         Args:
@@ -233,8 +497,8 @@ class TrainTrack (Track):
                                                existing_track=existing_track)
         self._travel_time = None
         self._benchmark_travel_time = None
-        self._departure_time = None
-        self._arrival_time = None
+        self._departure_epoch = None
+        self._arrival_epoch = None
 
         if event_dict is not None:
             self.load_event (event_dict)
@@ -248,8 +512,8 @@ class TrainTrack (Track):
                 'travel_time_sec', and 'benchmark_travel_time_sec'
         """
 
-        self._departure_time = get_eastern_time_utc (event_dict['dep_dt'])
-        self._arrival_time = get_eastern_time_utc (event_dict['arr_dt'])
+        self._departure_epoch = int (event_dict['dep_dt'])
+        self._arrival_epoch = int (event_dict['arr_dt'])
         self._travel_time = int (event_dict['travel_time_sec'])
         self._benchmark_travel_time = int (event_dict['benchmark_travel_time_sec'])
 
@@ -282,26 +546,48 @@ class TrainTrack (Track):
 
         return self._benchmark_travel_time
 
+    def __setstate__ (self, state):
+        super (TrainTrack, self).__setstate__ (_epoch_state (state))
+
     @property
-    def departure_time (self):
+    def departure_epoch (self):
         """ Train departure time from first stop
 
         Returns:
-            datetime: train departure time from first stop
+            int: train departure time from first stop (epoch)
         """
 
-        return self._departure_time
+        return self._departure_epoch
+
+    @property
+    def arrival_epoch (self):
+        """ Train arrival time at second stop
+
+        Returns:
+            int: train arrival time at second stop (epoch)
+        """
+
+        return self._arrival_epoch
+
+    @property
+    def departure_time (self):
+        """ Train departure time from first stop
+
+        Returns:
+            datetime: train departure time from first stop (Eastern Time)
+        """
 
+        return _eastern_time (self._departure_epoch)
 
     @property
     def arrival_time (self):
         """ Train arrival time at second stop
 
         Returns:
-            datetime: train arrival time at second stop
+            datetime: train arrival time at second stop (Eastern Time)
         """
 
-        return self._arrival_time
+        return _eastern_time (self._arrival_epoch)
 
 
 class Train (Line):
@@ -352,7 +638,7 @@ class Train (Line):
         self._end = self._stops[-1]
         end = None
         for s in self:
-            if s._arrival_time is not None:
+            if s._arrival_epoch is not None:
                 end = s
         if end is not None:
             self._end = end
@@ -411,24 +697,24 @@ class Train (Line):
         x_coords = []
         y_coords = []
 
-        start_time = self.start.departure_time
+        start_time = self.start.departure_epoch
         for piece in self:
             try:
                 if isinstance (piece, TrainStop):
                     if piece != self.start:
                         y_coords.append (
-                            (piece.arrival_time - start_time).total_seconds () / 60.)
+                            (piece.arrival_epoch - start_time) / 60.)
                         x_coords.append (station_ref_dict[piece.station_name])
                     if piece != self.end:
                         y_coords.append (
-                            (piece.departure_time - start_time).total_seconds () / 60.)
+                            (piece.departure_epoch - start_time) / 60.)
                         x_coords.append (station_ref_dict[piece.station_name])
                 else:
                     y_coords.append (
-                        (piece.departure_time - start_time).total_seconds () / 60.)
+                        (piece.departure_epoch - start_time) / 60.)
                     x_coords.append (station_ref_dict[piece.prev_stop.station_name])
                     y_coords.append (
-                        (piece.arrival_time - start_time).total_seconds () / 60.)
+                        (piece.arrival_epoch - start_time) / 60.)
                     x_coords.append (station_ref_dict[piece.next_stop.station_name])
             except:
                 pass
@@ -437,44 +723,47 @@ class Train (Line):
         ax.grid (ls='-', color='grey', alpha=0.3)
 
     def __getitem__ (self, key):
-        """ Get selection of `TrainStop`s and `TrainTrack`s
+        """ Get selection of `TrainStop`s and `TrainTrack`s, as a view sharing
+        them with the train (see `TrainSlice`).
 
         Args:
             key (int or slice): indices of stops to select.
 
         Returns:
-            `Train`: train with selection of stops and tracks
+            `TrainSlice`: train with selection of stops and tracks
         """
 
-        stops = copy.deepcopy (self.stops[key])
-        if isinstance (stops, TrainStop):
-            stops = [stops]
-        stops[0]._prev_track = None
-        stops[-1]._next_track = None
+        stops, tracks = self._select_pieces (key)
+        return TrainSlice (self, stops, tracks or [])
 
-        if isinstance (key, slice):
-            try:
-                t_key = slice (key.start, key.stop-1)
-            except:
-                # For the case where the second index is None
-                t_key = slice (key.start, key.stop)
-            tracks = copy.deepcopy (self.tracks[t_key])
-        else:
-            tracks = []
-
-        out_t = Train (self)
-        out_t._stops = stops
-        out_t._tracks = tracks
-        out_t._set_start ()
-        out_t._current = out_t._start
-        out_t._set_end ()
+    def copy (self):
+        """ Function to copy the train, with stops and tracks of its own (e.g.
+        to change a slice of the train without changing the train).
 
-        total_travel_time = out_t._calc_total_travel_time ()
-        if total_travel_time[0] is None:
-            total_travel_time = out_t._calc_total_travel_time (use_abs_time=False)
-
-        out_t._total_travel_time = total_travel_time
+        Returns:
+            `Train`: copy of the train
+        """
 
+        out_t = Train ()
+        out_t._name = self._name
+        out_t._direction_id = self._direction_id
+        out_t._direction_name = self._direction_name
+        if self.stops is None:
+            return out_t
+
+        out_t._stops, out_t._tracks, copies = self._copy_pieces ()
+        # The end of a merged train may be a piece of its last segment (see
+        # `TrainCollection._merge_trains`)
+        pieces = dict ((_piece_key (p), p) for p in out_t._stops + out_t._tracks)
+        for name in ('_start', '_end', '_current'):
+            piece = getattr (self, name)
+            if piece is None:
+                setattr (out_t, name, None)
+            elif id (piece) in copies:
+                setattr (out_t, name, copies[id (piece)])
+            else:
+                setattr (out_t, name, pieces[_piece_key (piece)])
+        out_t._total_travel_time = self.total_travel_time
         return out_t
 
     @property
@@ -520,9 +809,9 @@ class Train (Line):
         if use_abs_time:
             # Get travel time
             try:
-                start_time = self.start.departure_time
-                end_time = self.end.arrival_time
-                travel_time = (end_time - start_time).total_seconds ()
+                start_time = self.start.departure_epoch
+                end_time = self.end.arrival_epoch
+                travel_time = float (end_time - start_time)
                 if start_station_num == end_station_num:
                     travel_time *= -1
             except:
@@ -540,6 +829,338 @@ class Train (Line):
                 (self.station_dict[end_station_num], end_station_num))
 
 
+class TrainSlice (Train):
+    """ This is a class to view a selection of the stops of a `Train`, and of
+    the tracks between them (see `Train.__getitem__`). The stops and tracks
+    are shared with the train rather than copied, and the start, end and total
+    travel time of the selection are only found once used. Slices are
+    read-only views: changes to their stops and tracks change the train (see
+    `Train.copy`).
+    """
+
+    # Attributes found once used
+    _end_attrs = frozenset (('_start', '_end', '_current'))
+
+    def __init__ (self, train, stops, tracks):
+        """
+        Args:
+            train (`Train`): train to view
+            stops (list): selected `TrainStop`s of the train, in order
+            tracks (list): `TrainTrack`s between the selected stops
+        """
+
+        self._name = train._name
+        self._direction_id = train._direction_id
+        self._direction_name = train._direction_name
+        self._stops = stops
+        self._tracks = tracks
+        self._station_dict = None
+        self._total_travel_time = None
+
+    def __getattr__ (self, name):
+        # Only called for attributes not set yet
+        if name not in TrainSlice._end_attrs or '_stops' not in self.__dict__:
+            raise AttributeError (name)
+        self._set_start ()
+        self._set_end ()
+        self._current = self._start
+        return self.__dict__[name]
+
+    @property
+    def total_travel_time (self):
+        """ End-to-end travel time of the selection, or the sum of its dwell
+        and travel times if its first departure or last arrival are missing
+        (see `Train.total_travel_time`).
+
+        Returns:
+            tuple: total travel time, start station (name and index),
+                and end station (name and index)
+        """
+
+        if self._total_travel_time is None:
+            total_travel_time = self._calc_total_travel_time ()
+            if total_travel_time[0] is None:
+                total_travel_time = self._calc_total_travel_time (use_abs_time=False)
+            self._total_travel_time = total_travel_time
+        return self._total_travel_time
+
+
+class TrainRow (Train):
+    """ This is a class to view a train of a `TrainMatrix` (one of its rows)
+    as a `Train`. Its total travel time is read from the matrix, and its stops
+    and tracks are only built (see `TrainTemplate`) once used. Rows are
+    read-only views: changes to their stops and tracks are not written to the
+    matrix.
+    """
+
+    # Attributes built with the stops and tracks
+    _piece_attrs = frozenset (('_stops', '_tracks', '_start', '_end', '_current'))
+
+    def __init__ (self, matrix, row, template):
+        """
+        Args:
+            matrix (`TrainMatrix`): trains of the line
+            row (int): index of the train
+            template (`TrainTemplate`): template of the base train of the line
+        """
+
+        for (name, value) in template._train_attrs.iteritems ():
+            if name not in TrainRow._piece_attrs:
+                self.__dict__[name] = value
+        self._total_travel_time = None
+        self._matrix = matrix
+        self._row = row
+        self._template = template
+
+    def __getattr__ (self, name):
+        # Only called for attributes not set yet: the stops and tracks are
+        # built on first use
+        if name not in TrainRow._piece_attrs or '_matrix' not in self.__dict__:
+            raise AttributeError (name)
+        self._load_pieces ()
+        return self.__dict__[name]
+
+    def _load_pieces (self):
+        """ Function to build the stops and tracks of the train, with the
+        times of its row.
+        """
+
+        matrix = self._matrix
+        row = self._row
+        train = self._template.new ()
+
+        start_piece = matrix.start_piece[row]
+        end_piece = matrix.end_piece[row]
+        for piece in xrange (start_piece, end_piece + 1):
+            i = piece // 2
+            if piece % 2 == 0:
+                if matrix.departure[row, i] == missing:
+                    continue
+                stop = train._stops[i]
+                stop._arrival_epoch = int (matrix.arrival[row, i])
+                stop._departure_epoch = int (matrix.departure[row, i])
+                stop._dwell_time = int (matrix.dwell_time[row, i])
+            else:
+                if matrix.track_departure[row, i] == missing:
+                    continue
+                track = train._tracks[i]
+                track._departure_epoch = int (matrix.track_departure[row, i])
+                track._arrival_epoch = int (matrix.track_arrival[row, i])
+                track._travel_time = int (matrix.travel_time[row, i])
+                track._benchmark_travel_time = int (matrix.benchmark_travel_time[row, i])
+
+        self._stops = train._stops
+        self._tracks = train._tracks
+        self._start = train._stops[start_piece // 2]
+        if end_piece % 2 == 0:
+            self._end = train._stops[end_piece // 2]
+        else:
+            self._end = train._tracks[end_piece // 2]
+        self._current = self._start
+
+    @property
+    def total_travel_time (self):
+        """ End-to-end travel time of the train, from its row unless its stops
+        and tracks have been built (see `Train.total_travel_time`).
+
+        Returns:
+            tuple: total travel time, start station (name and index),
+                and end station (name and index)
+        """
+
+        if self._total_travel_time is None:
+            if '_stops' in self.__dict__:
+                self._total_travel_time = self._calc_total_travel_time ()
+            else:
+                self._total_travel_time = self._calc_row_travel_time ()
+        return self._total_travel_time
+
+    def _calc_row_travel_time (self):
+        matrix = self._matrix
+        row = self._row
+        station_dict = self.station_dict
+
+        # A train ending on a track ends at its next stop
+        start_piece = matrix.start_piece[row]
+        end_piece = matrix.end_piece[row]
+        start_station_num = station_dict[station_dict[start_piece // 2]]
+        end_station_num = station_dict[station_dict[(end_piece + 1) // 2]]
+
+        start_time = matrix.departure[row, start_piece // 2]
+        if end_piece % 2 == 0:
+            end_time = matrix.arrival[row, end_piece // 2]
+        else:
+            end_time = matrix.track_arrival[row, end_piece // 2]
+        if start_time == missing or end_time == missing:
+            travel_time = None
+        else:
+            travel_time = float (end_time - start_time)
+            if start_station_num == end_station_num:
+                travel_time *= -1
+
+        return (travel_time,
+                (station_dict[start_station_num], start_station_num),
+                (station_dict[end_station_num], end_station_num))
+
+
+# Attributes linking the stops and tracks of a train
+_piece_links = frozenset (('_next_track', '_prev_track', '_prev_stop', '_next_stop'))
+
+def _piece_attrs (piece):
+    """ Function to get the attributes of a stop or track of a train, but for
+    those linking it to other stops or tracks.
+
+    Args:
+        piece (`TrainStop` or `TrainTrack`): stop or track
+
+    Returns:
+        list: (name, value) tuples
+    """
+
+    return [(name, value) for (name, value) in piece.__getstate__ ().iteritems ()
+            if name not in _piece_links or value is None]
+
+class TrainTemplate (object):
+    """ This is a class to build fresh `Train`s of a line, as copies of its
+    base train, without deep copying. The attributes of the train, stops and
+    tracks are gathered once, and each new train only allocates its objects
+    and links its stops and tracks directly. Attribute values (names,
+    coordinates, times) are immutable, and so shared by all trains.
+    """
+
+    def __init__ (self, base_train):
+        """
+        Args:
+            base_train (`Train`): train to copy, with its stops linked in
+                order by its tracks
+        """
+
+        stops = base_train.stops
+        tracks = base_train.tracks
+        if len (tracks) != max (len (stops) - 1, 0):
+            raise ValueError ("Base train tracks do not link its stops. Please check inputs ...")
+
+        self._train_attrs = dict (base_train.__dict__)
+        # The station numbers only depend on the stops: share them
+        self._train_attrs['_station_dict'] = base_train.station_dict
+        # Links between the stops and tracks are set by `new`
+        self._stop_attrs = [_piece_attrs (s) for s in stops]
+        self._track_attrs = [_piece_attrs (t) for t in tracks]
+
+        # Pieces are numbered 2 * i for the i-th stop, and 2 * i + 1 for the
+        # track after it
+        pieces = [None] * (len (stops) + len (tracks))
+        pieces[0::2] = stops
+        pieces[1::2] = tracks
+        piece_num = dict ((id (piece), i) for (i, piece) in enumerate (pieces))
+        self._start = piece_num[id (base_train._start)]
+        # The current piece is None once the train has been iterated over
+        self._current = piece_num.get (id (base_train._current))
+        self._end = piece_num[id (base_train._end)]
+
+    def new (self):
+        """ Function to build a new train.
+
+        Returns:
+            `Train`: copy of the base train
+        """
+
+        train = Train.__new__ (Train)
+        train.__dict__.update (self._train_attrs)
+
+        stops = []
+        for attrs in self._stop_attrs:
+            stop = TrainStop.__new__ (TrainStop)
+            for (name, value) in attrs:
+                setattr (stop, name, value)
+            stops.append (stop)
+
+        tracks = []
+        for (i, attrs) in enumerate (self._track_attrs):
+            track = TrainTrack.__new__ (TrainTrack)
+            for (name, value) in attrs:
+                setattr (track, name, value)
+            prev_stop = stops[i]
+            next_stop = stops[i+1]
+            track._prev_stop = prev_stop
+            track._next_stop = next_stop
+            prev_stop._next_track = track
+            next_stop._prev_track = track
+            tracks.append (track)
+
+        train._stops = stops
+        train._tracks = tracks
+        train._start = self._piece (stops, tracks, self._start)
+        train._current = self._piece (stops, tracks, self._current)
+        train._end = self._piece (stops, tracks, self._end)
+        return train
+
+    def dump (self, train):
+        """ Function to reduce a train built by `new` to what differs from the
+        base train: its start, current and end pieces, and the attributes its
+        stops and tracks loaded. This is much smaller and faster to pickle
+        than the train itself.
+
+        Args:
+            train (`Train`): train built by `new`
+
+        Returns:
+            tuple: state of the train, to build it again with `load`
+        """
+
+        stops = train.stops
+        tracks = train.tracks
+        piece_num = {}
+        for (i, stop) in enumerate (stops):
+            piece_num[id (stop)] = 2 * i
+        for (i, track) in enumerate (tracks):
+            piece_num[id (track)] = 2 * i + 1
+
+        loaded = []
+        for (pieces, attrs_list) in ((stops, self._stop_attrs),
+                                     (tracks, self._track_attrs)):
+            kind_loaded = []
+            for (piece, attrs) in izip (pieces, attrs_list):
+                kind_loaded.append (dict (
+                    (name, getattr (piece, name)) for (name, value) in attrs
+                    if getattr (piece, name) is not value))
+            loaded.append (kind_loaded)
+
+        return (piece_num[id (train._start)],
+                piece_num.get (id (train._current)),
+                piece_num[id (train._end)], loaded[0], loaded[1])
+
+    def load (self, state):
+        """ Function to build a train again from its state (see `dump`).
+
+        Args:
+            state (tuple): state returned by `dump`
+
+        Returns:
+            `Train`: a new train, equal to the dumped one
+        """
+
+        start, current, end, stops_loaded, tracks_loaded = state
+        train = self.new ()
+        for (pieces, kind_loaded) in ((train._stops, stops_loaded),
+                                      (train._tracks, tracks_loaded)):
+            for (piece, loaded) in izip (pieces, kind_loaded):
+                if loaded:
+                    piece.__setstate__ (loaded)
+
+        train._start = self._piece (train._stops, train._tracks, start)
+        train._current = self._piece (train._stops, train._tracks, current)
+        train._end = self._piece (train._stops, train._tracks, end)
+        return train
+
+    def _piece (self, stops, tracks, piece):
+        if piece is None:
+            return None
+        if piece % 2 == 0:
+            return stops[piece // 2]
+        return tracks[piece // 2]
+
+
 class TrainCollection (object):
     """ This is a meta-class to extract and hold a collection of `Train`s from
     the same T-line and direction. """
@@ -559,6 +1180,9 @@ class TrainCollection (object):
             self._travel_times = None
             self._dwell_times = None
             self._data_path = None
+            self._catalog = None
+            self._train_matrix = None
+            self._train_template = None
         else:
             self.load_existing (existing_collection)
 
@@ -574,9 +1198,14 @@ class TrainCollection (object):
         self._data_path = existing_collection._data_path
         self._base_train = copy.deepcopy (existing_collection.base_train)
         self._median_train = copy.deepcopy (existing_collection.base_train)
-        self._trains = copy.deepcopy (existing_collection.trains)
+        self._trains = None
+        self._train_matrix = copy.deepcopy (existing_collection._train_matrix)
+        if self._train_matrix is None:
+            self._trains = copy.deepcopy (existing_collection.trains)
         self._travel_times = copy.deepcopy (existing_collection._travel_times)
         self._dwell_times = copy.deepcopy (existing_collection._dwell_times)
+        self._catalog = None
+        self._train_template = None
 
     def load_base_train (self, line_name, direction_id="0"):
         """ Function to load the base route for the `Train` (see `Train.load`).
@@ -591,6 +1220,29 @@ class TrainCollection (object):
 
         self._base_train = Train ()
         self._base_train.load (line_name, direction_id=direction_id)
+        self._train_template = None
+
+    def _get_train_template (self):
+        """ Function to get the `TrainTemplate` of the base train, built
+        once.
+
+        Returns:
+            `TrainTemplate`: template of the base train
+        """
+
+        if self._train_template is None:
+            self._train_template = TrainTemplate (self._base_train)
+        return self._train_template
+
+    def _new_train (self):
+        """ Function to build a fresh copy of the base train (see
+        `TrainTemplate`).
+
+        Returns:
+            `Train`: copy of the base train
+        """
+
+        return self._get_train_template ().new ()
 
     def set_data_path (self, path):
         """ Function to set path where MBTA train data will downloaded to.
@@ -600,6 +1252,7 @@ class TrainCollection (object):
         """
 
         self._data_path = path
+        self._catalog = None
 
     def _check_base_train (function):
         """ Decorator of class functions to verify the base train has been set. """
@@ -608,7 +1261,7 @@ class TrainCollection (object):
             if self.base_train is None:
                 raise LookupError (
                     "Base train not set. Please use `TrainCollection.load_base_train` first ...")
-            function (self, *args, **kwargs)
+            return function (self, *args, **kwargs)
         return checker_helper
 
     def _check_data_path (function):
@@ -617,12 +1270,14 @@ class TrainCollection (object):
         def checker_helper (self, *args, **kwargs):
             if self._data_path is None:
                 raise LookupError ("Data path has not yet been set. Please use `TrainCollection.set_data_path`")
-            function (self, *args, **kwargs)
+            return function (self, *args, **kwargs)
         return checker_helper
 
     @_check_base_train
     @_check_data_path
-    def get_times (self, start_time, end_time, dry=False):
+    def get_times (self, start_time, end_time, dry=False, num_workers=1,
+                   incremental=True, scheduler=None, compress=None,
+                   lag=publication_lag):
         """ Function to download MBTA travel time JSONs for a specified time
         period. A wrapper of `Train.get_traveltimes` and `Train.get_dwelltimes`.
 
@@ -631,6 +1286,20 @@ class TrainCollection (object):
             end_time (datetime): end time of travel times
             path (str, optional): directory to save travel times to
             dry (bool, optional): if True, do not write out data to path
+            num_workers (int, optional): maximum number of concurrent queries.
+                The travel time and dwell time queries of every track, stop
+                and 7 day window share the same pool of workers.
+            incremental (bool, optional): if True, only query the windows not
+                yet recorded in the coverage manifest of the line (see
+                `CoverageManifest`), and record the new ones once written
+            scheduler (`RequestScheduler`, optional): scheduler of the queries,
+                setting their rate limit, retries and window splitting
+            compress (str, optional): storage format of the files, "gzip" or
+                "bz2" to compress them (adding ".gz" or ".bz2" to their names)
+            lag (int, optional): time (seconds) the MBTA API may take to
+                publish events. Coverage is only recorded up to this long
+                before now, so the last part of a recent window is queried
+                again next time.
 
         Returns:
             Files of MBTA JSON travel times for each `Track` in the `Line`. Files
@@ -638,196 +1307,837 @@ class TrainCollection (object):
             files will have names of the form:
                 traveltimes_<`Line.name`>_<`Line.direction_id`>_<First Stop ID>_<Second Stop ID>_<Start Time>_<End Time>.json
             The MBTA API limits queries to 7 day windows, so multiple files may
-            be output per-track.
+            be output per-track, each named after its own window.
         """
 
-        self._base_train.get_traveltimes (self._times_path, start_time, end_time, dry=dry)
-        self._base_train.get_dwelltimes (self._times_path, start_time, end_time, dry=dry)
+        manifest = None
+        if incremental and not dry:
+            manifest = CoverageManifest.for_line (self._data_path, self._base_train)
+
+        requests = self._base_train.traveltime_requests (
+            self._data_path, start_time, end_time, dry=dry, manifest=manifest)
+        requests.extend (self._base_train.dwelltime_requests (
+            self._data_path, start_time, end_time, dry=dry, manifest=manifest))
+
+        if manifest is None:
+            fetch_all (requests, num_workers=num_workers, dry=dry,
+                       scheduler=scheduler, compress=compress)
+            return
+
+        # Data for the future, and the last `lag` seconds, is not available
+        # yet: only record coverage up to then, so the rest of the window is
+        # queried again next time
+        available = int (time.time ()) - lag
+
+        def record (request):
+            manifest.add (request.kind, request.key, request.start,
+                          min (request.end, available))
+
+        try:
+            fetch_all (requests, num_workers=num_workers, callback=record,
+                       scheduler=scheduler, compress=compress)
+        finally:
+            manifest.save ()
 
     @_check_base_train
     @_check_data_path
-    def load_times (self):
-        """ Function to load the times of the train line. """
+    def load_times (self, start_time=None, end_time=None, num_workers=1):
+        """ Function to load the times of the train line.
 
-        self._load_travel_times ()
-        self._load_dwell_times ()
+        Args:
+            start_time (datetime, optional): if given, skip the times of trains
+                departing before this (given in US Eastern Time)
+            end_time (datetime, optional): if given, skip the times of trains
+                departing at or after this (given in US Eastern Time)
+            num_workers (int, optional): number of processes parsing the files
+                at once
+
+            Only the files whose windows overlap the time period are read.
+        """
+
+        if not isinstance (num_workers, int) or num_workers < 1:
+            raise ValueError ("num_workers must be a positive int. Please check inputs ...")
+
+        start, end = self._get_epoch_range (start_time, end_time)
+
+        pool = None
+        if num_workers > 1:
+            pool = multiprocessing.Pool (num_workers)
+        try:
+            self._load_travel_times (start=start, end=end, pool=pool)
+            self._load_dwell_times (start=start, end=end, pool=pool)
+        finally:
+            if pool is not None:
+                pool.terminate ()
+                pool.join ()
 
     @_check_base_train
     @_check_data_path
-    def _load_travel_times (self):
-        """ Function to load the travel times of the train line.
+    def compact_times (self, num_workers=1):
+        """ Function to convert all the times of the train line into a binary
+        store (see `EventStore`), to be opened with `open_times`.
+
+        All the times of the line are loaded to do so (see `load_times`):
+        they replace the times loaded before, e.g. those of a shorter period.
+
+        Args:
+            num_workers (int, optional): number of processes parsing the files
+                at once
+        """
+
+        self.load_times (num_workers=num_workers)
+
+        catalog = self._get_catalog ()
+        direction_id = self.base_train.direction_id
+        tables = {
+            'traveltimes': [('{0}_{1}'.format (*stops), table) for (stops, table)
+                            in sorted (self._travel_times.iteritems ())],
+            'dwelltimes': sorted (self._dwell_times.iteritems ()),
+        }
+        sources = [os.path.basename (f)
+                   for (kind, kind_tables) in tables.iteritems ()
+                   for (key, table) in kind_tables
+                   for (w_start, w_end, f) in catalog.files (kind, direction_id, key)]
+
+        EventStore.for_line (self._data_path, self._base_train).write (
+            tables, sources)
+
+    @_check_base_train
+    @_check_data_path
+    def open_times (self, start_time=None, end_time=None):
+        """ Function to load the times of the train line from its binary store
+        (see `compact_times`). The times are memory-mapped rather than read.
 
         Args:
-            path (str): directory used in `get_traveltimes` call
+            start_time (datetime, optional): if given, skip the times of trains
+                departing before this (given in US Eastern Time)
+            end_time (datetime, optional): if given, skip the times of trains
+                departing at or after this (given in US Eastern Time)
         """
 
+        start, end = self._get_epoch_range (start_time, end_time)
+
+        store = EventStore.for_line (self._data_path, self._base_train)
+        if not store.exists ():
+            raise IOError ("No event store found for the loaded line. Please use `TrainCollection.compact_times` first ...")
+
+        catalog = self._get_catalog ()
+        direction_id = self.base_train.direction_id
+        sources = sorted (
+            os.path.basename (f)
+            for kind in ('traveltimes', 'dwelltimes')
+            for key in store.keys (kind)
+            for (w_start, w_end, f) in catalog.files (kind, direction_id, key))
+        if sources != store.sources:
+            raise IOError ("Event store is out of date. Please use `TrainCollection.compact_times` again ...")
+
+        track_keys = set ('{0}_{1}'.format (track.prev_stop.stop_id,
+                                            track.next_stop.stop_id)
+                          for track in self._base_train.tracks)
+        stop_keys = set (stop.stop_id for stop in self._base_train.stops)
+
         self._travel_times = {}
+        for key in store.keys ('traveltimes'):
+            if key in track_keys:
+                self._travel_times[tuple (key.split ('_'))] = \
+                    store.read ('traveltimes', key).select (start, end)
 
-        traveltimes_dir = '{0}/{1}'.format (self._data_path, self.name)
+        self._dwell_times = {}
+        for key in store.keys ('dwelltimes'):
+            if key in stop_keys:
+                self._dwell_times[key] = \
+                    store.read ('dwelltimes', key).select (start, end)
 
-        tt_files = sorted (glob ('{0}/traveltimes_{1}_{2}*'.format (
-            traveltimes_dir, self.base_train.name, self.base_train.direction_id)))
+    def _get_epoch_range (self, start_time=None, end_time=None):
+        """ Function to check and convert an optional time period.
 
-        if len (tt_files) == 0:
-            raise IOError ('No travel time files found for the loaded line. Check path provided ...')
+        Args:
+            start_time (datetime, optional): start time of the period (given in
+                US Eastern Time)
+            end_time (datetime, optional): end time of the period (given in US
+                Eastern Time)
 
-        for f in tt_files:
-            stops = re.findall (r'_(\d{5})_(\d{5})_', f)[0]
+        Returns:
+            tuple: (start epoch, end epoch) of the period, either of which is
+                None if not given
+        """
 
-            # check if this stop combo is in the tracks
-            is_in_tracks = False
-            for track in self._base_train.tracks:
-                if stops[0] == track.prev_stop.stop_id and \
-                        stops[1] == track.next_stop.stop_id:
-                    is_in_tracks = True
-            if not is_in_tracks:
+        start = None
+        end = None
+        for (dt, bound) in ((start_time, 'start'), (end_time, 'end')):
+            if dt is None:
                 continue
+            if not isinstance (dt, datetime):
+                raise TypeError ("Input time must be a `datetime` ...")
+            epoch = eastern_epoch (dt)
+            if bound == 'start':
+                start = epoch
+            else:
+                end = epoch
+
+        if start is not None and end is not None and start > end:
+            raise ValueError ("Start time must be before end time ...")
+
+        return start, end
+
+    def _get_catalog (self):
+        """ Function to get the up to date `RawCatalog` of the line directory.
+
+        Returns:
+            `RawCatalog`: catalog of the raw files of the line
+        """
+
+        if self._catalog is None:
+            self._catalog = RawCatalog (
+                '{0}/{1}'.format (self._data_path, self.name),
+                self.base_train.name)
+        self._catalog.update ()
+        return self._catalog
+
+    def _read_files (self, kind, keys, start=None, end=None, pool=None):
+        """ Function to read the events of the raw files of tracks or stops.
 
-            with open (f) as f_json:
-                tt_json = json.load (f_json)
-            if stops in self._travel_times:
-                self._travel_times[stops].extend (tt_json['travel_times'])
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            keys (list): track or stop keys to read, in order
+            start (int, optional): skip events departing before this epoch
+            end (int, optional): skip events departing at or after this epoch
+            pool (multiprocessing.Pool, optional): processes to parse the
+                files on. By default, they are parsed in this process.
+
+        Returns:
+            list: (key, `EventTable`) tuples, with the events of every key
+                ordered by departure time
+        """
+
+        catalog = self._get_catalog ()
+        direction_id = self.base_train.direction_id
+
+        tasks = []
+        for key in keys:
+            files = catalog.files (kind, direction_id, key, start=start, end=end)
+            for (i, (w_start, w_end, f)) in enumerate (files):
+                # A window queried again (e.g. its last part, see `get_times`)
+                # overlaps the one before: its events replace theirs
+                f_end = end
+                if i + 1 < len (files) and files[i + 1][0] < w_end:
+                    f_end = files[i + 1][0] if end is None else min (end, files[i + 1][0])
+                tasks.append ((key, (f, kind, start, f_end)))
+
+        args = [task[1] for task in tasks]
+        if pool is None:
+            results = map (_read_events, args)
+        else:
+            # One file at a time: files differ a lot in size
+            results = pool.map (_read_events, args, chunksize=1)
+
+        # Files come out in the order they went in, i.e. ordered by window
+        # within each key
+        tables = []
+        for ((key, arg), result) in izip (tasks, results):
+            if tables and tables[-1][0] == key:
+                tables[-1][1].append (result)
             else:
-                self._travel_times[stops] = tt_json['travel_times']
+                tables.append ((key, [result]))
+        return [(key, EventTable.concatenate (kind, key_tables))
+                for (key, key_tables) in tables]
+
+    @_check_base_train
+    @_check_data_path
+    def _load_travel_times (self, start=None, end=None, pool=None):
+        """ Function to load the travel times of the train line.
+
+        Args:
+            start (int, optional): skip travel times departing before this
+                epoch
+            end (int, optional): skip travel times departing at or after this
+                epoch
+            pool (multiprocessing.Pool, optional): processes to parse the
+                files on
+        """
+
+        self._travel_times = self._read_times (
+            'traveltimes', start=start, end=end, pool=pool)
 
     @_check_base_train
     @_check_data_path
-    def _load_dwell_times (self):
+    def _load_dwell_times (self, start=None, end=None, pool=None):
         """ Function to load the dwell times of the train line.
 
         Args:
-            path (str): directory used in `get_dwelltimes` call
+            start (int, optional): skip dwell times departing before this
+                epoch
+            end (int, optional): skip dwell times departing at or after this
+                epoch
+            pool (multiprocessing.Pool, optional): processes to parse the
+                files on
         """
 
-        dwelltimes_dir = '{0}/{1}'.format (self._data_path, self.name)
+        self._dwell_times = self._read_times (
+            'dwelltimes', start=start, end=end, pool=pool)
 
-        dt_files = sorted (glob ('{0}/dwelltimes_{1}_{2}*'.format (
-            dwelltimes_dir, self.base_train.name, self.base_train.direction_id)))
+    def _read_times (self, kind, start=None, end=None, pool=None):
+        """ Function to read the travel times of the tracks, or the dwell
+        times of the stops, of the train line.
 
-        if len (dt_files) == 0:
-            raise IOError ('No dwell time files found for the loaded line. Check path provided ...')
+        Args:
+            kind (str): "traveltimes" or "dwelltimes"
+            start (int, optional): skip times departing before this epoch
+            end (int, optional): skip times departing at or after this epoch
+            pool (multiprocessing.Pool, optional): processes to parse the
+                files on
 
-        self._dwell_times = {}
+        Returns:
+            dict: `EventTable`s keyed by track (pair of stop IDs) or stop ID
+        """
 
-        for f in dt_files:
-            stop_num = re.findall (r'_(\d{5})_', f)[0]
+        keys = self._get_catalog ().keys (kind, self.base_train.direction_id)
 
-            # check if this stop is in the train stops
-            is_in_stops = False
-            for stop in self._base_train.stops:
-                if stop_num == stop.stop_id:
-                    is_in_stops = True
-            if not is_in_stops:
-                continue
+        if kind == 'traveltimes':
+            if len (keys) == 0:
+                raise IOError ('No travel time files found for the loaded line. Check path provided ...')
 
-            with open (f) as f_json:
-                dt_json = json.load (f_json)
-            if stop_num in self._dwell_times:
-                self._dwell_times[stop_num].extend (dt_json['dwell_times'])
-            else:
-                self._dwell_times[stop_num] = dt_json['dwell_times']
+            # check if each stop combo is in the tracks
+            line_keys = set ('{0}_{1}'.format (track.prev_stop.stop_id,
+                                               track.next_stop.stop_id)
+                             for track in self._base_train.tracks)
+        else:
+            if len (keys) == 0:
+                raise IOError ('No dwell time files found for the loaded line. Check path provided ...')
+
+            # check if each stop is in the train stops
+            line_keys = set (stop.stop_id for stop in self._base_train.stops)
+        keys = [key for key in keys if key in line_keys]
+
+        tables = {}
+        for (key, table) in self._read_files (kind, keys, start=start,
+                                              end=end, pool=pool):
+            if kind == 'traveltimes':
+                key = tuple (key.split ('_'))
+            tables[key] = table
+        return tables
 
     @_check_base_train
-    def load_trains (self, num_trains=None, merge=True):
+    @_check_data_path
+    def append_times (self, end_time=None, merge=True, num_workers=1):
+        """ Function to add the times of newly downloaded windows (see
+        `get_times`) to the loaded times, and the trains they make to the
+        loaded trains, without loading the others again. New segments
+        continuing loaded trains are merged into them, and the median train
+        is computed again when next used.
+
+        Only the times departing after the latest loaded time of their track
+        or stop are added. A train running across the end of the loaded times
+        is chained in two segments, which are merged like any other.
+
+        Args:
+            end_time (datetime, optional): if given, skip the times of trains
+                departing at or after this (given in US Eastern Time)
+            merge (bool, optional): if True, merge train segments that are
+                likely the same train
+            num_workers (int, optional): number of processes parsing the files
+                at once
+
+        Returns:
+            int: number of trains added
+        """
+
+        if not isinstance (num_workers, int) or num_workers < 1:
+            raise ValueError ("num_workers must be a positive int. Please check inputs ...")
+        if not self._travel_times or not self._dwell_times:
+            raise LookupError ("No times are loaded. Please use `TrainCollection.load_times` first ...")
+        if self.trains is None:
+            raise LookupError ("No trains are loaded. Please use `TrainCollection.load_trains` first ...")
+
+        start, end = self._get_epoch_range (end_time=end_time)
+
+        # The rows of the train matrix are read-only views: the trains are
+        # continued and merged into as trains of their own
+        if self._train_matrix is not None:
+            self._trains = [train.copy () for train in self.trains]
+            self._train_matrix = None
+
+        # Times up to the latest loaded departure of each track and stop are
+        # loaded already
+        firsts = {}
+        for tables in (self._travel_times, self._dwell_times):
+            for (key, table) in tables.iteritems ():
+                if len (table):
+                    firsts[key] = int (table['dep_dt'][-1]) + 1
+        if firsts:
+            start = min (firsts.itervalues ())
+
+        pool = None
+        if num_workers > 1:
+            pool = multiprocessing.Pool (num_workers)
+        try:
+            new_times = [(kind, tables, self._read_times (
+                              kind, start=start, end=end, pool=pool))
+                         for (kind, tables) in (
+                             ('traveltimes', self._travel_times),
+                             ('dwelltimes', self._dwell_times))]
+        finally:
+            if pool is not None:
+                pool.terminate ()
+                pool.join ()
+
+        queues = []
+        for (kind, tables, new_tables) in new_times:
+            for (key, table) in new_tables.iteritems ():
+                table = table.select (firsts.get (key))
+                if key in tables:
+                    table = EventTable.concatenate (kind, [tables[key], table])
+                tables[key] = table
+            # consume only the new times
+            queues.append (dict ((key, EventQueue (table.select (firsts.get (key))))
+                                 for (key, table) in tables.iteritems ()))
+        travel_times, dwell_times = queues
+
+        # Trains cut short by the end of the loaded times go on first, as
+        # they would had all times been loaded at once
+        recent = []
+        for train in reversed (self.trains):
+            if train.start.departure_epoch < \
+                    start - service_day_overlap:
+                break
+            recent.append (train)
+        for train in reversed (recent):
+            self._continue_train (train, travel_times, dwell_times)
+
+        segments = _iter_segments (self._new_train, travel_times, dwell_times)
+        new_trains = list (self._merge_segments (segments, merge=merge,
+                                                 trains=self.trains))
+        self._trains.extend (new_trains)
+        self._train_matrix = None
+        self._median_train = None
+        return len (new_trains)
+
+    @_check_base_train
+    def load_trains (self, num_trains=None, merge=True, engine='sequential',
+                     num_workers=1):
         """ Function to load all available trains from travel and dwell times.
 
         Args:
             num_trains (int, optional): number of trains to load
             merge (bool, optional): if True, merge train segments that are
                 likely the same train
+            engine (str, optional): "sequential" to chain the trains one at a
+                time, or "vectorized" to chain all of them at once into a
+                `TrainMatrix` (see `chain_trains`, and `train_matrix`). With
+                the vectorized engine, `Train` objects are only built when
+                `trains` is first used. A few ambiguous events (two trains
+                within the time tolerance) may be chained differently.
+            num_workers (int, optional): number of processes chaining the
+                trains of each service day at once (sequential engine only).
+                The trains are the same as chained by a single process.
         """
 
+        if engine not in ('sequential', 'vectorized'):
+            raise ValueError ("Unknown engine {0}. Please use 'sequential' or 'vectorized' ...".format (
+                engine))
+        self._check_trains_args (num_trains, num_workers)
+        if engine == 'vectorized' and num_workers > 1:
+            raise ValueError ("The vectorized engine runs in a single process. Please use num_workers=1 ...")
+
+        # the median train is computed again from the new trains
+        self._median_train = None
+        if engine == 'vectorized':
+            self._load_train_matrix (num_trains=num_trains, merge=merge)
+            return
+
+        self._trains = []
+        self._train_matrix = None
+        self._trains.extend (self._iter_trains (num_trains, merge, num_workers))
+
+    @_check_base_train
+    def iter_trains (self, num_trains=None, merge=True, num_workers=1):
+        """ Function to chain the trains from travel and dwell times one at a
+        time, as `load_trains` does, without loading all of them: a train is
+        yielded as soon as no later segment can be merged into it. Only the
+        trains that may still be continued are held, so that trains over long
+        periods can be gone through in constant memory. The trains of the
+        collection are left unchanged.
+
+        Args:
+            num_trains (int, optional): number of trains to chain
+            merge (bool, optional): if True, merge train segments that are
+                likely the same train
+            num_workers (int, optional): number of processes chaining the
+                trains of each service day at once (see `load_trains`)
+
+        Returns:
+            generator: `Train`s, in the order `load_trains` loads them
+        """
+
+        self._check_trains_args (num_trains, num_workers)
+        return self._iter_trains (num_trains, merge, num_workers)
+
+    def _check_trains_args (self, num_trains, num_workers):
+        """ Function to check the arguments of `load_trains` and
+        `iter_trains`, and that times have been loaded. """
+
         if not isinstance (num_trains, int) and num_trains is not None:
             raise TypeError ("num_trains must be an int. Please check inputs ...")
+        if not isinstance (num_workers, int) or num_workers < 1:
+            raise ValueError ("num_workers must be a positive int. Please check inputs ...")
 
         if self._travel_times is None or not self._travel_times:
             raise LookupError ("No travel times available. Please use `Train.load_travel_times` ...")
         if self._dwell_times is None or not self._dwell_times:
             raise LookupError ("No dwell times available. Please use `Train.load_dwell_times` ...")
 
-        self._trains = []
+    def _iter_trains (self, num_trains, merge, num_workers):
+        """ Function to chain trains with the sequential engine (see
+        `iter_trains`).
+
+        Args:
+            num_trains (int): number of trains to chain, or None
+            merge (bool): if True, merge train segments that are likely the
+                same train
+            num_workers (int): number of processes chaining the trains
+
+        Yields:
+            `Train`: trains, in order of their first segment
+        """
 
-        travel_times = copy.deepcopy (self._travel_times)
-        dwell_times = copy.deepcopy (self._dwell_times)
+        pool = None
+        if num_workers > 1:
+            pool = multiprocessing.Pool (
+                num_workers, _init_service_day_worker,
+                (self._base_train, self._travel_times, self._dwell_times))
+        try:
+            if pool is None:
+                # consume the events through queues, leaving the tables
+                # untouched
+                travel_times = dict ((key, EventQueue (table))
+                                     for (key, table) in self._travel_times.iteritems ())
+                dwell_times = dict ((key, EventQueue (table))
+                                    for (key, table) in self._dwell_times.iteritems ())
+
+                # strategy: peak at the departure times at each station, pop
+                #   earliest, then chain through rest of stops to get dwell
+                #   times and travel times
+                segments = _iter_segments (self._new_train, travel_times,
+                                           dwell_times)
+            else:
+                segments = self._iter_service_day_segments (pool, num_workers)
 
-        # convert lists to deques for easy popping
-        for (key, val) in travel_times.iteritems ():
-            travel_times[key] = deque (val)
-        for (key, val) in dwell_times.iteritems ():
-            dwell_times[key] = deque (val)
+            for train in self._merge_segments (segments, num_trains, merge):
+                yield train
+        finally:
+            if pool is not None:
+                segments.close ()
+                pool.terminate ()
+                pool.join ()
 
-        # strategy: peak at the departure times at each station, pop earliest,
-        #   then chain through rest of stops to get dwell times and travel times
-        if num_trains is None:
-            while True:
-                train = copy.deepcopy (self._base_train)
-                train = get_next_train (train, travel_times, dwell_times)
+    def _merge_segments (self, segments, num_trains=None, merge=True, trains=()):
+        """ Function to merge train segments that are likely the same train,
+        yielding each train as soon as no later segment can be merged into it
+        (see `iter_trains`).
 
-                # If no data left, break from loop
-                if train is None:
-                    break
+        Args:
+            segments (iterable): train segments, in order of their start
+            num_trains (int, optional): number of trains to yield
+            merge (bool, optional): if False, yield the segments as they are
+            trains (list, optional): trains chained earlier, which the
+                segments may continue. They are merged into, not yielded.
+
+        Yields:
+            `Train`: trains, in order of their first segment
+        """
 
-                try:
-                    if "Red" in train.name and \
-                            ("Andrew" in train.start.stop_name or
-                            "Andrew" in train.end.stop_name):
-                        # print ("Red train from wrong branch. Skipping ...")
-                        continue
-                    elif "Green" in train.name and \
-                            ("Kenmore" in train.start.stop_name or
-                            "Kenmore" in train.end.stop_name):
-                        continue
-                    elif "Green" in train.name and \
-                            ("Copley" in train.start.stop_name or
-                            "Copley" in train.end.stop_name):
-                        continue
-                except:
-                    pass
+        is_green = 'Green' in self.name
+        # trains later segments may continue, numbered in order
+        open_trains = OpenTrains (is_green=is_green)
+        held = {}
+        if merge:
+            for train in trains:
+                held[open_trains.add (*self._train_end (train))] = train
+        next_n = len (open_trains)  # number of the next train to yield
+        # A train is continued by segments arriving less than `latest`
+        # seconds after it departs from its end
+        latest = merge_window (merge_horizon, is_green)[1]
+        deps, earliest = earliest_arrivals (self._dwell_times) if merge else (None, None)
+        num_loaded = 0
+        for train in segments:
+            if num_trains is not None and num_loaded >= num_trains:
+                break
 
-                if merge:
-                    found_t = self._find_same_train (train)
-                    if found_t is None:
-                        self._trains.append (train)
+            if not merge:
+                num_loaded += 1
+                yield train
+                continue
 
+            arrival = train.start.arrival_epoch
+            found_t = self._find_same_train (train, open_trains, held, arrival)
+            if found_t is None:
+                held[open_trains.add (*self._train_end (train))] = train
+                num_loaded += 1
+
+            # Later segments start at a dwell time departing after this one
+            # arrives
+            bound = None
+            while next_n < len (open_trains):
+                end = open_trains.end (next_n)
+                if end is not None:
+                    if end[1] + latest > arrival:
+                        break
+                    if bound is None:
+                        bound = earliest[bisect_left (deps, arrival)]
+                    if end[1] + latest > bound:
+                        break
+                yield held.pop (next_n)
+                next_n += 1
+
+        for n in xrange (next_n, len (open_trains)):
+            yield held.pop (n)
+
+    def _service_days (self):
+        """ Function to get the service days spanned by the loaded dwell times.
+        Service days start at `service_day_hour` (US Eastern Time).
+
+        Returns:
+            list: (start epoch, end epoch) of each day, in order
+        """
+
+        deps = [table['dep_dt'] for table in self._dwell_times.itervalues ()
+                if len (table)]
+        if not deps:
+            return []
+        first = min (dep[0] for dep in deps)
+        last = max (dep[-1] for dep in deps)
+
+        first_day, last_day = local_fields ((first, last), service_day_hour).day
+        starts = day_starts (np.arange (first_day, last_day + 2), service_day_hour)
+        return zip (starts[:-1].tolist (), starts[1:].tolist ())
+
+    def _iter_service_day_segments (self, pool, num_workers):
+        """ Function to chain the trains of each service day on a pool of
+        processes (see `load_trains`).
+
+        A train starting late in a day may use events that the trains of the
+        next day would otherwise use. In that (rare) case, the next day is
+        chained again here, without them.
+
+        Args:
+            pool (multiprocessing.Pool): processes to chain the trains on, set
+                up by `_init_service_day_worker`
+            num_workers (int): number of processes of the pool
+
+        Yields:
+            `Train`: train segments, in order of their start
+        """
+
+        # Only as many days as processes are chained ahead, and all of them
+        # are waited for before stopping: terminating a process while it
+        # sends its trains back would hang the pool
+        template = self._get_train_template ()
+        days = iter (self._service_days ())
+        pending = deque ()
+        for day in islice (days, num_workers):
+            pending.append ((day, pool.apply_async (_assemble_service_day, (day,))))
+
+        travel_used = {}
+        dwell_used = {}
+        try:
+            while pending:
+                ((start, end), result) = pending.popleft ()
+                result = result.get ()
+                for day in islice (days, 1):
+                    pending.append ((day, pool.apply_async (_assemble_service_day, (day,))))
+
+                # Whether the trains of the day before used events of this day
+                overlap = any (
+                    used and used[-1] >= np.searchsorted (tables[key]['dep_dt'], first)
+                    for (tables, first, kind_used) in (
+                        (self._travel_times, start - service_day_lead, travel_used),
+                        (self._dwell_times, start, dwell_used))
+                    for (key, used) in kind_used.iteritems ())
+                if overlap:
+                    trains, travel_used, dwell_used = _chain_service_day (
+                        self._base_train, self._travel_times, self._dwell_times,
+                        start, end, travel_used, dwell_used)
                 else:
-                    self._trains.append (train)
+                    states, travel_used, dwell_used = result
+                    trains = (template.load (state) for state in states)
 
-        else:
-            count = 0
-            while len (self.trains) < num_trains:
-                train = copy.deepcopy (self._base_train)
-                train = get_next_train (train, travel_times, dwell_times)
+                for train in trains:
+                    yield train
+        finally:
+            for (day, result) in pending:
+                result.wait ()
 
-                # If no data left, break from loop early
-                if train is None:
-                    break
+    def _load_train_matrix (self, num_trains=None, merge=True):
+        """ Function to load all available trains with the vectorized engine
+        (see `load_trains`).
 
-                try:
-                    if "Red" in train.name and \
-                            ("Andrew" in train.start.stop_name or
-                            "Andrew" in train.end.stop_name):
-                        # print ("Red train from wrong branch. Skipping ...")
-                        continue
-                    elif "Green" in train.name and \
-                            ("Kenmore" in train.start.stop_name or
-                            "Kenmore" in train.end.stop_name):
-                        continue
-                    elif "Green" in train.name and \
-                            ("Copley" in train.start.stop_name or
-                            "Copley" in train.end.stop_name):
+        Args:
+            num_trains (int, optional): number of trains to load
+            merge (bool, optional): if True, merge train segments that are
+                likely the same train
+        """
+
+        stops = self._base_train.stops
+        matrix = chain_trains ([s.stop_id for s in stops], self._travel_times,
+                               self._dwell_times)
+
+        # Skip trains from other branches, going by their start and end stops
+        # (an end on a track is not on a branch stop)
+        excluded = _branch_stops (self.name)
+        if excluded:
+            is_excluded = np.array ([any (e in s.stop_name for e in excluded)
+                                     for s in stops] + [False])
+            end_stop = np.where (matrix.end_piece % 2 == 0,
+                                 matrix.end_piece // 2, len (stops))
+            matrix = matrix.take (~(is_excluded[matrix.start_piece // 2] |
+                                    is_excluded[end_stop]))
+
+        rows = np.arange (len (matrix))
+        if merge:
+            rows = self._merge_matrix_rows (matrix, num_trains)
+        if num_trains is not None:
+            rows = rows[:num_trains]
+
+        self._train_matrix = matrix.take (rows)
+        self._trains = None
+
+    def _merge_matrix_rows (self, matrix, num_trains=None):
+        """ Function to merge the rows of train segments that are likely the
+        same train, as `_find_same_train` does for `Train`s.
+
+        Args:
+            matrix (`TrainMatrix`): train segments, ordered by their start.
+                Merged rows are updated in place.
+            num_trains (int, optional): stop once this many trains are found
+
+        Returns:
+            numpy.ndarray: indices of the merged trains
+        """
+
+        station_dict = self.base_train.station_dict
+        station_num = [station_dict[s.station_name] for s in self.base_train.stops]
+        is_green = 'Green' in self.name
+
+        start_piece = matrix.start_piece.tolist ()
+        end_piece = matrix.end_piece.tolist ()
+        rows = np.arange (len (matrix))
+        start_stop = matrix.start_piece // 2
+        start_arr = matrix.arrival[rows, start_stop].tolist ()
+        end_dep = np.where (matrix.end_piece % 2 == 0,
+                            matrix.departure[rows, matrix.end_piece // 2],
+                            matrix.track_departure[rows, np.minimum (
+                                matrix.end_piece // 2,
+                                max (matrix.track_departure.shape[1] - 1, 0))]).tolist ()
+
+        trains = []
+        merged = []
+        for row in xrange (len (matrix)):
+            if num_trains is not None and len (trains) >= num_trains:
+                break
+
+            start_station_num = station_num[start_piece[row] // 2]
+            found_t = None
+            if start_station_num != 0:
+                for t in reversed (trains):
+                    # A train ending on a track is compared from its next stop
+                    station_num_diff = start_station_num - \
+                        station_num[(end_piece[t] + 1) // 2]
+
+                    # Missing portion of train data limited to < 4 stops
+                    if station_num_diff <= 0 or station_num_diff > 4:
                         continue
-                except:
-                    pass
 
-                if merge:
-                    found_t = self._find_same_train (train)
-                    if found_t is None:
-                        self._trains.append (train)
+                    time_diff = float (start_arr[row] - end_dep[t])
+                    if station_num_diff == 1 and time_diff >= 0. and time_diff < 180.:
+                        found_t = t
+                    elif is_green and time_diff / station_num_diff >= 30. and time_diff / station_num_diff < 180.:
+                        found_t = t
+                    elif time_diff / station_num_diff >= 60. and time_diff / station_num_diff < 180.:
+                        found_t = t
+                    elif time_diff / station_num_diff > 1000:
+                        break
+                    if found_t is not None:
+                        break
+
+            if found_t is None:
+                trains.append (row)
+            else:
+                merged.append ((found_t, row))
+                end_piece[found_t] = end_piece[row]
+                end_dep[found_t] = end_dep[row]
 
-                else:
-                    self._trains.append (train)
+        if merged:
+            matrix.merge (*zip (*merged))
+        return np.array (trains, dtype=np.int64)
+
+    def _matrix_train (self, row):
+        """ Function to view a row of the train matrix as a `Train`.
+
+        Args:
+            row (int): index of the train
 
-            # print (self.trains)
+        Returns:
+            `TrainRow`: view of the train
+        """
+
+        return TrainRow (self._train_matrix, row, self._get_train_template ())
+
+    def _build_train_matrix (self, trains):
+        """ Function to gather the times of trains into a `TrainMatrix`.
+
+        Args:
+            trains (list): `Train`s of the line
+
+        Returns:
+            `TrainMatrix`: times of the trains, one row per train
+        """
+
+        # The end of a merged train may be a piece of its last segment (see
+        # `_merge_trains`): pieces are found by their stops
+        piece_num = {}
+        for (i, stop) in enumerate (self._base_train.stops):
+            piece_num[_piece_key (stop)] = 2 * i
+        for (i, track) in enumerate (self._base_train.tracks):
+            piece_num[_piece_key (track)] = 2 * i + 1
+
+        def times (pieces, name):
+            return [missing if getattr (p, name) is None else getattr (p, name)
+                    for p in pieces]
+
+        matrix = TrainMatrix (len (trains), len (self._base_train.stops))
+        for (row, train) in enumerate (trains):
+            matrix.start_piece[row] = piece_num[_piece_key (train.start)]
+            matrix.end_piece[row] = piece_num[_piece_key (train.end)]
+            stops = train.stops
+            tracks = train.tracks
+            matrix.arrival[row] = times (stops, '_arrival_epoch')
+            matrix.departure[row] = times (stops, '_departure_epoch')
+            matrix.dwell_time[row] = times (stops, '_dwell_time')
+            matrix.track_departure[row] = times (tracks, '_departure_epoch')
+            matrix.track_arrival[row] = times (tracks, '_arrival_epoch')
+            matrix.travel_time[row] = times (tracks, '_travel_time')
+            matrix.benchmark_travel_time[row] = times (tracks, '_benchmark_travel_time')
+        return matrix
+
+    @_check_base_train
+    def compact_trains (self):
+        """ Function to hold the loaded trains as a `TrainMatrix` (see
+        `train_matrix`), as the vectorized engine does (see `load_trains`).
+        The trains become read-only views of its rows (see `TrainRow`), and
+        collection-wide statistics and plots are computed on its arrays.
+
+        Returns:
+            `TrainMatrix`: trains of the collection
+        """
+
+        if self.trains is None:
+            raise LookupError ("No trains are loaded. Please do this first ...")
+
+        if self._train_matrix is None:
+            self._train_matrix = self._build_train_matrix (self.trains)
+            self._trains = None
+            self._median_train = None
+        return self._train_matrix
 
     def _merge_trains (self, train1, train2):
         """ Function to merge two trains into one
@@ -848,8 +2158,8 @@ class TrainCollection (object):
                 continue
             elif piece1.stop_name == piece2.stop_name:
                 while True:
-                    piece1._arrival_time = piece2._arrival_time
-                    piece1._departure_time = piece2._departure_time
+                    piece1._arrival_epoch = piece2._arrival_epoch
+                    piece1._departure_epoch = piece2._departure_epoch
 
                     try:
                         piece1._travel_time = piece2._travel_time
@@ -864,58 +2174,92 @@ class TrainCollection (object):
 
                 return train1
 
-    def _find_same_train (self, train):
+    def _continue_train (self, train, travel_times, dwell_times):
+        """ Function to load the events following the end of a train, if
+        found (see `get_next_train`).
+
+        The end of a merged train is a piece of its last segment (see
+        `_merge_trains`): that segment goes on, and its new times are copied
+        to the train.
+
+        Args:
+            train (Train): train to continue
+            travel_times (dict): `EventQueue`s of the tracks
+            dwell_times (dict): `EventQueue`s of the stops
+
+        Returns:
+            bool: True if the train went on
+        """
+
+        end = train.end
+        if next (end) is None:
+            return False
+        last_piece = _chain_pieces (
+            end, end.arrival_epoch,
+            end.departure_epoch, travel_times,
+            dwell_times)
+        if last_piece is end:
+            return False
+
+        if not any (piece is end for piece in train):
+            own_pieces = dict ((_piece_key (piece), piece) for piece in train)
+            piece = end
+            while piece is not last_piece:
+                piece = next (piece)
+                own_piece = own_pieces[_piece_key (piece)]
+                own_piece._arrival_epoch = piece._arrival_epoch
+                own_piece._departure_epoch = piece._departure_epoch
+                try:
+                    own_piece._travel_time = piece._travel_time
+                except:
+                    own_piece._dwell_time = piece._dwell_time
+        train._end = last_piece
+        return True
+
+    def _find_same_train (self, train, open_trains, trains, arrival):
         """ Function to find if the first leg of a train has already been loaded
 
         Args:
             train (Train): train to find
+            open_trains (`OpenTrains`): trains loaded so far
+            trains (dict): trains that may be continued, keyed by their number
+                in `open_trains`
+            arrival (int): arrival time (epoch) of the train at its start
 
         Returns:
             `Train`: merged train if first leg is found, None otherwise
         """
 
-        if self.base_train.station_dict[train.start.station_name] == 0:
+        n = open_trains.find (
+            self.base_train.station_dict[train.start.station_name], arrival)
+        if n is None:
             return None
-        else:
-            for t in self._trains[::-1]:
-                try:
-                    station_num_diff = \
-                        self.base_train.station_dict[train.start.station_name] - \
-                        self.base_train.station_dict[t.end.station_name]
-                except:
-                    if t.end.next_stop is not None:
-                        station_num_diff = \
-                            self.base_train.station_dict[train.start.station_name] - \
-                            self.base_train.station_dict[t.end.next_stop.station_name]
-                    else:
-                        continue
 
-                # Missing portion of train data limited to < 4 stops
-                if station_num_diff <= 0:
-                    continue
-                elif station_num_diff > 4:
-                    continue
+        t = self._merge_trains (trains[n], train)
+        open_trains.move (n, *self._train_end (t))
+        return t
+
+    def _train_end (self, train):
+        """ Function to get where a train ends, for `OpenTrains`. A train
+        ending on a track is taken to end at the next stop.
+
+        Args:
+            train (Train): train
+
+        Returns:
+            tuple: station number and departure time (epoch) of the end of
+                the train, or (None, None)
+        """
 
-                time_diff = (train.start.arrival_time - t.end.departure_time).total_seconds ()
-
-                # Averageg time per train leg must be > 30 sec and < 3 minutes.
-                # Otherwise, unlikely to be the same train. If the train is too
-                # far in the past, we have not found a candidate train, so
-                # return None
-                if station_num_diff == 1 and time_diff >= 0. and time_diff < 180.:
-                    t = self._merge_trains (t, train)
-                    # t._end = train.end
-                    return t
-                elif 'Green' in self.name and time_diff / station_num_diff >= 30. and time_diff / station_num_diff < 180.:
-                    t = self._merge_trains (t, train)
-                    # t._end = train.end
-                    return t
-                elif time_diff / station_num_diff >= 60. and time_diff / station_num_diff < 180.:
-                    t = self._merge_trains (t, train)
-                    # t._end = train.end
-                    return t
-                elif time_diff / station_num_diff > 1000:
-                    return None
+        end = train.end
+        if isinstance (end, TrainTrack):
+            if end.next_stop is None:
+                return (None, None)
+            station_name = end.next_stop.station_name
+        else:
+            station_name = end.station_name
+        return (self.base_train.station_dict[station_name],
+                end.departure_epoch)
 
     def plot_trains (self, ax, station_ref_dict, **kwargs):
         """ Function to plot the travel times of all `Train`s in the collection.
@@ -931,16 +2275,81 @@ class TrainCollection (object):
         if self.trains is None:
             raise LookupError ("No plotting performed. Trains have not been loaded ...")
 
+        if self._train_matrix is not None:
+            self._plot_train_matrix (ax, station_ref_dict, **kwargs)
+            return
+
         for t in self.trains:
             if station_ref_dict[t.start.station_name] > 0 and \
                     station_ref_dict[t.start.station_name] < (len (t.stops) - 1):
                 continue
             t.plot_train (ax, station_ref_dict, **kwargs)
 
+    def _plot_train_matrix (self, ax, station_ref_dict, **kwargs):
+        """ Function to plot the travel times of all trains from the train
+        matrix, as `Train.plot_train` does for each train.
+
+        Args:
+            ax (matplotlib.pyplot.Axes): axes to plot travel time to
+            station_ref_dict (dict): in-sequence station number of a given
+                station name (see `Train.station_dict`)
+        """
+
+        matrix = self._train_matrix
+        num_stops = matrix.arrival.shape[1]
+        start_piece = matrix.start_piece[:, np.newaxis]
+        end_piece = matrix.end_piece[:, np.newaxis]
+
+        # Times in the order they are plotted: the arrival and departure of
+        # each stop, then the departure and arrival of the track after it
+        times = np.empty ((len (matrix), 4 * num_stops - 2), dtype=np.int64)
+        times[:, 0::4] = matrix.arrival
+        times[:, 1::4] = matrix.departure
+        times[:, 2::4] = matrix.track_departure
+        times[:, 3::4] = matrix.track_arrival
+        piece = np.arange (times.shape[1]) // 2
+
+        station_num = np.array ([station_ref_dict.get (s.station_name, -1)
+                                 for s in self.base_train.stops])
+        x_coords = np.empty (times.shape[1], dtype=np.int64)
+        x_coords[0::4] = station_num
+        x_coords[1::4] = station_num
+        x_coords[2::4] = station_num[:-1]
+        x_coords[3::4] = station_num[1:]
+
+        # Trains plot from their start to their end, but for the arrival at
+        # their first stop and the departure from their last
+        start_column = np.arange (times.shape[1]) == 2 * start_piece
+        end_column = (np.arange (times.shape[1]) == 2 * end_piece + 1) & \
+            (end_piece % 2 == 0)
+        plotted = (times != missing) & (x_coords != -1) & \
+            (piece >= start_piece) & (piece <= end_piece) & \
+            ~start_column & ~end_column
+
+        rows = np.arange (len (matrix))
+        start_time = matrix.departure[rows, matrix.start_piece // 2]
+        start_station_num = station_num[matrix.start_piece // 2]
+        y_coords = (times - start_time[:, np.newaxis]) / 60.
+        for row in rows:
+            if start_station_num[row] > 0 and start_station_num[row] < num_stops - 1:
+                continue
+            if start_time[row] == missing:
+                ax.plot ([], [], **kwargs)
+            else:
+                ax.plot (x_coords[plotted[row]], y_coords[row, plotted[row]], **kwargs)
+            ax.grid (ls='-', color='grey', alpha=0.3)
+
     def __getitem__ (self, key):
         if self.trains is None:
             raise LookupError ("Trains have not yet been load. Please do this first ...")
 
+        if self._train_matrix is not None:
+            # The selected rows are viewed as trains
+            out_tc = TrainCollection (self)
+            out_tc._train_matrix = self._train_matrix.take (
+                np.atleast_1d (np.arange (len (self._train_matrix))[key]))
+            return out_tc
+
         out_tc = TrainCollection (self)
 
         trains = self.trains[key]
@@ -956,6 +2365,32 @@ class TrainCollection (object):
         else:
             return iter (self.trains)
 
+    def __getstate__ (self):
+        state = dict (self.__dict__)
+        # The train template, and the views of the rows of the train matrix,
+        # are built again when needed
+        state['_train_template'] = None
+        if self._train_matrix is not None:
+            state['_trains'] = None
+        return state
+
+    def __setstate__ (self, state):
+        # Collections pickled by earlier versions have no catalog nor train
+        # matrix
+        state.setdefault ('_catalog', None)
+        state.setdefault ('_train_matrix', None)
+        # and hold their times as lists of MBTA JSON events
+        for (name, kind) in (('_travel_times', 'traveltimes'),
+                             ('_dwell_times', 'dwelltimes')):
+            times = state.get (name)
+            if times is not None:
+                state[name] = dict (
+                    (key, table if isinstance (table, EventTable)
+                     else EventTable.from_events (kind, table))
+                    for (key, table) in times.iteritems ())
+        self.__dict__.update (state)
+        self._train_template = None
+
     @_check_base_train
     def update_median_train (self):
         """ Method to update the median train if different trains have been
@@ -965,7 +2400,10 @@ class TrainCollection (object):
         if self.trains is None:
             raise LookupError ("No trains are loaded. Please do this first ...")
 
-        self._median_train = copy.deepcopy (self._base_train)
+        self._median_train = self._new_train ()
+        if self._train_matrix is not None:
+            self._update_matrix_median_train ()
+            return
 
         for (i, stop) in enumerate (self._median_train._stops):
             stop._dwell_time = np.median ([
@@ -977,13 +2415,35 @@ class TrainCollection (object):
             for t in self.trains:
                 if t.tracks[i].travel_time is not None:
                     travel_times.append (t.tracks[i].travel_time)
-                elif t.stops[i+1].arrival_time is not None and \
-                        t.stops[i].departure_time is not None:
-                    travel_times.append (
-                        (t.stops[i+1].arrival_time -
-                         t.stops[i].departure_time).total_seconds ())
+                elif t.stops[i+1].arrival_epoch is not None and \
+                        t.stops[i].departure_epoch is not None:
+                    travel_times.append (float (
+                        t.stops[i+1].arrival_epoch - t.stops[i].departure_epoch))
             track._travel_time = np.median ([travel_times])
 
+        self._set_median_train_ends ()
+
+    def _update_matrix_median_train (self):
+        """ Function to compute the median train from the train matrix, as
+        `update_median_train` does from the trains.
+        """
+
+        matrix = self._train_matrix
+        dwell_times = matrix.masked ('dwell_time')
+        for (i, stop) in enumerate (self._median_train._stops):
+            stop._dwell_time = np.median (dwell_times[:, i].compressed ())
+
+        # Tracks without times take the time from the stop before them to the
+        # stop after them
+        gaps = matrix.masked ('arrival')[:, 1:] - matrix.masked ('departure')[:, :-1]
+        travel_times = matrix.masked ('travel_time')
+        travel_times = np.ma.where (travel_times.mask, gaps, travel_times)
+        for (i, track) in enumerate (self._median_train._tracks):
+            track._travel_time = np.median (travel_times[:, i].compressed ())
+
+        self._set_median_train_ends ()
+
+    def _set_median_train_ends (self):
         self._median_train._start = self._median_train._stops[0]
         self._median_train._current = self._median_train._start
         self._median_train._end = self._median_train._stops[-1]
@@ -1030,4 +2490,19 @@ class TrainCollection (object):
             list: list of `Trains` in the collection
         """
 
+        if self._trains is None and self._train_matrix is not None:
+            self._trains = [self._matrix_train (i)
+                            for i in xrange (len (self._train_matrix))]
         return self._trains
+
+    @property
+    def train_matrix (self):
+        """ `TrainCollection` trains as matrices of times, if loaded with the
+        vectorized engine (see `load_trains`) or compacted (see
+        `compact_trains`). The trains are views of its rows.
+
+        Returns:
+            `TrainMatrix`: trains of the collection
+        """
+
+        return self._train_matrix
@@ -6,15 +6,16 @@ import os
 import re
 import json
 import tweepy
-import requests
 import urllib2
 
 from datetime import datetime, timedelta
-from pytz import timezone
 from itertools import izip
 from bs4 import BeautifulSoup
 from enum import Enum
 
+from client import get_session
+from localtime import utc, eastern, eastern_time
+
 ashmont_branch_stations = ('Ashmont', 'Shawmut', 'Fields Corner', 'Savin Hill')
 braintree_branch_stations = ('Braintree', 'Quincy Adams', 'Quincy Center',
                              'Wollaston', 'North Quincy')
@@ -37,11 +38,11 @@ twitter_search_url = 'https://twitter.com/search?l=&q=%23MBTA%20'
 
 def get_epoch_time (dt):
     epoch = datetime.utcfromtimestamp(0)
-    epoch = timezone('UTC').localize (epoch)
+    epoch = utc.localize (epoch)
     try:
         out_str = str (int ((dt - epoch).total_seconds ()))
     except:
-        dt = timezone('UTC').localize (dt)
+        dt = utc.localize (dt)
         out_str = str (int ((dt - epoch).total_seconds ()))
 
     return out_str
@@ -55,10 +56,7 @@ def get_eastern_time_utc (utc):
     Returns:
         `datetime`: Eastern Time localized `datetime` of UTC time stamp
     """
-    dt = datetime.utcfromtimestamp (int (utc))
-    dt = timezone ('UTC').localize (dt)
-    dt = dt.astimezone (timezone ('US/Eastern'))
-    return (dt)
+    return eastern_time (utc)
 
 def localize_eastern_dt (dt):
     """ Function to localize given datetime to US Eastern Time.
@@ -73,9 +71,9 @@ def localize_eastern_dt (dt):
     """
 
     if dt.tzinfo is not None and dt.tzinfo.utcoffset(dt) is not None:
-        dt = dt.astimezone (timezone ('US/Eastern'))
+        dt = dt.astimezone (eastern)
     else:
-        dt = timezone ('US/Eastern').localize (dt)
+        dt = eastern.localize (dt)
 
     return dt
 
@@ -185,7 +183,7 @@ def get_mbta_tweets_scrape (username, start_date, end_date,
 
         url = twitter_search_url + appender
 
-        page = requests.get (twitter_search_url + appender, headers=headers)
+        page = get_session ().get (twitter_search_url + appender, headers=headers)
         soup = BeautifulSoup (page.text, "html.parser")
 
         divs = soup.find_all ('div', {"class" : "tweet"})
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import multiprocessing
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from glob import glob
+
+from benchmark_ingest import make_archive
+from mbta_performance import train
+from mbta_performance.events import EventQueue, DepartureHeap
+from mbta_performance.utils import lines
+
+def select_starts (tc, use_heap):
+    """ Take all dwell times in order of departure, i.e. only the train start
+    selection step of `get_next_train`. """
+
+    dwell_times = dict ((key, EventQueue (table))
+                        for (key, table) in tc._dwell_times.iteritems ())
+    if use_heap:
+        dwell_times = DepartureHeap (dwell_times)
+
+    num_events = 0
+    while True:
+        key = train.get_first_train_stop (dwell_times)
+        if key is None:
+            return num_events
+        dwell_times[key].popleft ()
+        num_events += 1
+
+if __name__ == '__main__':
+    weeks = int (sys.argv[1]) if len (sys.argv) > 1 else 4
+
+    curr_dir = os.path.dirname (os.path.realpath (__file__))
+    test_dir = '{0}/tests/test_data'.format (os.path.dirname (curr_dir))
+    raw_files = glob ('{0}/*_times/Blue/*.json'.format (test_dir))
+
+    data_path = tempfile.mkdtemp ()
+    try:
+        make_archive (data_path, raw_files, weeks)
+
+        tc = train.TrainCollection ()
+        tc.load_base_train (lines.blue, direction_id="0")
+        tc.set_data_path (data_path)
+        tc.load_times ()
+    finally:
+        shutil.rmtree (data_path)
+
+    print ("Assembling {0} weeks of {1} trains ({2} stops)".format (
+        weeks, tc.name, len (tc.base_train.stops)))
+
+    for (label, use_heap) in (('scan of all stops', False),
+                              ('DepartureHeap', True)):
+        t0 = time.time ()
+        num_events = select_starts (tc, use_heap)
+        elapsed = time.time () - t0
+        print ("k-way merge of dwell times by {0:18s}: {1:6d} events in {2:6.2f} s".format (
+            label, num_events, elapsed))
+
+    # The whole of load_trains, with each way of finding train starts: every
+    # train moves the first event of most stops, which the heap then reorders
+    for (label, use_heap) in (('scan of all stops', False),
+                              ('DepartureHeap', True)):
+        train.use_departure_heap = use_heap
+        t0 = time.time ()
+        tc.load_trains (merge=False)
+        elapsed = time.time () - t0
+        num_trains = len (tc.trains)
+        print ("load_trains, train starts by {0:18s}: {1:6d} trains in {2:6.2f} s ({3:7.0f} trains/s)".format (
+            label, num_trains, elapsed, num_trains / elapsed))
+    train.use_departure_heap = False
+
+    for merge in (False, True):
+        rates = {}
+        for engine in ('sequential', 'vectorized'):
+            t0 = time.time ()
+            tc.load_trains (merge=merge, engine=engine)
+            elapsed = time.time () - t0
+            num_trains = len (tc.train_matrix) if engine == 'vectorized' else len (tc.trains)
+            rates[engine] = num_trains / elapsed
+            print ("load_trains (merge={0}, engine={1:10s}): {2:6d} trains in {3:6.2f} s ({4:9.0f} trains/s)".format (
+                merge, engine, num_trains, elapsed, rates[engine]))
+        print ("vectorized speed-up: {0:.0f}x".format (
+            rates['vectorized'] / rates['sequential']))
+
+    # Service days chained on several processes
+    serial_time = None
+    for num_workers in (1, 2, 4, 8):
+        t0 = time.time ()
+        tc.load_trains (num_workers=num_workers)
+        elapsed = time.time () - t0
+        if serial_time is None:
+            serial_time = elapsed
+        print ("load_trains (num_workers={0:2d}): {1:6d} trains in {2:6.2f} s   speed-up {3:4.1f}x ({4} cores)".format (
+            num_workers, len (tc.trains), elapsed, serial_time / elapsed,
+            multiprocessing.cpu_count ()))
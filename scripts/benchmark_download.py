@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime, timedelta
+
+from mbta_performance import client, line, train
+from mbta_performance.stand_in import StandInServer
+from mbta_performance.utils import lines
+
+if __name__ == '__main__':
+    latency = 0.05  # seconds per request at the stand-in server
+
+    start_time = datetime (2016, 1, 7, 4, 0, 0)
+    end_time = start_time + timedelta (weeks=4)
+
+    with StandInServer (delay=latency, interval=300) as server:
+        line.mbta_traveltime_url = server.traveltime_url
+        line.mbta_dwelltime_url = server.dwelltime_url
+
+        tc = train.TrainCollection ()
+        tc.load_base_train (lines.green_c, direction_id="0")
+
+        print ("Downloading", tc.name, "from", start_time, "to", end_time,
+               "with {0:.0f} ms latency per request".format (latency * 1e3))
+
+        serial_time = None
+        for num_workers in (1, 2, 4, 8, 16, 32):
+            data_path = tempfile.mkdtemp ()
+            try:
+                tc.set_data_path (data_path)
+                count = server.request_count
+                client.set_session (client.Session ())
+                t0 = time.time ()
+                tc.get_times (start_time, end_time, num_workers=num_workers)
+                elapsed = time.time () - t0
+                count = server.request_count - count
+            finally:
+                shutil.rmtree (data_path)
+
+            if serial_time is None:
+                serial_time = elapsed
+            print ("workers: {0:3d}   requests: {1:4d}   wall time: {2:6.2f} s   speed-up: {3:5.1f}x".format (
+                num_workers, count, elapsed, serial_time / elapsed))
+
+            session = client.get_session ()
+            print ("             connections: {0:4d}   reuse rate: {1:5.1%}   MB on wire: {2:.2f} ({3:.2f} decoded)".format (
+                session.connection_count, session.reuse_rate,
+                session.bytes_on_wire / 1e6, session.bytes_decoded / 1e6))
+            session.close ()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import multiprocessing
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from glob import glob
+
+from mbta_performance import storage, train
+from mbta_performance.utils import lines
+
+week = 7 * 24 * 3600
+
+def make_archive (data_path, raw_files, weeks):
+    """ Write `weeks` copies of the test week, each shifted one week later. """
+
+    out_dir = '{0}/Blue'.format (data_path)
+    os.makedirs (out_dir)
+    for f in raw_files:
+        kind, name, direction_id, key, start, end = storage.parse_raw_filename (f)
+        with open (f) as f_json:
+            raw = json.load (f_json)
+        field = 'travel_times' if kind == 'traveltimes' else 'dwell_times'
+        for i in range (weeks):
+            shift = i * week
+            events = []
+            for e in raw[field]:
+                e = dict (e)
+                e['arr_dt'] = str (int (e['arr_dt']) + shift)
+                e['dep_dt'] = str (int (e['dep_dt']) + shift)
+                events.append (e)
+            storage.write_raw ([json.dumps ({field: events})],
+                               '{0}/{1}_{2}_{3}_{4}_{5}_{6}.json'.format (
+                                   out_dir, kind, name, direction_id, key,
+                                   start + shift, end + shift))
+
+if __name__ == '__main__':
+    weeks = int (sys.argv[1]) if len (sys.argv) > 1 else 26
+
+    curr_dir = os.path.dirname (os.path.realpath (__file__))
+    test_dir = '{0}/tests/test_data'.format (os.path.dirname (curr_dir))
+    raw_files = glob ('{0}/*_times/Blue/*.json'.format (test_dir))
+
+    data_path = tempfile.mkdtemp ()
+    try:
+        make_archive (data_path, raw_files, weeks)
+        files = glob ('{0}/Blue/*times_*.json'.format (data_path))
+        size = sum (os.path.getsize (f) for f in files)
+        print ("Synthetic archive: {0} weeks, {1} files, {2:.0f} MB of JSON ({3} cores)".format (
+            weeks, len (files), size / 1e6, multiprocessing.cpu_count ()))
+
+        tc = train.TrainCollection ()
+        tc.load_base_train (lines.blue, direction_id="0")
+        tc.set_data_path (data_path)
+        tc.load_times ()  # build the catalog, warm the page cache
+
+        serial_time = None
+        for num_workers in (1, 2, 4, 8):
+            t0 = time.time ()
+            tc.load_times (num_workers=num_workers)
+            elapsed = time.time () - t0
+            if serial_time is None:
+                serial_time = elapsed
+            # load_times reads the files of a single direction: half the archive
+            print ("num_workers = {0:2d}:   {1:6.2f} s   {2:6.1f} MB/s   speed-up {3:4.1f}x".format (
+                num_workers, elapsed, size / 2e6 / elapsed, serial_time / elapsed))
+    finally:
+        shutil.rmtree (data_path)
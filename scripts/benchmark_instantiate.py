@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import gc
+import os
+import sys
+import copy
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mbta_performance import train
+from mbta_performance.utils import lines
+
+def train_size (t):
+    """ Bytes held by the objects of a train (the train, its stops and tracks,
+    their dictionaries and the lists holding them). """
+
+    objects = [t, t.stops, t.tracks] + t.stops + t.tracks
+    return sum (sys.getsizeof (o) + sys.getsizeof (getattr (o, '__dict__', None))
+                for o in objects)
+
+def instantiate (new_train, num_trains):
+    """ Build trains, and measure the time and the objects they allocate. """
+
+    gc.collect ()
+    num_objects = len (gc.get_objects ())
+    t0 = time.time ()
+    trains = [new_train () for i in xrange (num_trains)]
+    elapsed = time.time () - t0
+    gc.collect ()
+    num_objects = len (gc.get_objects ()) - num_objects
+    return trains, elapsed, num_objects
+
+if __name__ == '__main__':
+    num_trains = int (sys.argv[1]) if len (sys.argv) > 1 else 5000
+
+    tc = train.TrainCollection ()
+    tc.load_base_train (lines.blue, direction_id="0")
+    print ("Instantiating {0} {1} trains ({2} stops)".format (
+        num_trains, tc.name, len (tc.base_train.stops)))
+
+    rates = {}
+    for (label, new_train) in (
+            ('copy.deepcopy', lambda: copy.deepcopy (tc.base_train)),
+            ('TrainTemplate', tc._new_train)):
+        trains, elapsed, num_objects = instantiate (new_train, num_trains)
+        rates[label] = num_trains / elapsed
+        print ("{0:14s}: {1:6.2f} s ({2:8.0f} trains/s), {3:4.0f} objects and {4:6.0f} bytes per train".format (
+            label, elapsed, rates[label], num_objects / float (num_trains),
+            train_size (trains[0])))
+        del trains
+
+    print ("TrainTemplate speed-up: {0:.0f}x".format (
+        rates['TrainTemplate'] / rates['copy.deepcopy']))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from glob import glob
+
+from benchmark_ingest import make_archive
+from mbta_performance import train
+from mbta_performance.utils import lines
+
+class DictPiece (object):
+    """ A stop or track with a dictionary per instance, as they were before
+    they held their attributes in slots. """
+
+def dict_piece_size (piece):
+    """ Bytes of a stop or track with the same attributes, held in a
+    dictionary set one attribute at a time (as `__init__` does). """
+
+    replica = DictPiece ()
+    for (name, value) in piece.__getstate__ ().iteritems ():
+        setattr (replica, name, value)
+    return sys.getsizeof (replica) + sys.getsizeof (replica.__dict__)
+
+def train_sizes (t):
+    """ Bytes held by a train: its own objects (train, dictionary and lists),
+    its stops and tracks with slots and with dictionaries, and the times they
+    loaded as epoch ints and as datetimes. """
+
+    pieces = t.stops + t.tracks
+    own = sum (sys.getsizeof (o) for o in (t, t.__dict__, t.stops, t.tracks))
+    epochs = [getattr (p, name) for p in pieces
+              for name in ('arrival_epoch', 'departure_epoch')
+              if getattr (p, name) is not None]
+    datetimes = [train._eastern_time (epoch) for epoch in epochs]
+    return (own, sum (sys.getsizeof (p) for p in pieces),
+            sum (dict_piece_size (p) for p in pieces),
+            sum (sys.getsizeof (e) for e in epochs),
+            sum (sys.getsizeof (dt) for dt in datetimes))
+
+if __name__ == '__main__':
+    weeks = int (sys.argv[1]) if len (sys.argv) > 1 else 8
+
+    curr_dir = os.path.dirname (os.path.realpath (__file__))
+    test_dir = '{0}/tests/test_data'.format (os.path.dirname (curr_dir))
+    raw_files = glob ('{0}/*_times/Blue/*.json'.format (test_dir))
+
+    data_path = tempfile.mkdtemp ()
+    try:
+        make_archive (data_path, raw_files, weeks)
+
+        tc = train.TrainCollection ()
+        tc.load_base_train (lines.blue, direction_id="0")
+        tc.set_data_path (data_path)
+        tc.load_times ()
+    finally:
+        shutil.rmtree (data_path)
+
+    tc.load_trains ()
+    num_trains = len (tc.trains)
+    print ("Memory of {0} weeks of {1} trains: {2} trains of {3} stops".format (
+        weeks, tc.name, num_trains, len (tc.base_train.stops)))
+
+    own, slotted, with_dicts, epochs, datetimes = [
+        sum (sizes) / float (num_trains)
+        for sizes in zip (*(train_sizes (t) for t in tc.trains))]
+    print ("stops and tracks with dictionaries: {0:7.0f} bytes per train".format (with_dicts))
+    print ("stops and tracks with slots       : {0:7.0f} bytes per train ({1:.1f}x smaller)".format (
+        slotted, with_dicts / slotted))
+    print ("loaded times as datetimes         : {0:7.0f} bytes per train".format (datetimes))
+    print ("loaded times as epoch ints        : {0:7.0f} bytes per train".format (epochs))
+    print ("train and its lists               : {0:7.0f} bytes per train".format (own))
+    print ("total before: {0:7.0f} bytes per train, after: {1:7.0f} bytes per train".format (
+        own + with_dicts + datetimes, own + slotted + epochs))
+
+    matrix = tc.compact_trains ()
+    print ("compacted to a train matrix       : {0:7.0f} bytes per train".format (
+        sum (a.nbytes for a in matrix.__dict__.itervalues ()) / float (num_trains)))
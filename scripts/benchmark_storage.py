@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from glob import glob
+
+from mbta_performance import storage, train
+from mbta_performance.utils import lines
+
+if __name__ == '__main__':
+    curr_dir = os.path.dirname (os.path.realpath (__file__))
+    test_dir = '{0}/tests/test_data'.format (os.path.dirname (curr_dir))
+    raw_files = glob ('{0}/*_times/Blue/*.json'.format (test_dir))
+    raw_size = sum (os.path.getsize (f) for f in raw_files)
+    repeats = 5
+
+    print ("Loading {0} raw files ({1:.1f} MB of JSON), best of {2}".format (
+        len (raw_files), raw_size / 1e6, repeats))
+
+    for compress in (None, 'gzip', 'bz2'):
+        data_path = tempfile.mkdtemp ()
+        try:
+            os.makedirs ('{0}/Blue'.format (data_path))
+            for f in raw_files:
+                with open (f) as f_json:
+                    storage.write_raw ([f_json.read ()], '{0}/Blue/{1}'.format (
+                        data_path, os.path.basename (f)), compress=compress)
+            disk_size = sum (os.path.getsize (f) for f in
+                             glob ('{0}/Blue/*'.format (data_path)))
+
+            tc = train.TrainCollection ()
+            tc.load_base_train (lines.blue, direction_id="0")
+            tc.set_data_path (data_path)
+
+            elapsed = []
+            for i in range (repeats):
+                t0 = time.time ()
+                tc.load_times ()
+                elapsed.append (time.time () - t0)
+        finally:
+            shutil.rmtree (data_path)
+
+        # load_times reads the files of a single direction: half the archive
+        print ("{0:6s}   on disk: {1:6.2f} MB ({2:5.1%})   load_times: {3:6.3f} s   read throughput: {4:6.1f} MB/s".format (
+            compress or 'plain', disk_size / 1e6, float (disk_size) / raw_size,
+            min (elapsed), raw_size / 2e6 / min (elapsed)))
+
+    # Binary store of a single direction, memory-mapped by open_times
+    data_path = tempfile.mkdtemp ()
+    try:
+        os.makedirs ('{0}/Blue'.format (data_path))
+        for f in raw_files:
+            shutil.copy (f, '{0}/Blue'.format (data_path))
+
+        tc = train.TrainCollection ()
+        tc.load_base_train (lines.blue, direction_id="0")
+        tc.set_data_path (data_path)
+        tc.compact_times ()
+        disk_size = sum (os.path.getsize (f) for f in
+                         glob ('{0}/Blue/events_Blue_0/*'.format (data_path)))
+
+        elapsed = []
+        for i in range (repeats):
+            t0 = time.time ()
+            tc.open_times ()
+            elapsed.append (time.time () - t0)
+    finally:
+        shutil.rmtree (data_path)
+
+    print ("{0:6s}   on disk: {1:6.2f} MB ({2:5.1%})   open_times: {3:6.3f} s".format (
+        'store', disk_size / 1e6, 2. * disk_size / raw_size, min (elapsed)))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mbta_performance import batch
+
+if __name__ == '__main__':
+    curr_dir = os.path.dirname (os.path.realpath (__file__))
+
+    parser = argparse.ArgumentParser (
+        description="Build the train collections of every line and direction "
+                    "(e.g. nightly, from cron). Exits with status 1 if any failed.")
+    parser.add_argument ('--data-path', default='{0}/data/times'.format (os.path.dirname (curr_dir)),
+                         help="directory of the downloaded times")
+    parser.add_argument ('--out-dir', default='{0}/data/ana'.format (os.path.dirname (curr_dir)),
+                         help="directory to write the collections to")
+    parser.add_argument ('--lines', nargs='+', default=None,
+                         help="names of the lines to build (default: all)")
+    parser.add_argument ('--num-workers', type=int, default=4,
+                         help="number of collections built at once")
+    parser.add_argument ('--num-trains', type=int, default=None,
+                         help="number of trains to load per collection")
+    args = parser.parse_args ()
+
+    jobs = batch.build_jobs (args.lines)
+    progress = {'done': 0}
+
+    def report (result):
+        progress['done'] += 1
+        print ('[{0}/{1}] {2}'.format (progress['done'], len (jobs), result))
+        sys.stdout.flush ()
+
+    results = batch.build_all (args.data_path, args.out_dir,
+                               line_names=args.lines,
+                               num_workers=args.num_workers,
+                               num_trains=args.num_trains, callback=report)
+
+    failed = [r for r in results if not r.ok]
+    print ('{0} of {1} collections built, {2} failed'.format (
+        len (results) - len (failed), len (results), len (failed)))
+    sys.exit (1 if failed else 0)
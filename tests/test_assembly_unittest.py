@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import pickle
+import tempfile
+import unittest
+import numpy as np
+
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mbta_performance import train
+from mbta_performance.assembly import link_events, missing, merge_decision, \
+    merge_horizon, earliest_arrivals, OpenTrains
+from test_storage_unittest import copy_test_data
+
+
+class TestAssembly (unittest.TestCase):
+
+    @classmethod
+    def setUpClass (cls):
+        cls.data_path = tempfile.mkdtemp ()
+        copy_test_data (cls.data_path)
+
+    @classmethod
+    def tearDownClass (cls):
+        shutil.rmtree (cls.data_path)
+
+    def testLinkEvents (self):
+        times = np.array ([100, 101, 200, 300])
+        targets = np.array ([95, 105, 108, 205, 400])
+        # 100 and 101 both reach 95 first: 101 moves on to 105
+        self.assertEqual (link_events (times, targets).tolist (), [0, 1, 3, -1])
+        self.assertEqual (link_events (times, targets[:0]).tolist (), [-1] * 4)
+
+    def testVectorizedEngine (self):
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="1")
+        tc.set_data_path (self.data_path)
+        tc.load_times ()
+        self.assertRaises (ValueError, tc.load_trains, engine='parallel')
+
+        for (merge, num_trains) in ((False, None), (True, None), (True, 100)):
+            tc.load_trains (num_trains=num_trains, merge=merge)
+            self.assertTrue (tc.train_matrix is None)
+            totals = [t.total_travel_time for t in tc.trains]
+            starts = [t.start.departure_time for t in tc.trains]
+
+            tc.load_trains (num_trains=num_trains, merge=merge, engine='vectorized')
+            matrix = tc.train_matrix
+            self.assertEqual (matrix.arrival.shape,
+                              (len (totals), len (tc.base_train.stops)))
+            self.assertEqual ([t.total_travel_time for t in tc.trains], totals)
+            self.assertEqual ([t.start.departure_time for t in tc.trains], starts)
+
+        whole = (matrix.start_piece == 0) & \
+            (matrix.end_piece == 2 * (len (tc.base_train.stops) - 1))
+        self.assertEqual (matrix.total_travel_time[whole].tolist (),
+                          [t[0] for (t, w) in zip (totals, whole) if w])
+        self.assertTrue (np.all (matrix.departure[:, 0][matrix.start_piece == 0] != missing))
+
+        # Branches as on the Green line: both engines skip the same trains,
+        # e.g. those starting at the second stop and ending on a track
+        branch_stops = train.branch_stops
+        try:
+            train.branch_stops = {'Blue': ('Maverick', 'State Street')}
+            tc.load_trains (merge=False)
+            totals = [t.total_travel_time for t in tc.trains]
+            self.assertFalse (any (
+                p.stop_name.startswith (('Maverick', 'State Street'))
+                for t in tc.trains for p in (t.start, t.end)
+                if isinstance (p, train.TrainStop)))
+            tc.load_trains (merge=False, engine='vectorized')
+            self.assertEqual ([t.total_travel_time for t in tc.trains], totals)
+        finally:
+            train.branch_stops = branch_stops
+
+    def testServiceDays (self):
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+        tc.load_times ()
+        self.assertRaises (ValueError, tc.load_trains, num_workers=0)
+        self.assertRaises (ValueError, tc.load_trains, engine='vectorized',
+                           num_workers=2)
+
+        days = tc._service_days ()
+        self.assertEqual (len (days), 7)
+        self.assertTrue (all (end - start == 24 * 3600 for (start, end) in days))
+
+        service_day_hour = train.service_day_hour
+        try:
+            # Service days starting at noon: trains cross from one to the next
+            for hour in (service_day_hour, 12):
+                train.service_day_hour = hour
+                for (merge, num_trains) in ((False, None), (True, 100)):
+                    tc.load_trains (num_trains=num_trains, merge=merge)
+                    trains = [str (list (t)) for t in tc.trains]
+                    tc.load_trains (num_trains=num_trains, merge=merge,
+                                    num_workers=2)
+                    self.assertEqual ([str (list (t)) for t in tc.trains], trains)
+        finally:
+            train.service_day_hour = service_day_hour
+
+    def testIterTrains (self):
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+        tc.load_times ()
+        self.assertRaises (TypeError, tc.iter_trains, num_trains='100')
+
+        for (merge, num_trains) in ((True, None), (True, 100), (False, 100)):
+            tc.load_trains (num_trains=num_trains, merge=merge)
+            trains = [str (list (t)) for t in tc.trains]
+            self.assertEqual ([str (list (t)) for t in
+                               tc.iter_trains (num_trains=num_trains, merge=merge)],
+                              trains)
+            self.assertEqual ([str (list (t)) for t in tc.trains], trains)
+
+        # Train starts found through a heap of the stops: the same trains
+        try:
+            train.use_departure_heap = True
+            tc.load_trains (num_trains=num_trains, merge=merge)
+            self.assertEqual ([str (list (t)) for t in tc.trains], trains)
+        finally:
+            train.use_departure_heap = False
+
+        # Each departure bounds the arrivals of the dwell times from then on
+        deps, earliest = earliest_arrivals (tc._dwell_times)
+        events = sorted ((dep, arr) for table in tc._dwell_times.itervalues ()
+                         for (arr, dep) in zip (table['arr_dt'], table['dep_dt']))
+        self.assertEqual (deps, [dep for (dep, arr) in events])
+        for i in xrange (0, len (events), 97):
+            self.assertEqual (earliest[i], min (arr for (dep, arr) in events[i:]))
+
+    def testAppendTimes (self):
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+        tc.load_times ()
+        self.assertRaises (LookupError, tc.append_times)
+        tc.load_trains ()
+        trains = [str (list (t)) for t in tc.trains]
+        median = tc.median_train.total_travel_time
+
+        # Times loaded up to noon, then day by day: trains running at noon go
+        # on into the appended times
+        tc.load_times (end_time=datetime (2016, 7, 10, 12))
+        tc.load_trains ()
+        self.assertNotEqual (tc.median_train.total_travel_time, median)
+        for day in (11, 12, 13, 14, 15):
+            num_trains = len (tc.trains)
+            self.assertEqual (tc.append_times (end_time=datetime (2016, 7, day, 12)),
+                              len (tc.trains) - num_trains)
+        self.assertEqual ([str (list (t)) for t in tc.trains], trains)
+        self.assertEqual (tc.median_train.total_travel_time, median)
+        self.assertEqual (tc.append_times (), 0)
+
+        # Compacted trains are continued as trains of their own
+        tc.load_times ()
+        tc.load_trains (merge=False)
+        trains = [str (list (t)) for t in tc.trains]
+        tc.load_times (end_time=datetime (2016, 7, 10, 12))
+        tc.load_trains (merge=False)
+        tc.compact_trains ()
+        rows = tc.trains
+        cut = [str (list (t)) for t in rows]
+        tc.append_times (merge=False)
+        self.assertTrue (tc.train_matrix is None)
+        self.assertFalse (any (isinstance (t, train.TrainRow) for t in tc.trains))
+        self.assertEqual ([str (list (t)) for t in tc.trains], trains)
+        # and the rows are left as they were
+        self.assertEqual ([str (list (t)) for t in rows], cut)
+        tc.compact_trains ()
+        self.assertEqual ([str (list (t)) for t in tc.trains], trains)
+
+    def testCompactTrains (self):
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+        tc.load_times ()
+        self.assertRaises (LookupError, tc.compact_trains)
+        tc.load_trains (merge=False)
+        trains = [str (list (t)) for t in tc.trains]
+        totals = [t.total_travel_time for t in tc.trains]
+        # Medians may be NaN: compared as strings
+        median = str (tc.median_train.total_travel_time)
+        dwell_times = str ([s.dwell_time for s in tc.median_train.stops])
+
+        matrix = tc.compact_trains ()
+        self.assertTrue (tc.train_matrix is matrix)
+        self.assertTrue (tc.compact_trains () is matrix)
+        self.assertEqual (matrix.arrival.shape, (len (trains), len (tc.base_train.stops)))
+        self.assertTrue (isinstance (tc.trains[0], train.TrainRow))
+        # Totals are read from the rows, before the stops are built
+        self.assertEqual ([t.total_travel_time for t in tc.trains], totals)
+        self.assertFalse ('_stops' in tc.trains[0].__dict__)
+        self.assertEqual ([str (list (t)) for t in tc.trains], trains)
+        self.assertEqual (str (tc.median_train.total_travel_time), median)
+        self.assertEqual (str ([s.dwell_time for s in tc.median_train.stops]), dwell_times)
+
+        # Missing times are masked
+        dwell = matrix.masked ('dwell_time')
+        self.assertEqual (dwell.count (), np.sum (matrix.dwell_time != missing))
+        self.assertEqual (dwell[0].compressed ().tolist (),
+                          [s.dwell_time for s in tc.trains[0].stops
+                           if s.dwell_time is not None])
+
+        sub = tc[10:20]
+        self.assertEqual (len (sub.train_matrix), 10)
+        self.assertEqual ([str (list (t)) for t in sub.trains], trains[10:20])
+        self.assertEqual (len (tc[3].trains), 1)
+        loaded = pickle.loads (pickle.dumps (tc, 2))
+        self.assertTrue (loaded._trains is None)
+        self.assertEqual ([str (list (t)) for t in loaded.trains], trains)
+
+    def testOpenTrains (self):
+        self.assertTrue (merge_decision (1, 100))
+        self.assertTrue (merge_decision (2, 70, is_green=True))
+        self.assertTrue (merge_decision (2, 70) is None)
+        self.assertFalse (merge_decision (4, 4001))
+
+        # Same decisions as searching all trains from the latest added, with
+        # segments mostly (not always, and now and then far from) in order of
+        # arrival
+        rng = np.random.RandomState (1)
+        for is_green in (False, True):
+            open_trains = OpenTrains (is_green=is_green)
+            ends = []
+            arrival = 0
+            for i in xrange (3000):
+                arrival += int (rng.randint (-300, 400))
+                if i % 500 == 499:
+                    arrival -= 5000
+                station_num = int (rng.randint (0, 12))
+                end = (int (rng.randint (station_num, 12)),
+                       arrival + int (rng.randint (0, 1200)))
+
+                expected = None
+                for n in xrange (len (ends) - 1, -1, -1):
+                    diff = station_num - ends[n][0]
+                    if station_num == 0 or diff <= 0 or diff > merge_horizon:
+                        continue
+                    decision = merge_decision (diff, arrival - ends[n][1], is_green)
+                    if decision is not None:
+                        expected = n if decision else None
+                        break
+
+                n = open_trains.find (station_num, arrival)
+                self.assertEqual (n, expected)
+                if n is None:
+                    self.assertEqual (open_trains.add (*end), len (ends))
+                    ends.append (end)
+                else:
+                    open_trains.move (n, *end)
+                    ends[n] = end
+            self.assertEqual (len (open_trains), len (ends))
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mbta_performance import batch, cache
+from test_storage_unittest import copy_test_data
+
+
+class TestBatch (unittest.TestCase):
+
+    def setUp (self):
+        self.data_path = tempfile.mkdtemp ()
+        copy_test_data (self.data_path)
+
+    def tearDown (self):
+        shutil.rmtree (self.data_path)
+
+    def testBuildJobs (self):
+        self.assertEqual (len (batch.build_jobs ()), 2 * len (list (batch.lines)))
+        self.assertEqual (batch.build_jobs (['Blue'], ("1",)), [('Blue', "1")])
+        self.assertRaises (ValueError, batch.build_jobs, ['Purple'])
+
+    def testBuildAll (self):
+        out_dir = '{0}/ana'.format (self.data_path)
+        reported = []
+        # Only the Blue line has times: the Orange line jobs fail alone
+        results = batch.build_all (self.data_path, out_dir, ['Orange', 'Blue'],
+                                   num_workers=2, num_trains=100,
+                                   callback=reported.append)
+        self.assertEqual (reported, results)
+        self.assertEqual (sorted ((r.line, r.direction_id, r.ok) for r in results),
+                          [('Blue', "0", True), ('Blue', "1", True),
+                           ('Orange', "0", False), ('Orange', "1", False)])
+
+        for result in results:
+            if result.ok:
+                tc = cache.load (result.out_file)
+                self.assertEqual (len (tc.trains), result.num_trains)
+                self.assertEqual (tc.base_train.direction_id, result.direction_id)
+            else:
+                self.assertTrue ('IOError' in result.error)
+                self.assertTrue (result.out_file is None)
+        self.assertEqual (len (os.listdir (out_dir)), 2)
+        self.assertRaises (ValueError, batch.build_all, self.data_path, out_dir,
+                           num_workers=0)
+
+    def testKilledWorker (self):
+        out_dir = '{0}/ana'.format (self.data_path)
+        build_collection = batch.build_collection
+
+        def build_or_exit (line_name, *args):
+            # The process dies without returning, as if killed by the OS
+            if line_name == 'Orange':
+                os._exit (9)
+            return build_collection (line_name, *args)
+
+        batch.build_collection = build_or_exit
+        try:
+            results = batch.build_all (self.data_path, out_dir, ['Orange', 'Blue'],
+                                       num_workers=2, num_trains=100)
+        finally:
+            batch.build_collection = build_collection
+        self.assertEqual (sorted ((r.line, r.direction_id, r.ok) for r in results),
+                          [('Blue', "0", True), ('Blue', "1", True),
+                           ('Orange', "0", False), ('Orange', "1", False)])
+        for result in results:
+            if not result.ok:
+                self.assertTrue ('exited with code 9' in result.error)
+                self.assertTrue (result.out_file is None)
+        self.assertEqual (len (os.listdir (out_dir)), 2)
+
+if __name__ == '__main__':
+    unittest.main ()
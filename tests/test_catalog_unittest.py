@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime, timedelta
+from mbta_performance import storage, train
+from mbta_performance.utils import get_epoch_time, localize_eastern_dt
+from mbta_performance.catalog import RawCatalog
+from test_storage_unittest import copy_test_data
+
+
+class TestCatalog (unittest.TestCase):
+
+    def setUp (self):
+        self.data_path = tempfile.mkdtemp ()
+        self.line_dir = '{0}/Blue'.format (self.data_path)
+
+    def tearDown (self):
+        shutil.rmtree (self.data_path)
+
+    def testParseRawFilename (self):
+        self.assertEqual (
+            storage.parse_raw_filename (
+                '/a/traveltimes_Blue_0_70039_70038_1467864000_1468468800.json.gz'),
+            ('traveltimes', 'Blue', '0', '70039_70038', 1467864000, 1468468800))
+        self.assertEqual (
+            storage.parse_raw_filename ('dwelltimes_Blue_1_70038_1_2.json'),
+            ('dwelltimes', 'Blue', '1', '70038', 1, 2))
+        self.assertTrue (storage.parse_raw_filename ('catalog_Blue.json') is None)
+
+    def testIncrementalUpdate (self):
+        copy_test_data (self.data_path)
+        n_files = len (os.listdir (self.line_dir))
+
+        catalog = RawCatalog (self.line_dir, 'Blue')
+        self.assertTrue (catalog.update ())
+        self.assertEqual (catalog.num_parsed, n_files)
+        self.assertEqual (catalog.keys ('dwelltimes', '0')[0], '70038')
+        files = catalog.files ('traveltimes', '0', '70039_70038')
+        self.assertEqual (len (files), 1)
+        self.assertTrue (os.path.exists (files[0][2]))
+
+        # A fresh catalog reads the saved index, without parsing the file names
+        catalog = RawCatalog (self.line_dir, 'Blue')
+        self.assertFalse (catalog.update ())
+        self.assertEqual (catalog.num_parsed, 0)
+        self.assertEqual (catalog.files ('traveltimes', '0', '70039_70038'), files)
+
+        # Only new files are parsed
+        time.sleep (0.01)
+        new_file = '{0}/dwelltimes_Blue_0_70038_1_2.json'.format (self.line_dir)
+        with open (new_file, 'w') as f:
+            f.write ('{"dwell_times": []}')
+        self.assertTrue (catalog.update ())
+        self.assertEqual (catalog.num_parsed, 1)
+        self.assertEqual (catalog.files ('dwelltimes', '0', '70038')[0],
+                          (1, 2, new_file))
+
+        time.sleep (0.01)
+        os.remove (new_file)
+        self.assertTrue (catalog.update ())
+        self.assertEqual (catalog.num_parsed, 0)
+        self.assertEqual (len (catalog.files ('dwelltimes', '0', '70038')), 1)
+
+    def testSameTimeUpdate (self):
+        copy_test_data (self.data_path)
+        catalog = RawCatalog (self.line_dir, 'Blue')
+        catalog.update ()
+
+        # A file added without changing the directory time (as on file
+        # systems with coarse times)
+        mtime = os.stat (self.line_dir).st_mtime
+        new_file = '{0}/dwelltimes_Blue_0_70038_1_2.json'.format (self.line_dir)
+        with open (new_file, 'w') as f:
+            f.write ('{"dwell_times": []}')
+        os.utime (self.line_dir, (mtime, mtime))
+        self.assertTrue (catalog.update ())
+        self.assertEqual (catalog.num_parsed, 1)
+
+        # A directory last changed well before the listing is not listed again
+        old = time.time () - 3600
+        os.utime (self.line_dir, (old, old))
+        self.assertFalse (catalog.update ())
+        listdir = os.listdir
+        try:
+            os.listdir = None
+            self.assertFalse (catalog.update ())
+            self.assertFalse (RawCatalog (self.line_dir, 'Blue').update ())
+        finally:
+            os.listdir = listdir
+
+    def testLoadTimes (self):
+        copy_test_data (self.data_path)
+
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+        tc.load_times ()
+        self.assertEqual (len (tc._travel_times), len (tc.base_train.tracks))
+        self.assertEqual (len (tc._dwell_times), len (tc.base_train.stops))
+        self.assertTrue (('70039', '70038') in tc._travel_times)
+
+        tc.set_data_path (tempfile.gettempdir () + '/no_such_mbta_data')
+        self.assertRaises (IOError, tc.load_times)
+
+    def testLoadTimeWindow (self):
+        copy_test_data (self.data_path)
+
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+        tc.load_times ()
+        n_all = len (tc._dwell_times['70038'])
+
+        start_time = datetime (year=2016, month=7, day=8, hour=4)
+        end_time = start_time + timedelta (days=1)
+        start = int (get_epoch_time (localize_eastern_dt (start_time)))
+        tc.load_times (start_time, end_time)
+        dwell_times = tc._dwell_times['70038']
+        self.assertTrue (0 < len (dwell_times) < n_all)
+        for dt in dwell_times:
+            self.assertTrue (start <= int (dt['dep_dt']) < start + 24 * 3600)
+        tc.load_trains ()
+        self.assertTrue (len (tc.trains) > 0)
+
+        # Only the files overlapping the window are opened
+        tc.load_times (end_time=datetime (year=2016, month=7, day=1))
+        self.assertEqual (tc._dwell_times, {})
+        self.assertRaises (ValueError, tc.load_times, end_time, start_time)
+        self.assertRaises (TypeError, tc.load_times, start)
+
+    def testLoadParallel (self):
+        copy_test_data (self.data_path)
+
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="1")
+        tc.set_data_path (self.data_path)
+        tc.load_times ()
+        travel_times, dwell_times = tc._travel_times, tc._dwell_times
+
+        tc.load_times (num_workers=2)
+        self.assertEqual (tc._travel_times, travel_times)
+        self.assertEqual (tc._dwell_times, dwell_times)
+        self.assertRaises (ValueError, tc.load_times, num_workers=0)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import urllib
+import urllib2
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mbta_performance import client
+from mbta_performance.stand_in import StandInServer
+
+
+class TestClient (unittest.TestCase):
+
+    def setUp (self):
+        self.server = StandInServer (interval=60).start ()
+
+    def tearDown (self):
+        self.server.stop ()
+
+    def testKeepAlive (self):
+        session = client.Session (timeout=5.)
+        url = self.server.traveltime_url + 'from_datetime=0&to_datetime=3600'
+        for i in range (10):
+            tt_json = json.loads (session.get (url).read ())
+            self.assertEqual (len (tt_json['travel_times']), 59)
+
+        self.assertEqual (session.request_count, 10)
+        self.assertEqual (session.connection_count, 1)
+        self.assertAlmostEqual (session.reuse_rate, 0.9)
+
+        # gzip encoded on the wire, decoded transparently
+        self.assertTrue (session.bytes_on_wire < session.bytes_decoded)
+        session.close ()
+
+    def testNoGzip (self):
+        session = client.Session (gzip=False)
+        url = self.server.dwelltime_url + 'from_datetime=0&to_datetime=3600'
+        session.get (url)
+        self.assertEqual (session.bytes_on_wire, session.bytes_decoded)
+
+        self.assertRaises (urllib2.HTTPError, session.get,
+                           self.server.root_url + 'unknown')
+        session.close ()
+
+    def testRedirect (self):
+        session = client.Session (max_redirects=3)
+        url = self.server.traveltime_url + 'from_datetime=0&to_datetime=3600'
+        # Absolute and relative locations
+        for to in (url, url[len (self.server.root_url):]):
+            response = session.get (self.server.root_url + 'redirect?' +
+                                    urllib.urlencode ({'to': to}))
+            self.assertEqual (response.url, url)
+            self.assertEqual (len (json.loads (response.read ())['travel_times']), 59)
+        self.assertEqual (session.request_count, 4)
+        self.assertEqual (session.connection_count, 1)
+
+        # A redirect loop is given up on
+        try:
+            session.get (self.server.root_url + 'redirect')
+            self.fail ("Redirect loop followed")
+        except urllib2.HTTPError as e:
+            self.assertEqual (e.code, 302)
+        self.assertEqual (session.request_count, 8)
+        session.close ()
+
+    def testSharedSession (self):
+        session = client._session
+        session_class = client.Session
+        sessions = []
+
+        def slow_session ():
+            # Sessions take a while to create: threads asking at once race
+            time.sleep (0.05)
+            return session_class ()
+
+        try:
+            client._session = None
+            client.Session = slow_session
+            threads = [threading.Thread (target=lambda: sessions.append (client.get_session ()))
+                       for i in range (8)]
+            for t in threads:
+                t.start ()
+            for t in threads:
+                t.join ()
+            self.assertEqual (len (sessions), 8)
+            self.assertTrue (all (s is sessions[0] for s in sessions))
+        finally:
+            client.Session = session_class
+            client.set_session (session)
+
+if __name__ == '__main__':
+    unittest.main ()
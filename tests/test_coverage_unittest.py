@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from glob import glob
+from datetime import datetime, timedelta
+from mbta_performance import coverage, line, localtime, train
+from mbta_performance.stand_in import StandInServer
+
+
+class TestCoverage (unittest.TestCase):
+
+    def setUp (self):
+        self.data_path = tempfile.mkdtemp ()
+
+    def tearDown (self):
+        shutil.rmtree (self.data_path)
+
+    def testIntervals (self):
+        self.assertEqual (coverage.merge_intervals ([(5, 8), (0, 2), (2, 4), (7, 9)]),
+                          [(0, 4), (5, 9)])
+        self.assertEqual (coverage.subtract_intervals ([(0, 10)], [(2, 4), (6, 7)]),
+                          [(0, 2), (4, 6), (7, 10)])
+        self.assertEqual (coverage.subtract_intervals ([(0, 10)], [(0, 10)]), [])
+        self.assertEqual (coverage.subtract_intervals ([(3, 5)], [(0, 4), (8, 9)]),
+                          [(4, 5)])
+
+        self.assertEqual (coverage.plan_windows (0, 25, window=10),
+                          [(0, 10), (10, 20), (20, 25)])
+        self.assertEqual (coverage.plan_windows (0, 25, [(5, 22)], window=10,
+                                                 min_gap=0),
+                          [(0, 5), (22, 25)])
+        self.assertEqual (coverage.plan_windows (0, 25, [(5, 22)], window=10,
+                                                 min_gap=4),
+                          [(0, 5)])
+
+    def testManifest (self):
+        filename = '{0}/coverage.json'.format (self.data_path)
+        manifest = coverage.CoverageManifest (filename)
+        manifest.add ('dwelltimes', '70038', 0, 10)
+        manifest.add ('dwelltimes', '70038', 10, 20)
+        manifest.save ()
+
+        manifest = coverage.CoverageManifest (filename)
+        self.assertEqual (manifest.covered ('dwelltimes', '70038'), [(0, 20)])
+        self.assertEqual (manifest.covered ('traveltimes', '70038_70040'), [])
+
+    def testIncrementalGetTimes (self):
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+        n_keys = len (tc.base_train.tracks) + len (tc.base_train.stops)
+
+        start_time = datetime (year=2016, month=7, day=7)
+        end_time = start_time + timedelta (days=20)
+        urls = (line.mbta_traveltime_url, line.mbta_dwelltime_url)
+        with StandInServer () as server:
+            line.mbta_traveltime_url = server.traveltime_url
+            line.mbta_dwelltime_url = server.dwelltime_url
+            try:
+                tc.get_times (start_time, end_time, num_workers=4)
+                self.assertEqual (server.request_count, 3 * n_keys)
+
+                # one file per window
+                files = glob ('{0}/Blue/dwelltimes_*.json'.format (self.data_path))
+                self.assertEqual (len (files), 3 * len (tc.base_train.stops))
+
+                tc.get_times (start_time, end_time)
+                self.assertEqual (server.request_count, 3 * n_keys)
+
+                tc.get_times (start_time + timedelta (days=1),
+                              end_time + timedelta (days=1))
+                self.assertEqual (server.request_count, 4 * n_keys)
+
+                tc.get_times (start_time, end_time, incremental=False)
+                self.assertEqual (server.request_count, 7 * n_keys)
+            finally:
+                line.mbta_traveltime_url, line.mbta_dwelltime_url = urls
+
+    def testRecentWindow (self):
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+        n_keys = len (tc.base_train.tracks) + len (tc.base_train.stops)
+
+        # A window ending an hour ago, whose last events may not be published
+        # yet
+        now = int (time.time ())
+        end = now - now % 600 - 3600
+        end_time = localtime.eastern_time (end).replace (tzinfo=None)
+        start_time = end_time - timedelta (days=2)
+        urls = (line.mbta_traveltime_url, line.mbta_dwelltime_url)
+        with StandInServer (interval=600) as server:
+            line.mbta_traveltime_url = server.traveltime_url
+            line.mbta_dwelltime_url = server.dwelltime_url
+            try:
+                tc.get_times (start_time, end_time)
+                self.assertEqual (server.request_count, n_keys)
+                manifest = coverage.CoverageManifest.for_line (self.data_path,
+                                                               tc.base_train)
+                covered = manifest.covered ('dwelltimes', tc.base_train.stops[0].stop_id)
+                self.assertTrue (covered[0][1] <= now - coverage.publication_lag)
+
+                # The last part is queried again, and its events replace the
+                # ones of the first query
+                tc.get_times (start_time, end_time)
+                self.assertEqual (server.request_count, 2 * n_keys)
+                tc.load_times ()
+                for table in tc._dwell_times.itervalues ():
+                    self.assertEqual (table['dep_dt'].tolist (),
+                                      range (end - 2 * 24 * 3600 + 600, end, 600))
+
+                # Without a lag, the window is covered up to its end
+                tc.get_times (start_time, end_time, lag=0)
+                self.assertEqual (server.request_count, 3 * n_keys)
+                tc.get_times (start_time, end_time, lag=0)
+                self.assertEqual (server.request_count, 3 * n_keys)
+            finally:
+                line.mbta_traveltime_url, line.mbta_dwelltime_url = urls
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from glob import glob
+from datetime import datetime, timedelta
+from mbta_performance import download, line, train
+from mbta_performance.stand_in import StandInServer
+
+
+class TestDownload (unittest.TestCase):
+
+    def setUp (self):
+        self.server = StandInServer (delay=0.01).start ()
+        self.data_path = tempfile.mkdtemp ()
+        self.urls = (line.mbta_traveltime_url, line.mbta_dwelltime_url)
+        line.mbta_traveltime_url = self.server.traveltime_url
+        line.mbta_dwelltime_url = self.server.dwelltime_url
+
+    def tearDown (self):
+        line.mbta_traveltime_url, line.mbta_dwelltime_url = self.urls
+        self.server.stop ()
+        shutil.rmtree (self.data_path)
+
+    def testRequestGrid (self):
+        l = line.Line ()
+        l.load (line.lines.blue, direction_id="0")
+
+        start_time = datetime (year=2016, month=7, day=7)
+        requests = l.traveltime_requests (self.data_path, start_time,
+                                          start_time + timedelta (days=20))
+        self.assertEqual (len (requests), 3 * len (l.tracks))
+        requests = l.dwelltime_requests (self.data_path, start_time,
+                                         start_time + timedelta (days=20))
+        self.assertEqual (len (requests), 3 * len (l.stops))
+        self.assertEqual (l.dwelltime_requests (self.data_path, start_time,
+                                                start_time), [])
+
+        self.assertRaises (ValueError, download.fetch_all, requests,
+                           num_workers=0)
+
+    def testConcurrentGetTimes (self):
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+
+        start_time = datetime (year=2016, month=7, day=7)
+        tc.get_times (start_time, start_time + timedelta (days=1),
+                      num_workers=8)
+
+        n_queries = len (tc.base_train.tracks) + len (tc.base_train.stops)
+        self.assertEqual (self.server.request_count, n_queries)
+        files = glob ('{0}/Blue/*times_*.json'.format (self.data_path))
+        self.assertEqual (len (files), n_queries)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import random
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mbta_performance.events import EventTable, EventQueue, DepartureHeap
+
+
+class TestEvents (unittest.TestCase):
+
+    def setUp (self):
+        curr_dir = os.path.dirname (os.path.realpath (__file__))
+        with open ('{0}/test_data/dwell_times/Blue/dwelltimes_Blue_0_70038_1467878400_1468483199.json'.format (curr_dir)) as f:
+            self.events = json.load (f)['dwell_times']
+
+    def testTable (self):
+        table = EventTable.from_events ('dwelltimes', self.events)
+        self.assertEqual (len (table), len (self.events))
+        self.assertEqual (table['dep_dt'].dtype, np.int64)
+        self.assertEqual (table['dwell_time_sec'].dtype, np.int32)
+        self.assertEqual (table[0]['dep_dt'], int (self.events[0]['dep_dt']))
+        self.assertEqual (table.nbytes, 20 * len (self.events))
+
+        start = table['dep_dt'][100]
+        end = table['dep_dt'][200]
+        selected = table.select (start, end)
+        self.assertEqual (len (selected), 100)
+        self.assertTrue (selected.select (start, end) is selected)
+
+        joined = EventTable.concatenate ('dwelltimes', [selected, table])
+        self.assertTrue (np.all (np.diff (joined['dep_dt']) >= 0))
+        self.assertEqual (len (joined), len (table) + 100)
+        self.assertEqual (EventTable.concatenate ('dwelltimes', [table]), table)
+        self.assertNotEqual (joined, table)
+        self.assertRaises (ValueError, EventTable, 'times')
+
+    def testQueue (self):
+        table = EventTable.from_events ('dwelltimes', self.events[:3])
+        arr = table['arr_dt'].tolist ()
+        queue = EventQueue (table)
+
+        self.assertEqual (queue.find ('arr_dt', arr[1] + 5), 1)
+        self.assertTrue (queue.find ('arr_dt', arr[1] + 10) is None)
+        queue.take (1)
+        self.assertEqual (queue.popleft (), 0)
+        self.assertEqual (queue.first_departure (), table['dep_dt'][2])
+        self.assertEqual (queue.popleft (), 2)
+        self.assertFalse (queue)
+        self.assertTrue (queue.first_departure () is None)
+        self.assertRaises (IndexError, queue.popleft)
+        self.assertEqual (len (table), 3)
+
+        # Queues of a table share its time lists, but not what they consumed
+        other = EventQueue (table)
+        self.assertTrue (other._dep is queue._dep)
+        self.assertEqual (len (other), 3)
+        self.assertEqual (other.popleft (), 0)
+
+    def testDepartureHeap (self):
+        table = EventTable.from_events ('dwelltimes', self.events[:4])
+        dep = table['dep_dt'].tolist ()
+        queues = {}
+        for key in ('a', 'b', 'c'):
+            queues[key] = EventQueue (table)
+        queues['b'].popleft ()
+        order = [key for (key, queue) in queues.iteritems () if key != 'b']
+        heap = DepartureHeap (queues)
+
+        # Ties are broken in the order of the dictionary
+        self.assertEqual (heap.first (), order[0])
+        heap[order[0]].popleft ()
+        self.assertEqual (heap.first (), order[1])
+        heap[order[1]].popleft ()
+        heap[order[1]].popleft ()
+        self.assertEqual (heap.first (), order[0])
+        self.assertEqual (heap[heap.first ()].first_departure (), dep[1])
+
+        merged = []
+        while heap.first () is not None:
+            merged.append (heap[heap.first ()].first_departure ())
+            heap[heap.first ()].popleft ()
+        self.assertEqual (merged, sorted (merged))
+        self.assertEqual (len (merged), 8)
+
+    def testFindMatchesScan (self):
+        # Compare with checking the remaining events one by one, in order, on
+        # arrivals that are not ordered
+        rng = random.Random (0)
+        events = []
+        for i in range (300):
+            dep = 1467883847 + 30 * i
+            events.append ({'arr_dt': dep - rng.randint (0, 400), 'dep_dt': dep,
+                            'dwell_time_sec': 0})
+        table = EventTable.from_events ('dwelltimes', events)
+        queue = EventQueue (table)
+        remaining = range (len (events))
+
+        for step in range (2000):
+            column = rng.choice (('arr_dt', 'dep_dt'))
+            t = 1467883847 + rng.randint (-500, 30 * 300 + 500)
+            expected = None
+            for i in remaining:
+                if abs (events[i][column] - t) < 10:
+                    expected = i
+                    break
+                elif events[i][column] > t:
+                    break
+            self.assertEqual (queue.find (column, t), expected)
+            if expected is not None and rng.random () < 0.5:
+                queue.take (expected)
+                remaining.remove (expected)
+            if not remaining:
+                break
+        self.assertEqual (len (queue), len (remaining))
+
+if __name__ == '__main__':
+    unittest.main ()
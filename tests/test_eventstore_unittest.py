@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime, timedelta
+from mbta_performance import train
+from mbta_performance.eventstore import EventStore
+from test_storage_unittest import copy_test_data
+
+
+class TestEventStore (unittest.TestCase):
+
+    def setUp (self):
+        self.data_path = tempfile.mkdtemp ()
+        copy_test_data (self.data_path)
+
+        self.tc = train.TrainCollection ()
+        self.tc.load_base_train (train.lines.blue, direction_id="1")
+        self.tc.set_data_path (self.data_path)
+
+    def tearDown (self):
+        shutil.rmtree (self.data_path)
+
+    def testOpenTimes (self):
+        self.assertRaises (IOError, self.tc.open_times)
+
+        self.tc.compact_times ()
+        store = EventStore.for_line (self.data_path, self.tc.base_train)
+        self.assertTrue (store.exists ())
+        self.assertEqual (len (store.sources), 2 * len (self.tc.base_train.stops) - 1)
+
+        self.tc.load_times ()
+        travel_times, dwell_times = self.tc._travel_times, self.tc._dwell_times
+        self.tc.open_times ()
+        self.assertEqual (self.tc._travel_times, travel_times)
+        self.assertEqual (self.tc._dwell_times, dwell_times)
+        self.assertTrue (isinstance (self.tc._dwell_times['70038']['dep_dt'].base,
+                                     np.memmap))
+
+        self.tc.load_trains (num_trains=100)
+        totals = [t.total_travel_time for t in self.tc.trains]
+        self.tc.load_times ()
+        self.tc.load_trains (num_trains=100)
+        self.assertEqual ([t.total_travel_time for t in self.tc.trains], totals)
+
+        start_time = datetime (year=2016, month=7, day=8, hour=4)
+        end_time = start_time + timedelta (days=1)
+        self.tc.load_times (start_time, end_time)
+        dwell_times = self.tc._dwell_times
+        self.tc.open_times (start_time, end_time)
+        self.assertEqual (self.tc._dwell_times, dwell_times)
+
+    def testOutOfDate (self):
+        self.tc.compact_times ()
+
+        time.sleep (0.01)
+        os.remove ('{0}/Blue/dwelltimes_Blue_1_70038_1467878400_1468483199.json'.format (
+            self.data_path))
+        self.assertRaises (IOError, self.tc.open_times)
+
+        self.tc.compact_times ()
+        self.tc.open_times ()
+        self.assertFalse ('70038' in self.tc._dwell_times)
+
+if __name__ == '__main__':
+    unittest.main ()
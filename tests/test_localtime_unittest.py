@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import random
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import date, datetime, timedelta
+from mbta_performance import localtime
+from mbta_performance.localtime import eastern, utc
+
+
+class TestLocalTime (unittest.TestCase):
+
+    def setUp (self):
+        random.seed (0)
+        # Random times, and times either side of the daylight saving time
+        # changes of 2016
+        self.epochs = [random.randint (1262304000, 1893456000) for _ in xrange (2000)]
+        for change in (1457852400, 1478412000):
+            self.epochs.extend (range (change - 7200, change + 7200, 900))
+
+    def testEasternTime (self):
+        for epoch in self.epochs:
+            dt = utc.localize (datetime.utcfromtimestamp (epoch)).astimezone (eastern)
+            new_dt = localtime.eastern_time (epoch)
+            self.assertEqual (new_dt, dt)
+            self.assertEqual (str (new_dt), str (dt))
+            self.assertEqual (new_dt.tzname (), dt.tzname ())
+            self.assertEqual (localtime.eastern_epoch (new_dt), epoch)
+
+        self.assertEqual (localtime.eastern_time ('1467964800').hour, 4)
+        self.assertEqual (localtime.eastern_epoch (datetime (2016, 7, 8, 4)),
+                          1467964800)
+        self.assertEqual (localtime.eastern_epoch (datetime (2016, 12, 8, 4)),
+                          1481187600)
+
+    def testTransitionTable (self):
+        # Two changes a year since 1970, each found to the second
+        changes = [epoch for epoch in localtime._transitions
+                   if 0 <= epoch < 2145916800]
+        self.assertEqual (len (changes), 2 * (2038 - 1970))
+        for change in changes + [0, 2145916800]:
+            for epoch in (change - 1, change):
+                dt = eastern.normalize (utc.localize (datetime.utcfromtimestamp (epoch)))
+                self.assertEqual (localtime.utc_offsets ([epoch])[0],
+                                  dt.utcoffset ().total_seconds ())
+                self.assertEqual (localtime.eastern_time (epoch).tzname (), dt.tzname ())
+
+    def testLocalFields (self):
+        fields = localtime.local_fields (self.epochs, day_start_hour=4)
+        for (i, epoch) in enumerate (self.epochs):
+            dt = localtime.eastern_time (epoch)
+            day = (dt - timedelta (hours=4)).date ()
+            self.assertEqual (localtime.day_date (fields.day[i]), day)
+            self.assertEqual (fields.hour[i], dt.hour)
+            self.assertEqual (fields.minute[i], dt.minute)
+            self.assertEqual (fields.weekday[i], day.weekday ())
+
+        self.assertEqual (localtime.local_fields ([]).day.shape, (0,))
+
+    def testDayStarts (self):
+        days = np.arange ((date (2016, 1, 1) - date (1970, 1, 1)).days,
+                          (date (2017, 1, 1) - date (1970, 1, 1)).days)
+        for hour in (0, 4, 12):
+            starts = localtime.day_starts (days, hour)
+            for (day, start) in zip (days, starts):
+                dt = datetime.combine (localtime.day_date (day),
+                                       datetime.min.time ()) + timedelta (hours=hour)
+                self.assertEqual (start, localtime.eastern_epoch (dt))
+        # A day is shorter or longer than 24 hours on daylight saving time changes
+        lengths = set (np.diff (localtime.day_starts (days, 4)))
+        self.assertEqual (lengths, set ([23 * 3600, 24 * 3600, 25 * 3600]))
+
+if __name__ == '__main__':
+    unittest.main ()
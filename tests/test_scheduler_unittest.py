@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from glob import glob
+from datetime import datetime, timedelta
+from mbta_performance import client, line, train
+from mbta_performance.coverage import merge_intervals
+from mbta_performance.scheduler import RequestScheduler, TokenBucket
+from mbta_performance.stand_in import StandInServer
+
+start_time = datetime (year=2016, month=7, day=7)
+
+
+class TestScheduler (unittest.TestCase):
+
+    def setUp (self):
+        self.data_path = tempfile.mkdtemp ()
+        self.urls = (line.mbta_traveltime_url, line.mbta_dwelltime_url)
+
+        self.tc = train.TrainCollection ()
+        self.tc.load_base_train (train.lines.blue, direction_id="0")
+        self.tc.set_data_path (self.data_path)
+        self.n_keys = len (self.tc.base_train.tracks) + \
+            len (self.tc.base_train.stops)
+
+    def tearDown (self):
+        line.mbta_traveltime_url, line.mbta_dwelltime_url = self.urls
+        shutil.rmtree (self.data_path)
+
+    def startServer (self, **kwargs):
+        server = StandInServer (**kwargs).start ()
+        line.mbta_traveltime_url = server.traveltime_url
+        line.mbta_dwelltime_url = server.dwelltime_url
+        return server
+
+    def coveredWindows (self):
+        windows = []
+        for f in glob ('{0}/Blue/dwelltimes_*_70038_*.json'.format (self.data_path)):
+            windows.append (tuple (int (t) for t in re.findall (r'_(\d+)_(\d+)\.json', f)[0]))
+        return merge_intervals (windows), len (windows)
+
+    def testTokenBucket (self):
+        bucket = TokenBucket (rate=50.)
+        t0 = time.time ()
+        for i in range (11):
+            bucket.acquire ()
+        self.assertTrue (time.time () - t0 >= 0.18)
+        self.assertRaises (ValueError, TokenBucket, 0.)
+
+    def testRetry (self):
+        server = self.startServer (fail_first=5)
+        try:
+            scheduler = RequestScheduler (backoff=0.01)
+            self.tc.get_times (start_time, start_time + timedelta (days=1),
+                               scheduler=scheduler, num_workers=4)
+            self.assertEqual (server.request_count, self.n_keys + 5)
+        finally:
+            server.stop ()
+
+        files = glob ('{0}/Blue/*times_*.json'.format (self.data_path))
+        self.assertEqual (len (files), self.n_keys)
+
+    def testFailureBudget (self):
+        server = self.startServer (error_rate=1.)
+        try:
+            scheduler = RequestScheduler (backoff=0.001, max_retries=3,
+                                          failure_budget=5)
+            self.assertRaises (IOError, self.tc.get_times, start_time,
+                               start_time + timedelta (days=1),
+                               scheduler=scheduler)
+            # one budget per endpoint
+            self.assertEqual (server.request_count, 10)
+        finally:
+            server.stop ()
+
+    def testSplitSlowWindows (self):
+        server = self.startServer (slow_span=2 * 86400, slow_delay=0.5)
+        session = client.Session (timeout=0.2)
+        try:
+            scheduler = RequestScheduler (backoff=0.001, session=session)
+            self.tc.get_times (start_time, start_time + timedelta (days=7),
+                               scheduler=scheduler, num_workers=4)
+        finally:
+            session.close ()
+            server.stop ()
+
+        windows, n_files = self.coveredWindows ()
+        self.assertEqual (windows[0][1] - windows[0][0], 7 * 86400)
+        self.assertEqual (n_files, 4)
+
+    def testSplitLargeWindows (self):
+        server = self.startServer (interval=600, max_events=600)
+        try:
+            scheduler = RequestScheduler (backoff=0.001)
+            self.tc.get_times (start_time, start_time + timedelta (days=7),
+                               scheduler=scheduler)
+            # each endpoint is split once, later windows are sent pre-split
+            self.assertEqual (server.request_count, 2 * 3 + 2 * (self.n_keys - 2))
+        finally:
+            server.stop ()
+
+        windows, n_files = self.coveredWindows ()
+        self.assertEqual (windows[0][1] - windows[0][0], 7 * 86400)
+        self.assertEqual (n_files, 2)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from glob import glob
+from datetime import datetime, timedelta
+from mbta_performance import line, storage, train
+from mbta_performance.stand_in import StandInServer
+
+
+def copy_test_data (data_path, compress=None):
+    """ Copy the Blue line test data to `data_path`, in a storage format. """
+
+    curr_dir = os.path.dirname (os.path.realpath (__file__))
+    out_dir = '{0}/Blue'.format (data_path)
+    os.makedirs (out_dir)
+    for f in glob ('{0}/test_data/*_times/Blue/*.json'.format (curr_dir)):
+        with open (f) as f_json:
+            storage.write_raw ([f_json.read ()], '{0}/{1}'.format (
+                out_dir, os.path.basename (f)), compress=compress)
+
+
+class TestStorage (unittest.TestCase):
+
+    def setUp (self):
+        self.data_path = tempfile.mkdtemp ()
+
+    def tearDown (self):
+        shutil.rmtree (self.data_path)
+
+    def testRoundTrip (self):
+        filename = '{0}/test.json'.format (self.data_path)
+        for compress in (None, 'gzip', 'bz2'):
+            size = storage.write_raw (['{"a": ', '1}'], filename,
+                                      compress=compress)
+            self.assertEqual (size, 8)
+            files = os.listdir (self.data_path)
+            self.assertEqual (files, [os.path.basename (
+                storage.raw_filename (filename, compress))])
+            with storage.open_raw (storage.raw_filename (filename, compress)) as f:
+                self.assertEqual (f.read (), '{"a": 1}')
+
+        self.assertTrue (storage.write_raw (['12345'] * 4, filename,
+                                            max_bytes=10) is None)
+        self.assertRaises (ValueError, storage.raw_filename, filename, 'zip')
+
+    def testLoadCompressed (self):
+        totals = []
+        for compress in (None, 'gzip'):
+            data_path = '{0}/{1}'.format (self.data_path, compress)
+            copy_test_data (data_path, compress=compress)
+
+            tc = train.TrainCollection ()
+            tc.load_base_train (train.lines.blue, direction_id="0")
+            tc.set_data_path (data_path)
+            tc.load_times ()
+            tc.load_trains (num_trains=100)
+            totals.append ([t.total_travel_time for t in tc.trains])
+
+        self.assertEqual (totals[0], totals[1])
+
+    def testStreamCompressed (self):
+        tc = train.TrainCollection ()
+        tc.load_base_train (train.lines.blue, direction_id="0")
+        tc.set_data_path (self.data_path)
+        n_keys = len (tc.base_train.tracks) + len (tc.base_train.stops)
+
+        start_time = datetime (year=2016, month=7, day=7)
+        urls = (line.mbta_traveltime_url, line.mbta_dwelltime_url)
+        with StandInServer (interval=60) as server:
+            line.mbta_traveltime_url = server.traveltime_url
+            line.mbta_dwelltime_url = server.dwelltime_url
+            try:
+                tc.get_times (start_time, start_time + timedelta (days=1),
+                              compress='gzip')
+                os.remove (glob ('{0}/Blue/coverage_*'.format (self.data_path))[0])
+                tc.get_times (start_time, start_time + timedelta (days=1),
+                              compress='gzip')
+                self.assertEqual (server.request_count, n_keys)
+            finally:
+                line.mbta_traveltime_url, line.mbta_dwelltime_url = urls
+
+        files = glob ('{0}/Blue/*times_*.json.gz'.format (self.data_path))
+        self.assertEqual (len (files), n_keys)
+        tc.load_times ()
+        self.assertEqual (len (tc._dwell_times['70038']), 1439)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -4,6 +4,7 @@ from __future__ import print_function
 
 import os
 import sys
+import pickle
 import unittest
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -35,6 +36,140 @@ class TestTrain (unittest.TestCase):
         self.assertEqual (t.stops[4].station_name, 'Orient Heights')
         self.assertTrue (t.total_travel_time[0] is None)
 
+    def testTrainSlice (self):
+        t = train.Train ()
+        t.load (train.lines.blue)
+        for (i, stop) in enumerate (t.stops):
+            stop.load_event ({'arr_dt': 1467964800 + 120 * i,
+                              'dep_dt': 1467964860 + 120 * i, 'dwell_time_sec': 60})
+
+        # Slices share the stops and tracks of the train
+        s = t[3:8]
+        self.assertTrue (isinstance (s, train.TrainSlice))
+        self.assertTrue (s.stops[0] is t.stops[3])
+        self.assertTrue (s.tracks[-1] is t.tracks[6])
+        self.assertEqual ([str (p) for p in s], [str (p) for p in t][6:15])
+        self.assertTrue (s.start is t.stops[3])
+        self.assertTrue (s.end is t.stops[7])
+        self.assertEqual (s.total_travel_time, (420., (s.stops[0].station_name, 0),
+                                                (s.stops[-1].station_name, 4)))
+        self.assertEqual (len (s[1:3].stops), 2)
+        self.assertTrue (s[1].start is t.stops[4])
+        self.assertRaises (IndexError, t.__getitem__, slice (5, 5))
+
+        # Copies do not
+        c = s.copy ()
+        self.assertEqual ([str (p) for p in c], [str (p) for p in s])
+        self.assertFalse (c.stops[0] is s.stops[0])
+        self.assertTrue (c.stops[0].prev_track is None)
+        self.assertTrue (c.stops[-1].next_track is None)
+        self.assertTrue (c.tracks[0].next_stop is c.stops[1])
+        self.assertTrue (c.end is c.stops[-1])
+        self.assertEqual (c.total_travel_time, s.total_travel_time)
+        c.stops[0].load_event ({'arr_dt': 0, 'dep_dt': 0, 'dwell_time_sec': 0})
+        self.assertEqual (t.stops[3].dwell_time, 60)
+
+    def testTrainTemplate (self):
+        t = train.Train ()
+        t.load (train.lines.blue)
+        template = train.TrainTemplate (t)
+
+        new_t = template.new ()
+        self.assertEqual ([str (p) for p in new_t], [str (p) for p in t])
+        self.assertEqual (new_t.station_dict, t.station_dict)
+        self.assertTrue (new_t.start is new_t.stops[0])
+        self.assertTrue (new_t.end is new_t.stops[-1])
+        for (i, track) in enumerate (new_t.tracks):
+            self.assertTrue (track.prev_stop is new_t.stops[i])
+            self.assertTrue (track.next_stop is new_t.stops[i+1])
+            self.assertTrue (new_t.stops[i].next_track is track)
+            self.assertTrue (new_t.stops[i+1].prev_track is track)
+
+        # New trains share nothing mutable with the base train
+        new_t.stops[0].load_event ({'arr_dt': 1467964800, 'dep_dt': 1467964860,
+                                    'dwell_time_sec': 60})
+        self.assertTrue (t.stops[0].dwell_time is None)
+        self.assertTrue (template.new ().stops[0].dwell_time is None)
+        self.assertFalse (new_t.stops[0] is t.stops[0])
+
+        # Trains are built again from their dumped state
+        new_t._end = new_t.stops[3]
+        loaded_t = template.load (template.dump (new_t))
+        self.assertEqual ([str (p) for p in loaded_t], [str (p) for p in new_t])
+        self.assertEqual (loaded_t.stops[0].dwell_time, 60)
+        self.assertTrue (loaded_t.end is loaded_t.stops[3])
+        self.assertTrue (loaded_t.stops[1].dwell_time is None)
+
+    def testCompactPieces (self):
+        t = train.Train ()
+        t.load (train.lines.blue)
+        stop = t.stops[0]
+        stop.load_event ({'arr_dt': 1467964800, 'dep_dt': 1467964860,
+                          'dwell_time_sec': 60})
+        self.assertFalse (hasattr (stop, '__dict__'))
+        self.assertFalse (hasattr (t.tracks[0], '__dict__'))
+        self.assertRaises (AttributeError, setattr, stop, '_travel_time', 1)
+
+        # Pickled as the dictionary of their attributes, at any protocol
+        state = stop.__getstate__ ()
+        self.assertEqual (state['_dwell_time'], 60)
+        self.assertTrue (state['_next_track'] is t.tracks[0])
+        for protocol in (0, 2):
+            new_t = pickle.loads (pickle.dumps (t, protocol))
+            self.assertEqual ([str (p) for p in new_t], [str (p) for p in t])
+            self.assertTrue (new_t.stops[1].prev_track is new_t.tracks[0])
+
+        new_stop = train.TrainStop.__new__ (train.TrainStop)
+        new_stop.__setstate__ (state)
+        self.assertEqual (str (new_stop), str (stop))
+
+    def testEventTimes (self):
+        t = train.Train ()
+        t.load (train.lines.blue)
+        stop = t.stops[0]
+        self.assertTrue (stop.arrival_time is None)
+        stop.load_event ({'arr_dt': '1467964800', 'dep_dt': '1467964860',
+                          'dwell_time_sec': '60'})
+        self.assertEqual (stop.arrival_epoch, 1467964800)
+        self.assertEqual (stop.departure_epoch, 1467964860)
+        self.assertEqual (stop.arrival_time.strftime ('%Y-%m-%d %H:%M %Z'),
+                          '2016-07-08 04:00 EDT')
+        self.assertEqual (stop.departure_time - stop.arrival_time,
+                          timedelta (seconds=60))
+
+        # Stops pickled with their times as datetimes still load
+        state = stop.__getstate__ ()
+        state['_arrival_time'] = stop.arrival_time
+        state['_departure_time'] = stop.departure_time
+        del state['_arrival_epoch'], state['_departure_epoch']
+        new_stop = train.TrainStop.__new__ (train.TrainStop)
+        new_stop.__setstate__ (state)
+        self.assertEqual (new_stop.arrival_epoch, 1467964800)
+        self.assertEqual (str (new_stop), str (stop))
+
+    def testLegacyPickle (self):
+        # Collection of 3 trains pickled by the first version, holding its
+        # times as lists of MBTA JSON events
+        curr_dir = os.path.dirname (os.path.realpath (__file__))
+        with open ('{0}/test_data/legacy_collection_Blue.pickle'.format (curr_dir), 'rb') as f:
+            tc = pickle.load (f)
+
+        self.assertEqual ([t.total_travel_time[0] for t in tc.trains],
+                          [1146, 524, 1092])
+        self.assertEqual ([t.total_travel_time for t in tc[:2]],
+                          [t.total_travel_time for t in tc.trains[:2]])
+        self.assertEqual (str (tc.median_train.stops[0]),
+                          '<TrainStop: Wonderland: ARR - None, DWELL TIME 520.5>')
+        self.assertEqual (tc.median_train.tracks[0].travel_time, 36.5)
+
+        # The times are loaded as tables, and make the trains the first
+        # version made of them
+        totals = [1243, 622, 1180, 1203, 1340, 1257, 1235, 1190, 1317, 1272,
+                  1065, 1128, 521, 51, 64]
+        for engine in ('sequential', 'vectorized'):
+            tc.load_trains (engine=engine)
+            self.assertEqual ([t.total_travel_time[0] for t in tc], totals)
+
     def testTrainCollection (self):
         curr_dir = os.path.dirname (os.path.realpath (__file__))
         times_dir = '{0}/test_data/time_data'.format (curr_dir)